@@ -0,0 +1,278 @@
+"""Local HTTP API for the calculation engine.
+
+Exposes the same model as the dashboard so other internal tools can pull P&L and
+ROCE numbers without scraping Streamlit. Concurrent requests are micro-batched:
+everything that arrives within a few milliseconds is evaluated as one vectorised
+``engine.calculate_batch`` call on a worker pool.
+
+    POST /calculate   one scenario object, or an array of them
+                      (optional ?fields=annual_pat,roce_pat to trim the response)
+    GET  /metrics     latency and throughput counters, plus the Decimal audit summary
+    GET  /health      liveness check
+
+Run with ``python api_server.py --port 8600``.
+"""
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import audit
+import engine
+
+
+class ServiceMetrics:
+    """Thread-safe request counters plus a rolling window of latencies."""
+
+    def __init__(self, window=20000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.started = time.monotonic()
+        self.requests = self.scenarios = self.errors = 0
+        self.batches = self.batched_scenarios = 0
+        self.engine_seconds = 0.0
+        self.audit_errors, self.last_audit_error = 0, None
+
+    def record_request(self, latency_s, n_scenarios):
+        with self._lock:
+            self.requests += 1
+            self.scenarios += n_scenarios
+            self._latencies.append(latency_s)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_audit_error(self, exc):
+        with self._lock:
+            self.audit_errors += 1
+            self.last_audit_error = f"{type(exc).__name__}: {exc}"
+
+    def record_batch(self, n_scenarios, seconds):
+        with self._lock:
+            self.batches += 1
+            self.batched_scenarios += n_scenarios
+            self.engine_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            lat = np.fromiter(self._latencies, dtype=np.float64)
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99]) * 1000 if lat.size else (0.0, 0.0, 0.0)
+            return {
+                "uptime_s": uptime, "requests": self.requests, "scenarios": self.scenarios, "errors": self.errors,
+                "requests_per_s": self.requests / uptime if uptime else 0.0,
+                "scenarios_per_s": self.scenarios / uptime if uptime else 0.0,
+                "latency_ms": {"p50": float(p50), "p95": float(p95), "p99": float(p99),
+                               "max": float(lat.max() * 1000) if lat.size else 0.0},
+                "batches": self.batches,
+                "avg_batch_scenarios": self.batched_scenarios / self.batches if self.batches else 0.0,
+                "engine_scenarios_per_s": self.batched_scenarios / self.engine_seconds if self.engine_seconds else 0.0,
+                "audit_errors": self.audit_errors, "last_audit_error": self.last_audit_error,
+            }
+
+
+class MicroBatcher:
+    """Coalesces concurrent submissions into vectorised engine calls.
+
+    A collector thread waits for the first job, keeps draining the queue for up to
+    ``max_wait_ms`` (or until ``max_batch`` scenarios are pending) and hands the
+    whole group to the worker pool as one batch.
+    """
+
+    def __init__(self, max_batch=8192, max_wait_ms=2.0, workers=4, metrics=None, auditor=None):
+        self.max_batch, self.max_wait = max_batch, max_wait_ms / 1000
+        self.metrics = metrics or ServiceMetrics()
+        self.auditor = auditor
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine")
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name="batcher", daemon=True)
+        self._collector.start()
+
+    def submit(self, scenarios):
+        """Queues a list of scenario dicts; the Future resolves to a list of output dicts."""
+        if self._closed:
+            raise RuntimeError("batcher is closed")
+        future = Future()
+        self._queue.put((scenarios, future))
+        return future
+
+    def _collect(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            jobs, pending = [job], len(job[0])
+            deadline = time.monotonic() + self.max_wait
+            while pending < self.max_batch and (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._queue.put(None)
+                    break
+                jobs.append(job)
+                pending += len(job[0])
+            self._pool.submit(self._run, jobs)
+
+    def _run(self, jobs):
+        try:
+            scenarios = [s for job_scenarios, _ in jobs for s in job_scenarios]
+            start = time.perf_counter()
+            outputs = engine.calculate_batch(scenarios)
+            elapsed = time.perf_counter() - start
+            self.metrics.record_batch(len(scenarios), elapsed)
+            rows = engine.split_rows(outputs)
+        except Exception as exc:
+            for _, future in jobs:
+                future.set_exception(exc)
+            return
+        offset = 0
+        for job_scenarios, future in jobs:
+            future.set_result(rows[offset:offset + len(job_scenarios)])
+            offset += len(job_scenarios)
+        if self.auditor is not None:
+            # After the results are out: an audit failure must never fail the clients' requests.
+            try:
+                self.auditor.check(scenarios, outputs, elapsed)
+            except Exception as exc:
+                self.metrics.record_audit_error(exc)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._collector.join()
+        self._pool.shutdown(wait=True)
+
+
+def validate_scenarios(payload):
+    """Returns ``(scenarios, is_single)`` or raises ValueError with a client-facing message."""
+    is_single = isinstance(payload, dict)
+    scenarios = [payload] if is_single else payload
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ValueError("body must be a scenario object or a non-empty array of them")
+    for i, scenario in enumerate(scenarios):
+        if not isinstance(scenario, dict):
+            raise ValueError(f"scenario {i} is not an object")
+        for key, value in scenario.items():
+            if key not in engine.DEFAULT_INPUTS:
+                raise ValueError(f"scenario {i}: unknown input '{key}'")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"scenario {i}: input '{key}' must be a number")
+            try:
+                finite = math.isfinite(value)
+            except OverflowError:  # an integer too large for a float
+                finite = False
+            if not finite:
+                raise ValueError(f"scenario {i}: input '{key}' must be finite")
+    return scenarios, is_single
+
+
+class EngineRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "MustardEngine/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/metrics":
+            body = self.server.batcher.metrics.snapshot()
+            if self.server.batcher.auditor is not None:
+                body["audit"] = self.server.batcher.auditor.summary()
+            self._send_json(200, body)
+        else:
+            self._send_json(404, {"error": f"unknown path {path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != "/calculate":
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+            return
+        metrics = self.server.batcher.metrics
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            scenarios, is_single = validate_scenarios(json.loads(self.rfile.read(length) or b"null"))
+            fields = parse_qs(url.query).get("fields", [""])[0]
+            fields = [f for f in fields.split(",") if f]
+            if unknown := [f for f in fields if f not in engine.OUTPUT_KEYS]:
+                raise ValueError(f"unknown output field(s): {', '.join(unknown)}")
+        except ValueError as exc:  # json.JSONDecodeError is a ValueError too
+            metrics.record_error()
+            self._send_json(400, {"error": str(exc)})
+            return
+        try:
+            rows = self.server.batcher.submit(scenarios).result(timeout=self.server.request_timeout)
+        except Exception as exc:
+            metrics.record_error()
+            self._send_json(500, {"error": str(exc)})
+            return
+        if fields:
+            rows = [{f: row[f] for f in fields} for row in rows]
+        self._send_json(200, rows[0] if is_single else rows)
+        metrics.record_request(time.perf_counter() - start, len(scenarios))
+
+
+class EngineHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the default of 5 drops SYNs under a burst of new clients
+
+
+def make_server(host="127.0.0.1", port=8600, max_batch=8192, max_wait_ms=2.0, workers=4,
+                request_timeout=30.0, verbose=False, audit_rate=0.001):
+    """Builds (but does not start) the HTTP server; port 0 picks a free port."""
+    server = EngineHTTPServer((host, port), EngineRequestHandler)
+    auditor = audit.AuditSampler(rate=audit_rate) if audit_rate > 0 else None
+    server.batcher = MicroBatcher(max_batch=max_batch, max_wait_ms=max_wait_ms, workers=workers, auditor=auditor)
+    server.request_timeout, server.verbose = request_timeout, verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the mustard oil calculation engine over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=4, help="engine worker threads")
+    parser.add_argument("--max-batch", type=int, default=8192, help="max scenarios per engine call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="how long to wait for a batch to fill")
+    parser.add_argument("--audit-rate", type=float, default=0.001, help="share of scenarios re-checked in Decimal (0 disables)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.max_batch, args.max_wait_ms, args.workers,
+                         verbose=args.verbose, audit_rate=args.audit_rate)
+    print(f"Serving calculation engine on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
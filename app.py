@@ -1,24 +1,33 @@
+import contextlib
+import time
+import uuid
+
 import streamlit as st
 import pandas as pd
+import numpy as np
+
+import audit
+import capacity_optimizer
+import charts
+import compute_queue
+import engine
+import hedge_simulator
+import inventory_ledger
+import plan_vs_actual
+import price_feed
+import results_store
+import stress_test
+import streaming_stats
+import wc_optimizer
+from formatting import format_indian
 
-# --- Page Configuration and Helper Function ---
+# --- Page Configuration ---
 st.set_page_config(layout="wide", page_title="Mustard Oil Business Dashboard")
 
-def format_indian(num):
-    """Formats a number into the Indian numbering system for better readability."""
-    if not isinstance(num, (int, float)): return num
-    num_str = f"{abs(num):,.0f}"
-    parts = num_str.split('.')
-    integer_part = parts[0].replace(',', '')
-    if len(integer_part) > 3:
-        last_three = integer_part[-3:]
-        other_digits = integer_part[:-3]
-        if other_digits:
-            formatted_other_digits = ','.join([other_digits[max(0, i-2):i] for i in range(len(other_digits), 0, -2)][::-1])
-            formatted_num = f"{formatted_other_digits},{last_three}"
-        else: formatted_num = last_three
-    else: formatted_num = integer_part
-    return '-' + formatted_num if num < 0 else formatted_num
+@st.cache_resource
+def get_price_feed(url):
+    """One background price feed per URL, shared by all sessions."""
+    return price_feed.PriceFeed(url)
 
 st.title("🛢️ Mustard Oil Financial & Operational Dashboard")
 st.markdown("An interactive dashboard for comprehensive analysis of a mustard oil processing business.")
@@ -26,134 +35,137 @@ st.markdown("An interactive dashboard for comprehensive analysis of a mustard oi
 # --- Sidebar for All User Inputs ---
 with st.sidebar:
     st.header("⚙️ Business & Financial Inputs")
-    with st.expander("Production & Prices", expanded=True):
-        seed_input_mt = st.number_input("Daily Seed Input (MT)", value=192.0)
-        kachi_ghani_yield_pct = st.slider("Kachi Ghani Oil Yield (%)", 0, 100, 18)
-        expeller_yield_pct = st.slider("Expeller Oil Yield (%)", 0, 100, 15)
-        seed_purchase_price = st.number_input("Seed Purchase Price (₹/MT)", value=54000) # New Default
-        oil_blend_sell_price = st.number_input("Oil Blend Sell Price (₹/MT)", value=141000)
-        moc_sell_price = st.number_input("MoC Sell Price (₹/MT)", value=22000)
-    with st.expander("Costs & Expenses", expanded=True):
-        processing_cost_per_mt = st.number_input("Processing Cost (₹/MT of Seed)", value=2000)
-        other_variable_costs_per_mt = st.number_input("Other Variable Costs (₹/MT of Seed)", value=500)
-        other_expenses_daily = st.number_input("Other Fixed Expenses (₹/day)", value=45000)
-        production_days_per_month = st.number_input("Production Days per Month", value=24)
-    with st.expander("Pungency & MoC Enhancement", expanded=True):
-        kachi_ghani_pungency = st.slider("Kachi Ghani Oil Pungency (%)", 0.0, 1.0, 0.38, step=0.01)
-        expeller_oil_pungency = st.slider("Expeller Oil Pungency (%)", 0.0, 1.0, 0.12, step=0.01)
-        expeller_oil_sell_price = st.number_input("Expeller Oil Sell Price (₹/MT)", value=136000)
-        market_bought_oil_price = st.number_input("Market-Bought Oil Price (₹/MT)", value=132000)
-        water_added_pct = st.slider("Water Added to MoC (% of seed)", 0, 10, 2)
-        water_cost_per_kg = st.number_input("Water Cost (₹/kg)", value=1)
-        salt_added_pct = st.slider("Salt Added to MoC (% of seed)", 0, 10, 3)
-        salt_cost_per_kg = st.number_input("Salt Cost (₹/kg)", value=5)
-    with st.expander("Capex, Tax & Financing", expanded=True):
-        capex = st.number_input("Capex (₹)", value=190000000)
-        depreciation_years = st.number_input("Depreciation Period (Years)", min_value=1, value=15)
-        tax_rate_pct = st.slider("Tax Rate (%)", 0, 50, 25)
-        other_assets = st.number_input("Other Assets (₹)", value=0)
-        warehouse_finance_rate_pa = st.slider("Warehouse Finance Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for financed RM Hoard")
-        main_financing_rate_pa = st.slider("Main Financing Cost Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for Capex and remaining WC")
-        rm_hoard_financed_pct = st.slider("% of Hoarded RM Financed", 0, 100, 80)
-    with st.expander("Working Capital Cycles", expanded=True):
-        rm_hoard_months = st.number_input("Raw Material Hoard (months)", value=6)
-        hoarded_rm_rate = st.number_input("Hoarded RM Rate (₹/MT)", value=53500)
-        rm_safety_stock_days = st.number_input("RM Safety Stock (days)", value=48)
-        fg_oil_safety_days = st.number_input("FG (Oil) Safety Stock (days)", value=15)
-        fg_moc_safety_days = st.number_input("FG (MoC) Safety Stock (days)", value=4)
-        oil_debtor_days = st.number_input("Oil Debtor Cycle (days)", value=5)
-        moc_debtor_days = st.number_input("MoC Debtor Cycle (days)", value=5)
-        creditor_days = st.number_input("Creditors Days", value=3)
-    with st.expander("🏭 Solvex Plant Synergy Inputs", expanded=False):
-        moc_consumed_perc = st.slider("% of MOC Consumed In-House", 0, 100, 100)
-        logistics_saved_per_ton = st.number_input("Logistics Saved (₹/Ton of MOC)", value=400)
-        labor_saved_nos = st.number_input("Labor Headcount Saved (Daily)", value=4)
-        labor_cost_per_head_daily = st.number_input("Cost per Labor Head (₹/Day)", value=550)
-        brokerage_saved_per_ton = st.number_input("Brokerage Saved (₹/Ton of MOC)", value=25)
+    _batch_edits = st.checkbox("Batch edits (apply with a button)", help="Collect sidebar changes and recompute once when you click Apply, instead of on every slider move.")
+    with st.form("sidebar_inputs") if _batch_edits else contextlib.nullcontext():
+        with st.expander("Production & Prices", expanded=True):
+            _use_price_feed = st.checkbox("Use live prices from the price service", value=False)
+            _feed_prices = None
+            if _use_price_feed:
+                _price_feed_url = st.text_input("Price Service URL", value="http://127.0.0.1:8700/prices")
+                _feed = get_price_feed(_price_feed_url)
+                _feed_prices = _feed.get()
+                _feed_status = _feed.status()
+                if _feed_prices:
+                    st.caption(f"Live prices as of {_feed_status['as_of']} (fetched {_feed_status['age_s']:.0f}s ago).")
+                else:
+                    st.caption(f"Waiting for the price service; using manual prices. {_feed_status['last_error'] or ''}")
+            _live = lambda key, default: _feed_prices.get(key, default) if _feed_prices else default
+            seed_input_mt = st.number_input("Daily Seed Input (MT)", value=192.0)
+            kachi_ghani_yield_pct = st.slider("Kachi Ghani Oil Yield (%)", 0, 100, 18)
+            expeller_yield_pct = st.slider("Expeller Oil Yield (%)", 0, 100, 15)
+            seed_purchase_price = st.number_input("Seed Purchase Price (₹/MT)", value=_live("seed_purchase_price", 54000), disabled=bool(_feed_prices)) # New Default
+            oil_blend_sell_price = st.number_input("Oil Blend Sell Price (₹/MT)", value=_live("oil_blend_sell_price", 141000), disabled=bool(_feed_prices))
+            moc_sell_price = st.number_input("MoC Sell Price (₹/MT)", value=_live("moc_sell_price", 22000), disabled=bool(_feed_prices))
+        with st.expander("Costs & Expenses", expanded=True):
+            processing_cost_per_mt = st.number_input("Processing Cost (₹/MT of Seed)", value=2000)
+            other_variable_costs_per_mt = st.number_input("Other Variable Costs (₹/MT of Seed)", value=500)
+            other_expenses_daily = st.number_input("Other Fixed Expenses (₹/day)", value=45000)
+            production_days_per_month = st.number_input("Production Days per Month", value=24)
+        with st.expander("Pungency & MoC Enhancement", expanded=True):
+            kachi_ghani_pungency = st.slider("Kachi Ghani Oil Pungency (%)", 0.0, 1.0, 0.38, step=0.01)
+            expeller_oil_pungency = st.slider("Expeller Oil Pungency (%)", 0.0, 1.0, 0.12, step=0.01)
+            expeller_oil_sell_price = st.number_input("Expeller Oil Sell Price (₹/MT)", value=136000)
+            market_bought_oil_price = st.number_input("Market-Bought Oil Price (₹/MT)", value=_live("market_bought_oil_price", 132000), disabled=bool(_feed_prices))
+            water_added_pct = st.slider("Water Added to MoC (% of seed)", 0, 10, 2)
+            water_cost_per_kg = st.number_input("Water Cost (₹/kg)", value=1)
+            salt_added_pct = st.slider("Salt Added to MoC (% of seed)", 0, 10, 3)
+            salt_cost_per_kg = st.number_input("Salt Cost (₹/kg)", value=5)
+        with st.expander("Capex, Tax & Financing", expanded=True):
+            capex = st.number_input("Capex (₹)", value=190000000)
+            depreciation_years = st.number_input("Depreciation Period (Years)", min_value=1, value=15)
+            tax_rate_pct = st.slider("Tax Rate (%)", 0, 50, 25)
+            other_assets = st.number_input("Other Assets (₹)", value=0)
+            warehouse_finance_rate_pa = st.slider("Warehouse Finance Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for financed RM Hoard")
+            main_financing_rate_pa = st.slider("Main Financing Cost Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for Capex and remaining WC")
+            rm_hoard_financed_pct = st.slider("% of Hoarded RM Financed", 0, 100, 80)
+        with st.expander("Working Capital Cycles", expanded=True):
+            rm_hoard_months = st.number_input("Raw Material Hoard (months)", value=6)
+            hoarded_rm_rate = st.number_input("Hoarded RM Rate (₹/MT)", value=53500)
+            rm_safety_stock_days = st.number_input("RM Safety Stock (days)", value=48)
+            fg_oil_safety_days = st.number_input("FG (Oil) Safety Stock (days)", value=15)
+            fg_moc_safety_days = st.number_input("FG (MoC) Safety Stock (days)", value=4)
+            oil_debtor_days = st.number_input("Oil Debtor Cycle (days)", value=5)
+            moc_debtor_days = st.number_input("MoC Debtor Cycle (days)", value=5)
+            creditor_days = st.number_input("Creditors Days", value=3)
+            fg_ledger_file = st.file_uploader("FG Ledger Events (JSONL)", type=["jsonl", "json"], help="Production, blending, dispatch, sale and payment events. When loaded, the headline FG stock, debtors and creditors come from the ledger; the sweeps, optimisers and stress tests below keep using the day cycles above.")
+            if fg_ledger_file is not None:
+                ledger_method = st.selectbox("Ledger Stock Valuation", [inventory_ledger.FIFO, inventory_ledger.WEIGHTED_AVERAGE], format_func=lambda m: "FIFO" if m == inventory_ledger.FIFO else "Weighted Average")
+                ledger_as_of = st.date_input("Ledger Position As Of")
+        with st.expander("🏭 Solvex Plant Synergy Inputs", expanded=False):
+            moc_consumed_perc = st.slider("% of MOC Consumed In-House", 0, 100, 100)
+            logistics_saved_per_ton = st.number_input("Logistics Saved (₹/Ton of MOC)", value=400)
+            labor_saved_nos = st.number_input("Labor Headcount Saved (Daily)", value=4)
+            labor_cost_per_head_daily = st.number_input("Cost per Labor Head (₹/Day)", value=550)
+            brokerage_saved_per_ton = st.number_input("Brokerage Saved (₹/Ton of MOC)", value=25)
+            st.markdown("**Solvex Plant**")
+            solvex_residual_oil_pct = st.slider("Residual Oil in MoC (%)", 0.0, 20.0, 9.0, step=0.5)
+            solvex_extraction_efficiency_pct = st.slider("Solvent Extraction Efficiency (%)", 0.0, 100.0, 92.0, step=0.5)
+            solvex_oil_sell_price = st.number_input("Solvent-Extracted Oil Price (₹/MT)", value=118000)
+            doc_sell_price = st.number_input("De-Oiled Cake Price (₹/MT)", value=17500)
+            solvent_loss_kg_per_mt = st.number_input("Solvent Loss (kg/MT of MoC)", value=2.5)
+            solvent_cost_per_kg = st.number_input("Solvent Cost (₹/kg)", value=95)
+            steam_kg_per_mt = st.number_input("Steam (kg/MT of MoC)", value=280)
+            steam_cost_per_kg = st.number_input("Steam Cost (₹/kg)", value=2.2)
+            solvex_other_variable_costs_per_mt = st.number_input("Solvex Other Variable Costs (₹/MT of MoC)", value=350)
+            solvex_other_expenses_daily = st.number_input("Solvex Fixed Expenses (₹/day)", value=30000)
+            solvex_capex = st.number_input("Solvex Capex (₹)", value=150000000)
+            solvex_depreciation_years = st.number_input("Solvex Depreciation Period (Years)", min_value=1, value=15)
+            solvex_fg_safety_days = st.number_input("Solvex FG Safety Stock (days)", value=7)
+            solvex_debtor_days = st.number_input("Solvex Debtor Cycle (days)", value=7)
+            solvex_creditor_days = st.number_input("Solvex Creditor Days (solvent & steam)", value=15)
+        if _batch_edits:
+            st.form_submit_button("Apply Changes", type="primary", use_container_width=True)
 
 # --- Calculation Engine (Triple-Verified & Final) ---
+# The model itself lives in engine.py so the HTTP service and batch tools share it.
 @st.cache_data
 def calculate_all_metrics(inputs):
-    # Unpack all inputs
-    for key, value in inputs.items(): locals()[key] = value
-    kachi_ghani_yield, expeller_yield = kachi_ghani_yield_pct/100, expeller_yield_pct/100
-    moc_base_yield, min_pungency_req = 1-(kachi_ghani_yield+expeller_yield), 0.27
-    kachi_ghani_oil_produced_mt, expeller_oil_produced_mt = seed_input_mt*kachi_ghani_yield, seed_input_mt*expeller_yield
-    total_produced_oil = kachi_ghani_oil_produced_mt + expeller_oil_produced_mt
-    initial_blend_pungency = (kachi_ghani_oil_produced_mt * kachi_ghani_pungency + expeller_oil_produced_mt * expeller_oil_pungency) / total_produced_oil if total_produced_oil > 0 else 0
-    exp_oil_used_in_blend_mt, exp_oil_sold_separately_mt, market_oil_to_add_mt = expeller_oil_produced_mt, 0, 0
-    pungency_recommendation = ""
-    if initial_blend_pungency < min_pungency_req and total_produced_oil > 0:
-        if (denominator := min_pungency_req - expeller_oil_pungency) != 0: exp_oil_used_in_blend_mt = max(0, (kachi_ghani_oil_produced_mt * (kachi_ghani_pungency - min_pungency_req)) / denominator)
-        exp_oil_sold_separately_mt = expeller_oil_produced_mt - exp_oil_used_in_blend_mt
-        loss = exp_oil_sold_separately_mt * (oil_blend_sell_price - expeller_oil_sell_price)
-        pungency_recommendation = f"🔴 **Pungency Low ({initial_blend_pungency:.2f}%)**: Sell {exp_oil_sold_separately_mt:.2f} MT of Expeller Oil separately. Est. daily opportunity loss: ₹ {format_indian(abs(loss))}."
-    elif initial_blend_pungency > min_pungency_req and total_produced_oil > 0:
-        if min_pungency_req > 0: market_oil_to_add_mt = max(0, ((kachi_ghani_oil_produced_mt * kachi_ghani_pungency + expeller_oil_produced_mt * expeller_oil_pungency) / min_pungency_req) - total_produced_oil)
-        profit = market_oil_to_add_mt * (oil_blend_sell_price - market_bought_oil_price)
-        pungency_recommendation = f"🟢 **Pungency High ({initial_blend_pungency:.2f}%)**: Add {market_oil_to_add_mt:.2f} MT of Market Oil to optimize. Est. daily profit opportunity: ₹ {format_indian(profit)}."
+    metrics = dict(compute.run(engine.calculate_all_metrics, inputs))
+    initial_blend_pungency, status = metrics["initial_blend_pungency"], metrics["pungency_status"]
+    if status == engine.PUNGENCY_LOW and metrics["exp_oil_sold_separately_mt"] == 0:
+        pungency_recommendation = f"🔴 **Pungency Low ({initial_blend_pungency:.2f}%)**: Kachi Ghani oil is itself below {engine.MIN_PUNGENCY_REQ}%, so selling Expeller Oil separately cannot bring the blend to spec."
+    elif status == engine.PUNGENCY_LOW:
+        loss = metrics["exp_oil_sold_separately_mt"] * (inputs["oil_blend_sell_price"] - inputs["expeller_oil_sell_price"])
+        pungency_recommendation = f"🔴 **Pungency Low ({initial_blend_pungency:.2f}%)**: Sell {metrics['exp_oil_sold_separately_mt']:.2f} MT of Expeller Oil separately. Est. daily opportunity loss: ₹ {format_indian(abs(loss))}."
+    elif status == engine.PUNGENCY_HIGH:
+        profit = metrics["market_oil_to_add_mt"] * (inputs["oil_blend_sell_price"] - inputs["market_bought_oil_price"])
+        pungency_recommendation = f"🟢 **Pungency High ({initial_blend_pungency:.2f}%)**: Add {metrics['market_oil_to_add_mt']:.2f} MT of Market Oil to optimize. Est. daily profit opportunity: ₹ {format_indian(profit)}."
     else: pungency_recommendation = f"✅ **Pungency Compliant ({initial_blend_pungency:.2f}%)**: No action needed."
-    final_oil_blend_mt = kachi_ghani_oil_produced_mt + exp_oil_used_in_blend_mt + market_oil_to_add_mt
-    water_added_mt, salt_added_mt = seed_input_mt*(water_added_pct/100), seed_input_mt*(salt_added_pct/100)
-    enhanced_moc_mt = (seed_input_mt * moc_base_yield) + water_added_mt + salt_added_mt
-    daily_revenue_oil_blend, daily_revenue_expeller_separate, daily_revenue_moc = final_oil_blend_mt*oil_blend_sell_price, exp_oil_sold_separately_mt*expeller_oil_sell_price, enhanced_moc_mt*moc_sell_price
-    daily_total_revenue = daily_revenue_oil_blend + daily_revenue_expeller_separate + daily_revenue_moc
-    cost_moc_enhancement = (water_added_mt*1000*water_cost_per_kg) + (salt_added_mt*1000*salt_cost_per_kg)
-    daily_cogs = (seed_input_mt*seed_purchase_price) + (market_oil_to_add_mt*market_bought_oil_price) + cost_moc_enhancement
-    daily_gm, daily_processing_cost = daily_total_revenue - daily_cogs, seed_input_mt*processing_cost_per_mt
-    daily_cm, daily_variable_cost = daily_gm - daily_processing_cost, seed_input_mt*other_variable_costs_per_mt
-    daily_ebitda = daily_cm - daily_variable_cost - other_expenses_daily
-    monthly_seed_consumption = seed_input_mt * production_days_per_month
-    rm_hoarded_value, rm_safety_stock_value = monthly_seed_consumption*rm_hoard_months*hoarded_rm_rate, seed_input_mt*rm_safety_stock_days*seed_purchase_price
-    inventory_rm = rm_hoarded_value + rm_safety_stock_value
-    total_daily_oil_revenue, total_daily_oil_qty = daily_revenue_oil_blend+daily_revenue_expeller_separate, final_oil_blend_mt+exp_oil_sold_separately_mt
-    avg_oil_price = total_daily_oil_revenue/total_daily_oil_qty if total_daily_oil_qty > 0 else 0
-    fg_oil_inventory_value, fg_moc_inventory_value = total_daily_oil_qty*avg_oil_price*fg_oil_safety_days, enhanced_moc_mt*moc_sell_price*fg_moc_safety_days
-    inventory_fg = fg_oil_inventory_value + fg_moc_inventory_value
-    total_inventory = inventory_rm + inventory_fg
-    debtors_oil, debtors_moc = total_daily_oil_revenue*oil_debtor_days, daily_revenue_moc*moc_debtor_days
-    total_debtors, trade_creditors = debtors_oil + debtors_moc, seed_input_mt*seed_purchase_price*creditor_days
-    financed_rm_hoard_value = rm_hoarded_value*(rm_hoard_financed_pct/100)
-    gross_wc = total_inventory + total_debtors - trade_creditors
-    net_wc_requirement = gross_wc - financed_rm_hoard_value
-    annual_production_days = production_days_per_month * 12
-    annual_ebitda = daily_ebitda * annual_production_days
-    interest_on_hoard = financed_rm_hoard_value*(warehouse_finance_rate_pa/100)
-    interest_on_main_capital = (net_wc_requirement + capex)*(main_financing_rate_pa/100)
-    annual_interest = interest_on_hoard + interest_on_main_capital
-    annual_depreciation = capex/depreciation_years if depreciation_years > 0 else 0
-    annual_pbt = annual_ebitda - annual_depreciation - annual_interest
-    annual_tax = max(0, annual_pbt * (tax_rate_pct/100))
-    annual_pat = annual_pbt - annual_tax
-    capital_employed = capex + net_wc_requirement + other_assets
-    roce_pat = (annual_pat / capital_employed) * 100 if capital_employed != 0 else 0
-    roce_ebitda = (annual_ebitda / capital_employed) * 100 if capital_employed != 0 else 0
-    moc_consumed_inhouse_mt = enhanced_moc_mt*(moc_consumed_perc/100)
-    daily_logistics_saving, daily_labor_saving, daily_brokerage_saving = moc_consumed_inhouse_mt*logistics_saved_per_ton, labor_saved_nos*labor_cost_per_head_daily, moc_consumed_inhouse_mt*brokerage_saved_per_ton
-    daily_solvex_saving = daily_logistics_saving + daily_labor_saving + daily_brokerage_saving
-    annual_solvex_saving = daily_solvex_saving * annual_production_days
-    annual_pat_with_synergy = annual_pat + annual_solvex_saving
-    annual_ebitda_with_synergy = annual_ebitda + annual_solvex_saving
-    roce_pat_with_synergy = (annual_pat_with_synergy / capital_employed) * 100 if capital_employed != 0 else 0
-    roce_ebitda_with_synergy = (annual_ebitda_with_synergy / capital_employed) * 100 if capital_employed != 0 else 0
-    
-    return {
-        "seed_input_mt": seed_input_mt, "pungency_recommendation": pungency_recommendation, "final_oil_blend_mt": final_oil_blend_mt,
-        "exp_oil_sold_separately_mt": exp_oil_sold_separately_mt, "enhanced_moc_mt": enhanced_moc_mt,
-        "daily_total_revenue": daily_total_revenue, "daily_gm": daily_gm, "daily_cm": daily_cm, "daily_ebitda": daily_ebitda,
-        "production_days_per_month": production_days_per_month, "annual_production_days": annual_production_days,
-        "annual_interest": annual_interest, "annual_depreciation": annual_depreciation, "tax_rate_pct": tax_rate_pct,
-        "total_inventory": total_inventory, "total_debtors": total_debtors, "trade_creditors": trade_creditors,
-        "financed_rm_hoard_value": financed_rm_hoard_value, "net_wc_requirement": net_wc_requirement, "capex": capex,
-        "roce_pat": roce_pat, "roce_ebitda": roce_ebitda,
-        "roce_pat_with_synergy": roce_pat_with_synergy, "roce_ebitda_with_synergy": roce_ebitda_with_synergy,
-        "daily_solvex_saving": daily_solvex_saving,
-        "daily_cogs": daily_cogs, "daily_processing_cost": daily_processing_cost, "daily_variable_cost": daily_variable_cost, "daily_other_expenses": other_expenses_daily,
-    }
+    metrics["pungency_recommendation"] = pungency_recommendation
+    return metrics
+
+@st.cache_resource
+def load_fg_ledger(events_jsonl, method):
+    return inventory_ledger.InventoryLedger.from_jsonl(events_jsonl.splitlines(), method=method)
+
+@st.cache_resource(max_entries=8)
+def actuals_ledger(path, plan_items):
+    """One variance ledger per actuals log and plan (the most recent few); each rerun only reads the days appended since."""
+    return plan_vs_actual.VarianceLedger(dict(plan_items))
+
+@st.cache_resource
+def shared_compute():
+    """One compute queue (coalesces identical scenarios, keeps recent results) and rate limiter for all sessions on this server."""
+    return compute_queue.ComputeQueue(), compute_queue.RateLimiter()
 
 # --- Collect Inputs & Run Calculation Engine ---
 input_dict = {k: v for k, v in locals().items() if isinstance(v, (int, float, str)) and not k.startswith('_')}
-metrics = calculate_all_metrics(input_dict)
+headline_inputs = dict(input_dict)  # input_dict stays on the day cycles: sweeps and optimisers vary those days
+ledger_position = None
+if fg_ledger_file is not None:
+    try:
+        fg_ledger = load_fg_ledger(fg_ledger_file.getvalue().decode(), ledger_method)
+        ledger_position = fg_ledger.position(ledger_as_of)
+        headline_inputs.update(fg_ledger.working_capital_inputs(ledger_as_of))
+    except (ValueError, KeyError) as exc:
+        st.sidebar.error(f"Could not read FG ledger: {exc}")
+compute, rate_limiter = shared_compute()
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+if (rerun_wait := rate_limiter.delay(session_id, debounce=not _batch_edits)) > 0:
+    with st.spinner("Applying changes..."):
+        time.sleep(rerun_wait)  # a newer edit interrupts this run at the next Streamlit call
+metrics = calculate_all_metrics(headline_inputs)
+rate_limiter.mark(session_id)
 
 # --- Main Dashboard Display ---
 st.subheader("Pungency Compliance")
@@ -202,7 +214,7 @@ def display_pnl(period_multiplier, period_name):
     
     # --- ROCE ---
     st.markdown(f"##### Return on Capital Employed (ROCE)")
-    c1, c2 = st.columns(2)
+    c1, c2, c3 = st.columns(3)
     with c1:
         st.markdown("**Standard ROCE**")
         st.metric("ROCE (PAT Basis)", f"{metrics['roce_pat']:.2f}%")
@@ -211,6 +223,10 @@ def display_pnl(period_multiplier, period_name):
         st.markdown("**ROCE including Solvex Synergy**")
         st.metric("ROCE (PAT Basis)", f"{metrics['roce_pat_with_synergy']:.2f}%")
         st.metric("ROCE (EBITDA Basis)", f"{metrics['roce_ebitda_with_synergy']:.2f}%")
+    with c3:
+        st.markdown("**ROCE of Crushing + Solvex Plant**")
+        st.metric("ROCE (PAT Basis)", f"{metrics['combined_roce_pat']:.2f}%")
+        st.metric("ROCE (EBITDA Basis)", f"{metrics['combined_roce_ebitda']:.2f}%")
 
 with daily_tab:
     display_pnl(1, "Daily")
@@ -224,6 +240,8 @@ st.divider()
 wc_col, savings_col = st.columns(2)
 with wc_col:
     st.subheader("Working Capital & Capex Breakdown")
+    if ledger_position:
+        st.caption(f"FG stock (oil {ledger_position['oil_qty_mt']:,.1f} MT, MoC {ledger_position['moc_qty_mt']:,.1f} MT), debtors and creditors from the FG ledger as of {ledger_position['as_of']}.")
     c1, c2, c3 = st.columns(3)
     c1.markdown(f"**Total Inventory:**<br> <p style='font-size: 20px;'>₹ {format_indian(metrics['total_inventory'])}</p>", unsafe_allow_html=True)
     c2.markdown(f"**Total Debtors:**<br> <p style='font-size: 20px;'>₹ {format_indian(metrics['total_debtors'])}</p>", unsafe_allow_html=True)
@@ -237,6 +255,185 @@ with savings_col:
     st.subheader("🏭 Solvex Plant Synergy")
     st.metric("Total Daily Savings", f"₹ {format_indian(metrics['daily_solvex_saving'])}")
     st.metric("Total Monthly Savings", f"₹ {format_indian(metrics['daily_solvex_saving'] * metrics['production_days_per_month'])}")
+    st.markdown("**Solvex Plant (Daily)**")
+    sx1, sx2, sx3 = st.columns(3)
+    sx1.metric("Oil Recovered", f"{metrics['solvex_oil_mt']:,.2f} MT")
+    sx2.metric("De-Oiled Cake", f"{metrics['doc_output_mt']:,.2f} MT")
+    sx3.metric("Solvex EBITDA", f"₹ {format_indian(metrics['solvex_daily_ebitda'])}")
+    st.caption(f"Revenue ₹ {format_indian(metrics['solvex_daily_revenue'])} · MoC at transfer price ₹ {format_indian(metrics['solvex_daily_moc_cost'])} · Solvent & steam ₹ {format_indian(metrics['solvex_daily_utility_cost'])}")
+    st.metric("Combined Annual PAT", f"₹ {format_indian(metrics['combined_annual_pat'])}")
+    st.markdown(f"**Combined Capital Employed:** ₹ {format_indian(metrics['combined_capital_employed'])} (Solvex capex ₹ {format_indian(metrics['solvex_capex'])}, Solvex WC ₹ {format_indian(metrics['solvex_net_wc'])})")
+
+with st.expander("🎲 Monte Carlo Percentiles", expanded=False):
+    mc_c1, mc_c2, mc_c3 = st.columns(3)
+    mc_runs = mc_c1.number_input("Scenarios", min_value=10_000, value=1_000_000, step=100_000)
+    mc_spread = mc_c2.slider("Price & Yield Spread (±%)", 1, 30, 10)
+    mc_chunk = mc_c3.number_input("Chunk Size", min_value=10_000, value=200_000, step=50_000)
+    mc_save_path = st.text_input("Save Run To (folder, optional)", help="Stores inputs and key outputs as a memory-mapped table that can be reopened below.")
+    mc_float32 = st.checkbox("Store as float32 (half the disk space)", value=True)
+    mc_overwrite = st.checkbox("Overwrite existing run", value=False, help="Otherwise a folder that already holds a saved run is left untouched.")
+    if st.button("Run Simulation"):
+        spreads = {k: mc_spread/100 for k in streaming_stats.DEFAULT_SPREADS}
+        agg = streaming_stats.StreamingAggregator()
+        auditor = audit.AuditSampler()
+        try:
+            writer = results_store.ScenarioTableWriter(mc_save_path, list(spreads) + list(streaming_stats.DEFAULT_METRICS), int(mc_runs), "float32" if mc_float32 else "float64", overwrite=mc_overwrite) if mc_save_path else None
+        except FileExistsError as exc:
+            st.error(f"{exc}. Choose another folder or tick 'Overwrite existing run'.")
+        else:
+            progress, table = st.progress(0.0), st.empty()
+            for outputs in streaming_stats.monte_carlo_chunks(input_dict, int(mc_runs), int(mc_chunk), spreads, audit=auditor):
+                agg.update(outputs)
+                if writer: writer.write(outputs)
+                progress.progress(min(1.0, agg.count / mc_runs), text=f"{agg.count:,} / {int(mc_runs):,} scenarios")
+                table.dataframe(pd.DataFrame(agg.summary()).T.drop(columns="count"), use_container_width=True)
+            roce_hist = agg.metrics["roce_pat"].histogram
+            st.plotly_chart(charts.histogram(roce_hist.edges, roce_hist.counts, "ROCE (PAT Basis) Distribution", "ROCE (%)"), use_container_width=True)
+            audit_summary = auditor.summary()
+            worst = next(iter(audit_summary["max_abs_divergence"].items()), None)
+            st.caption(f"Decimal audit: {audit_summary['audited']} sampled scenarios rechecked ({audit_summary['overhead']:.1%} of engine time), "
+                       f"{audit_summary['divergent']} differ at the paisa" + (f"; largest: {worst[0]} by ₹ {worst[1]:,.2f}." if worst else "."))
+            if writer:
+                writer.close()
+                st.success(f"Saved {writer.rows:,} scenarios to `{mc_save_path}`.")
+
+with st.expander("📂 Saved Scenario Runs", expanded=False):
+    saved_run_path = st.text_input("Run Folder")
+    if saved_run_path:
+        try:
+            saved_run = results_store.ScenarioTable.open(saved_run_path)
+        except (OSError, ValueError) as exc:
+            st.error(f"Could not open run: {exc}")
+        else:
+            st.caption(f"{len(saved_run):,} scenarios · {len(saved_run.columns)} columns · {saved_run.nbytes/1e6:,.0f} MB ({saved_run.dtype})")
+            saved_metric = st.selectbox("Metric", saved_run.columns, index=len(saved_run.columns) - 1)
+            qs = [0.05, 0.25, 0.5, 0.75, 0.95]
+            st.dataframe(pd.DataFrame({"Percentile": [f"P{int(q*100)}" for q in qs], saved_metric: np.quantile(saved_run[saved_metric], qs)}), use_container_width=True)
+            sx_col, sy_col = st.columns(2)
+            scatter_x = sx_col.selectbox("Scatter X", saved_run.columns, index=0)
+            scatter_y = sy_col.selectbox("Scatter Y", saved_run.columns, index=len(saved_run.columns) - 1)
+            st.plotly_chart(charts.scatter(saved_run[scatter_x], saved_run[scatter_y], scatter_x, scatter_y), use_container_width=True)
+            st.dataframe(saved_run[:1000].to_pandas(), use_container_width=True)
+
+with st.expander("⚙️ Capacity & Throughput Optimizer", expanded=False):
+    cap_c1, cap_c2, cap_c3 = st.columns(3)
+    kg_capacity = cap_c1.number_input("Kachi Ghani Line Capacity (MT seed/day)", min_value=10.0, value=260.0, step=10.0)
+    exp_capacity = cap_c2.number_input("Expeller Line Capacity (MT seed/day)", min_value=10.0, value=240.0, step=10.0)
+    moc_storage = cap_c3.number_input("MoC Storage (MT)", min_value=10.0, value=1000.0, step=50.0)
+    cap_c4, cap_c5, cap_c6 = st.columns(3)
+    cap_objective = cap_c4.selectbox("Maximise", capacity_optimizer.OBJECTIVES, format_func=lambda k: k.replace("_", " ").upper())
+    cap_days = cap_c5.slider("Production Days/Month Range", 15, 31, (20, 30))
+    cap_congestion = cap_c6.slider("Cost Uplift at Full Capacity (%)", 0, 200, 60)
+    plan = compute.run(capacity_optimizer.optimize_capacity, input_dict, kg_capacity, exp_capacity, moc_storage, cap_objective,
+                       days_range=cap_days, congestion_coef=cap_congestion/100)
+    if plan["best"] is None:
+        st.warning("No plan fits the MoC storage limit.")
+    else:
+        best = plan["best"]
+        opt_c1, opt_c2, opt_c3, opt_c4 = st.columns(4)
+        opt_c1.metric("Optimal Seed Crush", f"{best['seed_input_mt']:,.1f} MT/day")
+        opt_c2.metric("Production Days/Month", best["production_days_per_month"])
+        opt_c3.metric("Annual PAT", f"₹ {format_indian(best['annual_pat'])}", f"₹ {format_indian(best['annual_pat'] - metrics['annual_pat'])} vs current")
+        opt_c4.metric("ROCE (PAT Basis)", f"{best['roce_pat']:.2f}%", f"{best['roce_pat'] - metrics['roce_pat']:.2f} pts vs current")
+        st.caption(f"Line utilisation: Kachi Ghani {best['kachi_ghani_utilisation']:.0%} · Expeller {best['expeller_utilisation']:.0%} · "
+                   f"Processing cost ₹{best['processing_cost_per_mt']:,.0f}/MT · MoC stock {best['moc_stock_mt']:,.0f} MT")
+        shown_days = sorted({int(plan["days_per_month"][0]), best["production_days_per_month"], int(plan["days_per_month"][-1])})
+        curves = {f"{d} days/month": plan["objective"][:, d - plan["days_per_month"][0]] for d in shown_days}
+        st.plotly_chart(charts.time_series(plan["crush_mt"], curves, "Response to Daily Seed Crush", y_title=cap_objective.replace("_", " ").upper()), use_container_width=True)
+
+with st.expander("🔄 Working-Capital Cycle Optimizer", expanded=False):
+    wc_c1, wc_c2 = st.columns(2)
+    wc_objective = wc_c1.selectbox("Optimise", tuple(wc_optimizer.OBJECTIVES), format_func=lambda k: ("Maximise " if wc_optimizer.OBJECTIVES[k] else "Minimise ") + k.replace("_", " ").upper())
+    wc_service = wc_c2.slider("Minimum Service Level per Stock (%)", 80.0, 99.9, 95.0, step=0.1)
+    wc_args = (input_dict, wc_objective, wc_service/100)
+    wc_key = compute_queue.scenario_key(wc_optimizer.optimize_wc, wc_args, {})
+    if st.button("Run WC Optimizer"):
+        st.session_state["wc_optimizer_key"] = wc_key
+    if st.session_state.get("wc_optimizer_key") != wc_key:
+        st.info("Searches about 200,000 combinations of the WC days (about half a second). Results clear when the inputs change; run it again to refresh.")
+    else:
+        wc_plan = compute.run(wc_optimizer.optimize_wc, *wc_args)  # cached, so later reruns with the same inputs are free
+        if wc_plan["best"] is None:
+            st.warning("No combination within the commercial bounds meets this service level.")
+        else:
+            wc_best, wc_now = wc_plan["best"], wc_plan["current"]
+            wco_c1, wco_c2, wco_c3, wco_c4 = st.columns(4)
+            wco_c1.metric("ROCE (PAT Basis)", f"{wc_best['roce_pat']:.2f}%", f"{wc_best['roce_pat'] - wc_now['roce_pat']:.2f} pts vs current")
+            wco_c2.metric("Net WC Requirement", f"₹ {format_indian(wc_best['net_wc_requirement'])}", f"₹ {format_indian(wc_best['net_wc_requirement'] - wc_now['net_wc_requirement'])}", delta_color="inverse")
+            wco_c3.metric("Annual Interest", f"₹ {format_indian(wc_best['annual_interest'])}", f"₹ {format_indian(wc_best['annual_interest'] - wc_now['annual_interest'])}", delta_color="inverse")
+            wco_c4.metric("Stock-Out Risk per Cycle", f"{wc_best['stockout_risk']:.1%}", f"{(wc_best['stockout_risk'] - wc_now['stockout_risk'])*100:.1f} pts", delta_color="inverse")
+            st.dataframe(pd.DataFrame({"Current": [wc_now[k] for k in wc_optimizer.WC_KEYS], "Recommended": [wc_best[k] for k in wc_optimizer.WC_KEYS]},
+                                      index=[k.replace("_", " ").title() for k in wc_optimizer.WC_KEYS]), use_container_width=True)
+        st.plotly_chart(charts.time_series(wc_plan["frontier_risk"]*100, {"Efficient frontier": wc_plan["frontier_value"]}, "Best Achievable vs Stock-Out Risk",
+                                           y_title=wc_objective.replace("_", " ").upper()), use_container_width=True)
+        st.caption(f"{wc_plan['candidates']:,} combinations of the WC days and financed hoard share evaluated. Stock-out risk is the chance that any of seed, oil or MoC stock runs out in a replenishment cycle; your current settings sit at {wc_plan['current']['stockout_risk']:.1%}.")
+
+with st.expander("📋 Plan vs Actual", expanded=False):
+    actuals_path = st.text_input("Daily Actuals Log (CSV or JSONL path)", help="One record per day: seed crushed, measured yields and pungency, realised prices and dispatches. New days appended to the file are picked up on the next rerun.")
+    if actuals_path:
+        try:
+            ledger = actuals_ledger(actuals_path, tuple(sorted((k, v) for k, v in input_dict.items() if k in engine.DEFAULT_INPUTS)))
+            ledger.follow(actuals_path)
+        except (OSError, ValueError, KeyError) as exc:
+            st.error(f"Could not read actuals: {exc}")
+            ledger = None
+        if ledger is not None and ledger.skipped:
+            st.warning(f"Skipped {ledger.skipped} unreadable record(s) in the actuals log; last: {ledger.last_error}")
+        if ledger is not None and len(ledger):
+            for title, totals in (("Month to Date", ledger.mtd()), ("Year to Date", ledger.ytd())):
+                st.markdown(f"**{title}** ({totals['from']} to {totals['to']}, {totals['days']} days)")
+                pva_cols = st.columns(len(plan_vs_actual.EFFECTS) + 2)
+                pva_cols[0].metric("Actual GM", f"₹ {format_indian(totals['actual_gm'])}", f"₹ {format_indian(totals['variance'])} vs plan")
+                for col, effect in zip(pva_cols[1:], plan_vs_actual.EFFECTS):
+                    col.metric(f"{effect.title()} Effect", f"₹ {format_indian(totals[f'{effect}_effect'])}")
+                pva_cols[-1].metric("Seed Crushed", f"{totals['actual_seed_mt']:,.0f} MT", f"{totals['actual_seed_mt'] - totals['plan_seed_mt']:,.0f} MT vs plan")
+            mtd_daily = ledger.daily(ledger.mtd()["from"])
+            st.plotly_chart(charts.time_series(mtd_daily["day"], {f"{e.title()} effect": mtd_daily[f"{e}_effect"] for e in plan_vs_actual.EFFECTS},
+                                               "Daily GM Variance by Driver (MTD)", y_title="₹"), use_container_width=True)
+            st.caption("Variance splits by substituting actuals into the plan in turn: volume (seed crushed), yield, blend (pungency) and price; dispatch is what was actually dispatched and bought vs the fully flexed model.")
+
+with st.expander("🧪 Lender Stress Tests", expanded=False):
+    st.caption("Every combination of the stress factors below (seed and oil prices, MoC price, yields, debtor and creditor days, interest, production days) is evaluated against the current inputs.")
+    st_c1, st_c2, st_c3 = st.columns(3)
+    stress_tenor = st_c1.number_input("Term-Loan Tenor for DSCR (Years)", min_value=1.0, value=7.0, step=1.0)
+    stress_min_dscr = st_c2.number_input("Minimum DSCR Covenant", min_value=0.0, value=1.2, step=0.1)
+    stress_top = st_c3.slider("Worst Cases to Show", 5, 50, 10)
+    stress = compute.run(stress_test.run_stress, input_dict, top=stress_top, loan_tenor_years=stress_tenor, min_dscr=stress_min_dscr)
+    sm_c1, sm_c2, sm_c3 = st.columns(3)
+    sm_c1.metric("Scenarios Evaluated", f"{stress['nodes']:,}")
+    sm_c2.metric("Loss-Making Scenarios", f"{stress['loss_making_nodes']:,}")
+    sm_c3.metric(f"DSCR Below {stress_min_dscr:.2f}x", f"{stress['dscr_breaches']:,}", f"Base DSCR {stress['base']['dscr']:.2f}x", delta_color="off")
+    st.markdown("**Standard Pack**")
+    st.dataframe(pd.DataFrame([{"Stress": row["name"], "Annual PAT (₹)": format_indian(row["annual_pat"]), "DSCR": f"{row['dscr']:.2f}x",
+                                "Net WC Requirement (₹)": format_indian(row["net_wc_requirement"])} for row in stress["pack"]]), use_container_width=True)
+    for metric, (label, _) in stress_test.RANKED_METRICS.items():
+        st.markdown(f"**Worst {label}**")
+        st.dataframe(pd.DataFrame([{"Shocks": row["shocks"], label: f"{row['value']:.2f}x" if metric == "dscr" else f"₹ {format_indian(row['value'])}",
+                                    "Change vs Base": f"{row['change']:+.2f}x" if metric == "dscr" else f"₹ {format_indian(row['change'])}"}
+                                   for row in stress["worst"][metric]]), use_container_width=True)
+
+with st.expander("📉 Commodity Hedging Simulator", expanded=False):
+    st.caption("Seed, oil and MoC prices follow correlated monthly paths over the next 12 months; each strategy hedges a share of seed purchases (long) and oil/MoC sales (short) with futures or forwards.")
+    hg_c1, hg_c2, hg_c3 = st.columns(3)
+    hedge_paths = hg_c1.select_slider("Price Paths", [10_000, 20_000, 50_000, 100_000], value=20_000)
+    hedge_carry = hg_c2.number_input("Futures Carry (% p.a.)", min_value=0.0, value=6.0, step=0.5)
+    hedge_margin = hg_c3.number_input("Initial Margin (% of notional)", min_value=0.0, value=10.0, step=1.0)
+    hedge_args = (input_dict,)
+    hedge_kwargs = {"n_paths": hedge_paths, "processes": 1,  # in-process: no pool forked from the server
+                    "market": {"carry_pct_pa": hedge_carry, "drift_pct_pa": hedge_carry, "initial_margin_pct": hedge_margin}}
+    hedge_key = compute_queue.scenario_key(hedge_simulator.simulate, hedge_args, hedge_kwargs)
+    if st.button("Run Hedge Simulation"):
+        st.session_state["hedge_key"] = hedge_key
+    if st.session_state.get("hedge_key") != hedge_key:
+        st.info("Simulates every strategy over the price paths (under a second at 20,000 paths). Results clear when the inputs change; run it again to refresh.")
+    else:
+        hedge_results = compute.run(hedge_simulator.simulate, *hedge_args, **hedge_kwargs)  # cached for later reruns
+        hedge_rows = [{"Strategy": name, "Mean PAT (₹)": format_indian(r["annual_pat"]["mean"]), "P5 PAT (₹)": format_indian(r["annual_pat"]["p5"]),
+                       "P(Loss)": f"{r['annual_pat']['P(annual_pat < 0)']:.1%}", "Mean Crush Margin (₹/MT)": format_indian(r["crush_margin_per_mt"]["mean"]),
+                       "P5 Crush Margin (₹/MT)": format_indian(r["crush_margin_per_mt"]["p5"]), "P95 Margin Cash (₹)": format_indian(r["peak_margin_cash"]["p95"]),
+                       "_p5": r["annual_pat"]["p5"]} for name, r in hedge_results.items()]
+        st.dataframe(pd.DataFrame(sorted(hedge_rows, key=lambda row: -row["_p5"])).drop(columns="_p5"), use_container_width=True)
+        st.caption("Sorted by 5th-percentile PAT. Margin cash is the peak initial plus variation margin funded on futures; forwards settle at maturity and need none.")
 
 with st.expander("ℹ️ Click here to see key calculation logic"):
     st.markdown("""
@@ -249,6 +446,7 @@ with st.expander("ℹ️ Click here to see key calculation logic"):
     - **ROCE:** Calculated on an annualized basis.
       - `Standard ROCE (PAT) = Annual PAT / (Capex + Net WC Requirement + Other Assets)`
       - `ROCE with Synergy (PAT) = (Annual PAT + Annual Solvex Savings) / (Capex + Net WC Requirement + Other Assets)`
+      - `Combined ROCE (PAT) = Combined PAT / (Crushing + Solvex Capex + Combined Net WC + Other Assets)`, where the Solvex plant buys in-house MoC at the MoC sell price, earns on recovered oil and de-oiled cake, and the intra-group MoC debtors are eliminated.
     """)
 
 # --- Code Completion Marker ---
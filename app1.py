@@ -1,24 +1,15 @@
+import contextlib
+import time
+import uuid
+
 import streamlit as st
 import pandas as pd
 
-# --- Page Configuration and Helper Function ---
-st.set_page_config(layout="wide", page_title="Mustard Oil Business Dashboard")
+import compute_queue
+from formatting import format_indian
 
-def format_indian(num):
-    """Formats a number into the Indian numbering system for better readability."""
-    if not isinstance(num, (int, float)): return num
-    num_str = f"{abs(num):,.0f}"
-    parts = num_str.split('.')
-    integer_part = parts[0].replace(',', '')
-    if len(integer_part) > 3:
-        last_three = integer_part[-3:]
-        other_digits = integer_part[:-3]
-        if other_digits:
-            formatted_other_digits = ','.join([other_digits[max(0, i-2):i] for i in range(len(other_digits), 0, -2)][::-1])
-            formatted_num = f"{formatted_other_digits},{last_three}"
-        else: formatted_num = last_three
-    else: formatted_num = integer_part
-    return '-' + formatted_num if num < 0 else formatted_num
+# --- Page Configuration ---
+st.set_page_config(layout="wide", page_title="Mustard Oil Business Dashboard")
 
 st.title("🛢️ Mustard Oil Financial & Operational Dashboard")
 st.markdown("An interactive dashboard for comprehensive analysis of a mustard oil processing business.")
@@ -26,50 +17,54 @@ st.markdown("An interactive dashboard for comprehensive analysis of a mustard oi
 # --- Sidebar for All User Inputs ---
 with st.sidebar:
     st.header("⚙️ Business & Financial Inputs")
-    with st.expander("Production & Prices", expanded=True):
-        seed_input_mt = st.number_input("Daily Seed Input (MT)", value=192.0)
-        kachi_ghani_yield_pct = st.slider("Kachi Ghani Oil Yield (%)", 0, 100, 18)
-        expeller_yield_pct = st.slider("Expeller Oil Yield (%)", 0, 100, 15)
-        seed_purchase_price = st.number_input("Seed Purchase Price (₹/MT)", value=54500)
-        oil_blend_sell_price = st.number_input("Oil Blend Sell Price (₹/MT)", value=141000)
-        moc_sell_price = st.number_input("MoC Sell Price (₹/MT)", value=22000)
-    with st.expander("Costs & Expenses", expanded=True):
-        processing_cost_per_mt = st.number_input("Processing Cost (₹/MT of Seed)", value=2000)
-        other_variable_costs_per_mt = st.number_input("Other Variable Costs (₹/MT of Seed)", value=500)
-        other_expenses_daily = st.number_input("Other Fixed Expenses (₹/day)", value=45000)
-        production_days_per_month = st.number_input("Production Days per Month", value=24)
-    with st.expander("Pungency & MoC Enhancement", expanded=True):
-        kachi_ghani_pungency = st.slider("Kachi Ghani Oil Pungency (%)", 0.0, 1.0, 0.38, step=0.01)
-        expeller_oil_pungency = st.slider("Expeller Oil Pungency (%)", 0.0, 1.0, 0.12, step=0.01)
-        expeller_oil_sell_price = st.number_input("Expeller Oil Sell Price (₹/MT)", value=136000)
-        market_bought_oil_price = st.number_input("Market-Bought Oil Price (₹/MT)", value=132000)
-        water_added_pct = st.slider("Water Added to MoC (% of seed)", 0, 10, 2)
-        water_cost_per_kg = st.number_input("Water Cost (₹/kg)", value=1)
-        salt_added_pct = st.slider("Salt Added to MoC (% of seed)", 0, 10, 3)
-        salt_cost_per_kg = st.number_input("Salt Cost (₹/kg)", value=5)
-    with st.expander("Capex, Tax & Financing", expanded=True):
-        capex = st.number_input("Capex (₹)", value=190000000)
-        depreciation_years = st.number_input("Depreciation Period (Years)", min_value=1, value=15)
-        tax_rate_pct = st.slider("Tax Rate (%)", 0, 50, 25)
-        other_assets = st.number_input("Other Assets (₹)", value=0)
-        warehouse_finance_rate_pa = st.slider("Warehouse Finance Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for financed RM Hoard")
-        main_financing_rate_pa = st.slider("Main Financing Cost Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for Capex and remaining WC")
-        rm_hoard_financed_pct = st.slider("% of Hoarded RM Financed", 0, 100, 80)
-    with st.expander("Working Capital Cycles", expanded=True):
-        rm_hoard_months = st.number_input("Raw Material Hoard (months)", value=6)
-        hoarded_rm_rate = st.number_input("Hoarded RM Rate (₹/MT)", value=53500)
-        rm_safety_stock_days = st.number_input("RM Safety Stock (days)", value=48)
-        fg_oil_safety_days = st.number_input("FG (Oil) Safety Stock (days)", value=15)
-        fg_moc_safety_days = st.number_input("FG (MoC) Safety Stock (days)", value=4)
-        oil_debtor_days = st.number_input("Oil Debtor Cycle (days)", value=5)
-        moc_debtor_days = st.number_input("MoC Debtor Cycle (days)", value=5)
-        creditor_days = st.number_input("Creditors Days", value=3)
-    with st.expander("🏭 Solvex Plant Synergy Inputs", expanded=False):
-        moc_consumed_perc = st.slider("% of MOC Consumed In-House", 0, 100, 100)
-        logistics_saved_per_ton = st.number_input("Logistics Saved (₹/Ton of MOC)", value=400)
-        labor_saved_nos = st.number_input("Labor Headcount Saved (Daily)", value=4)
-        labor_cost_per_head_daily = st.number_input("Cost per Labor Head (₹/Day)", value=550)
-        brokerage_saved_per_ton = st.number_input("Brokerage Saved (₹/Ton of MOC)", value=25)
+    _batch_edits = st.checkbox("Batch edits (apply with a button)", help="Collect sidebar changes and recompute once when you click Apply, instead of on every slider move.")
+    with st.form("sidebar_inputs") if _batch_edits else contextlib.nullcontext():
+        with st.expander("Production & Prices", expanded=True):
+            seed_input_mt = st.number_input("Daily Seed Input (MT)", value=192.0)
+            kachi_ghani_yield_pct = st.slider("Kachi Ghani Oil Yield (%)", 0, 100, 18)
+            expeller_yield_pct = st.slider("Expeller Oil Yield (%)", 0, 100, 15)
+            seed_purchase_price = st.number_input("Seed Purchase Price (₹/MT)", value=54500)
+            oil_blend_sell_price = st.number_input("Oil Blend Sell Price (₹/MT)", value=141000)
+            moc_sell_price = st.number_input("MoC Sell Price (₹/MT)", value=22000)
+        with st.expander("Costs & Expenses", expanded=True):
+            processing_cost_per_mt = st.number_input("Processing Cost (₹/MT of Seed)", value=2000)
+            other_variable_costs_per_mt = st.number_input("Other Variable Costs (₹/MT of Seed)", value=500)
+            other_expenses_daily = st.number_input("Other Fixed Expenses (₹/day)", value=45000)
+            production_days_per_month = st.number_input("Production Days per Month", value=24)
+        with st.expander("Pungency & MoC Enhancement", expanded=True):
+            kachi_ghani_pungency = st.slider("Kachi Ghani Oil Pungency (%)", 0.0, 1.0, 0.38, step=0.01)
+            expeller_oil_pungency = st.slider("Expeller Oil Pungency (%)", 0.0, 1.0, 0.12, step=0.01)
+            expeller_oil_sell_price = st.number_input("Expeller Oil Sell Price (₹/MT)", value=136000)
+            market_bought_oil_price = st.number_input("Market-Bought Oil Price (₹/MT)", value=132000)
+            water_added_pct = st.slider("Water Added to MoC (% of seed)", 0, 10, 2)
+            water_cost_per_kg = st.number_input("Water Cost (₹/kg)", value=1)
+            salt_added_pct = st.slider("Salt Added to MoC (% of seed)", 0, 10, 3)
+            salt_cost_per_kg = st.number_input("Salt Cost (₹/kg)", value=5)
+        with st.expander("Capex, Tax & Financing", expanded=True):
+            capex = st.number_input("Capex (₹)", value=190000000)
+            depreciation_years = st.number_input("Depreciation Period (Years)", min_value=1, value=15)
+            tax_rate_pct = st.slider("Tax Rate (%)", 0, 50, 25)
+            other_assets = st.number_input("Other Assets (₹)", value=0)
+            warehouse_finance_rate_pa = st.slider("Warehouse Finance Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for financed RM Hoard")
+            main_financing_rate_pa = st.slider("Main Financing Cost Interest Rate (% p.a.)", 0.0, 25.0, 12.0, help="Interest for Capex and remaining WC")
+            rm_hoard_financed_pct = st.slider("% of Hoarded RM Financed", 0, 100, 80)
+        with st.expander("Working Capital Cycles", expanded=True):
+            rm_hoard_months = st.number_input("Raw Material Hoard (months)", value=6)
+            hoarded_rm_rate = st.number_input("Hoarded RM Rate (₹/MT)", value=53500)
+            rm_safety_stock_days = st.number_input("RM Safety Stock (days)", value=48)
+            fg_oil_safety_days = st.number_input("FG (Oil) Safety Stock (days)", value=15)
+            fg_moc_safety_days = st.number_input("FG (MoC) Safety Stock (days)", value=4)
+            oil_debtor_days = st.number_input("Oil Debtor Cycle (days)", value=5)
+            moc_debtor_days = st.number_input("MoC Debtor Cycle (days)", value=5)
+            creditor_days = st.number_input("Creditors Days", value=3)
+        with st.expander("🏭 Solvex Plant Synergy Inputs", expanded=False):
+            moc_consumed_perc = st.slider("% of MOC Consumed In-House", 0, 100, 100)
+            logistics_saved_per_ton = st.number_input("Logistics Saved (₹/Ton of MOC)", value=400)
+            labor_saved_nos = st.number_input("Labor Headcount Saved (Daily)", value=4)
+            labor_cost_per_head_daily = st.number_input("Cost per Labor Head (₹/Day)", value=550)
+            brokerage_saved_per_ton = st.number_input("Brokerage Saved (₹/Ton of MOC)", value=25)
+        if _batch_edits:
+            st.form_submit_button("Apply Changes", type="primary", use_container_width=True)
 
 # --- Calculation Engine (Triple-Verified & Final) ---
 @st.cache_data
@@ -153,7 +148,19 @@ def calculate_all_metrics(inputs):
 
 # --- Collect Inputs & Run Calculation Engine ---
 input_dict = {k: v for k, v in locals().items() if isinstance(v, (int, float, str)) and not k.startswith('_')}
-metrics = calculate_all_metrics(input_dict)
+
+@st.cache_resource
+def shared_compute():
+    """One compute queue (coalesces identical scenarios) and rate limiter for all sessions on this server."""
+    return compute_queue.ComputeQueue(), compute_queue.RateLimiter()
+
+compute, rate_limiter = shared_compute()
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+if (rerun_wait := rate_limiter.delay(session_id, debounce=not _batch_edits)) > 0:
+    with st.spinner("Applying changes..."):
+        time.sleep(rerun_wait)  # a newer edit interrupts this run at the next Streamlit call
+metrics = compute.run(calculate_all_metrics, input_dict)
+rate_limiter.mark(session_id)
 
 # --- Main Dashboard Display ---
 st.subheader("Pungency Compliance")
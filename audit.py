@@ -0,0 +1,346 @@
+"""Exact-decimal audit of the float engine.
+
+``audit_scenario`` recomputes one scenario with ``decimal.Decimal``. It follows
+the same formulas as ``engine.calculate_batch`` but applies bookkeeping rounding
+rules:
+
+* inputs are taken at the decimal value they were entered as (``repr`` of the float);
+* quantities (MT, kg) and rates are never rounded;
+* every rupee line - each revenue stream, each cost, each WC balance, interest,
+  depreciation and tax - is posted to the paisa (ROUND_HALF_UP), and subtotals
+  (GM, CM, EBITDA, PBT, ...) are sums of posted lines;
+* Monthly and Annual views are the posted daily line times the day count, posted
+  again;
+* ROCE is shown to two decimals.
+
+``compare`` rounds the float engine's figures and the exact Decimal values
+(lines carried unrounded) to the displayed paisa / 0.01% and reports every key
+where they disagree, i.e. float drift an auditor would see on screen. With
+``posted=True`` it compares against the posted books instead. Those differ by
+design: a daily line posted to the paisa and then multiplied by 300 days moves
+the annual figure by up to ₹1.50.
+
+``AuditSampler`` audits a random sample of rows from batch runs (the HTTP
+service, Monte Carlo chunks, report packs). It stops sampling whenever audit
+time would exceed ``max_overhead`` of the engine time it rides on.
+
+    python audit.py --bench   # Decimal throughput and sampler overhead
+"""
+import argparse
+import threading
+import time
+from collections import deque
+from decimal import ROUND_HALF_UP, Decimal, localcontext
+
+import numpy as np
+
+import engine
+
+PAISA, BASIS = Decimal("0.01"), Decimal("0.01")
+ZERO, HUNDRED, THOUSAND = Decimal(0), Decimal(100), Decimal(1000)
+MIN_PUNGENCY_REQ = Decimal(repr(engine.MIN_PUNGENCY_REQ))
+
+# Daily P&L lines that display_pnl also shows per month and per year.
+PERIOD_LINES = ("daily_total_revenue", "daily_cogs", "daily_gm", "daily_processing_cost", "daily_cm",
+                "daily_variable_cost", "daily_other_expenses", "daily_ebitda")
+RUPEE_KEYS = PERIOD_LINES + (
+    "daily_revenue_oil_blend", "daily_revenue_expeller_separate", "daily_revenue_moc",
+    "rm_hoarded_value", "inventory_fg", "total_inventory", "total_debtors", "trade_creditors",
+    "financed_rm_hoard_value", "gross_wc", "net_wc_requirement",
+    "annual_ebitda", "annual_interest", "annual_depreciation", "annual_pbt", "annual_tax", "annual_pat",
+    "capital_employed", "daily_solvex_saving",
+    "solvex_daily_revenue", "solvex_daily_ebitda", "solvex_net_wc",
+    "combined_annual_ebitda", "combined_annual_pbt", "combined_annual_pat", "combined_capital_employed",
+) + tuple(f"{p}_{k[len('daily_'):]}" for p in ("monthly", "annual_view") for k in PERIOD_LINES)
+PERCENT_KEYS = ("roce_pat", "roce_ebitda", "roce_pat_with_synergy", "roce_ebitda_with_synergy",
+                "combined_roce_pat", "combined_roce_ebitda")
+AUDIT_KEYS = RUPEE_KEYS + PERCENT_KEYS
+
+
+def _dec(value):
+    return Decimal(repr(float(value)))
+
+
+def _post(amount):
+    """Posts a rupee amount to the paisa."""
+    return amount.quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def _unrounded(amount):
+    return amount
+
+
+def _div(num, den):
+    return num / den if den != 0 else ZERO
+
+
+def audit_scenario(inputs, posted=True):
+    """Recomputes one scenario in Decimal arithmetic; returns ``{key: Decimal}`` for AUDIT_KEYS.
+
+    With ``posted=False`` rupee lines are carried unrounded, giving the exact
+    value of the engine's formulas.
+    """
+    post = _post if posted else _unrounded
+    bad = non_finite_inputs(inputs)
+    if bad:
+        raise ValueError(f"cannot audit non-finite inputs: {', '.join(bad)}")
+    c = {k: _dec(inputs.get(k, default)) for k, default in engine.DEFAULT_INPUTS.items()}
+    with localcontext() as ctx:
+        ctx.prec = 34
+        seed = c["seed_input_mt"]
+        kg_p, exp_p = c["kachi_ghani_pungency"], c["expeller_oil_pungency"]
+        kg_oil, exp_oil = seed*c["kachi_ghani_yield_pct"]/HUNDRED, seed*c["expeller_yield_pct"]/HUNDRED
+        moc_base_yield = 1 - (c["kachi_ghani_yield_pct"] + c["expeller_yield_pct"])/HUNDRED
+        total_oil = kg_oil + exp_oil
+        pungency_mass = kg_oil*kg_p + exp_oil*exp_p
+        blend_p = _div(pungency_mass, total_oil)
+        exp_used, exp_sold, market_oil = exp_oil, ZERO, ZERO
+        if total_oil > 0 and blend_p < MIN_PUNGENCY_REQ:
+            den = MIN_PUNGENCY_REQ - exp_p
+            if kg_p > MIN_PUNGENCY_REQ and den > 0:
+                exp_used = min(exp_oil, max(ZERO, kg_oil*(kg_p - MIN_PUNGENCY_REQ)/den))
+            exp_sold = exp_oil - exp_used
+        elif total_oil > 0 and blend_p > MIN_PUNGENCY_REQ:
+            market_oil = max(ZERO, pungency_mass/MIN_PUNGENCY_REQ - total_oil)
+        blend_mt = kg_oil + exp_used + market_oil
+        water_mt, salt_mt = seed*c["water_added_pct"]/HUNDRED, seed*c["salt_added_pct"]/HUNDRED
+        moc_mt = seed*moc_base_yield + water_mt + salt_mt
+
+        r = {}
+        r["daily_revenue_oil_blend"] = post(blend_mt*c["oil_blend_sell_price"])
+        r["daily_revenue_expeller_separate"] = post(exp_sold*c["expeller_oil_sell_price"])
+        r["daily_revenue_moc"] = post(moc_mt*c["moc_sell_price"])
+        r["daily_total_revenue"] = (r["daily_revenue_oil_blend"] + r["daily_revenue_expeller_separate"]
+                                    + r["daily_revenue_moc"])
+        seed_cost = post(seed*c["seed_purchase_price"])
+        r["daily_cogs"] = (seed_cost + post(market_oil*c["market_bought_oil_price"])
+                           + post(water_mt*THOUSAND*c["water_cost_per_kg"]) + post(salt_mt*THOUSAND*c["salt_cost_per_kg"]))
+        r["daily_gm"] = r["daily_total_revenue"] - r["daily_cogs"]
+        r["daily_processing_cost"] = post(seed*c["processing_cost_per_mt"])
+        r["daily_cm"] = r["daily_gm"] - r["daily_processing_cost"]
+        r["daily_variable_cost"] = post(seed*c["other_variable_costs_per_mt"])
+        r["daily_other_expenses"] = post(c["other_expenses_daily"])
+        r["daily_ebitda"] = r["daily_cm"] - r["daily_variable_cost"] - r["daily_other_expenses"]
+        days_month = c["production_days_per_month"]
+        annual_days = days_month*12
+        for key in PERIOD_LINES:
+            r[f"monthly_{key[6:]}"] = post(r[key]*days_month)
+            r[f"annual_view_{key[6:]}"] = post(r[key]*annual_days)
+
+        r["rm_hoarded_value"] = post(seed*days_month*c["rm_hoard_months"]*c["hoarded_rm_rate"])
+        inventory_rm = r["rm_hoarded_value"] + post(seed*c["rm_safety_stock_days"]*c["seed_purchase_price"])
+        oil_revenue = r["daily_revenue_oil_blend"] + r["daily_revenue_expeller_separate"]
+        if _given(inputs, "fg_inventory_value"):
+            r["inventory_fg"] = post(_dec(inputs["fg_inventory_value"]))
+        else:
+            # qty x average price x days is the oil revenue itself times the days.
+            r["inventory_fg"] = (post(oil_revenue*c["fg_oil_safety_days"])
+                                 + post(moc_mt*c["moc_sell_price"]*c["fg_moc_safety_days"]))
+        r["total_inventory"] = inventory_rm + r["inventory_fg"]
+        r["total_debtors"] = (post(_dec(inputs["debtors_value"])) if _given(inputs, "debtors_value") else
+                              post(oil_revenue*c["oil_debtor_days"]) + post(r["daily_revenue_moc"]*c["moc_debtor_days"]))
+        r["trade_creditors"] = (post(_dec(inputs["creditors_value"])) if _given(inputs, "creditors_value") else
+                                post(seed_cost*c["creditor_days"]))
+        r["financed_rm_hoard_value"] = post(r["rm_hoarded_value"]*c["rm_hoard_financed_pct"]/HUNDRED)
+        r["gross_wc"] = r["total_inventory"] + r["total_debtors"] - r["trade_creditors"]
+        r["net_wc_requirement"] = r["gross_wc"] - r["financed_rm_hoard_value"]
+
+        capex = post(c["capex"])
+        r["annual_ebitda"] = post(r["daily_ebitda"]*annual_days)
+        r["annual_interest"] = (post(r["financed_rm_hoard_value"]*c["warehouse_finance_rate_pa"]/HUNDRED)
+                                + post((r["net_wc_requirement"] + capex)*c["main_financing_rate_pa"]/HUNDRED))
+        r["annual_depreciation"] = post(_div(capex, c["depreciation_years"] if c["depreciation_years"] > 0 else ZERO))
+        r["annual_pbt"] = r["annual_ebitda"] - r["annual_depreciation"] - r["annual_interest"]
+        r["annual_tax"] = post(max(ZERO, r["annual_pbt"]*c["tax_rate_pct"]/HUNDRED))
+        r["annual_pat"] = r["annual_pbt"] - r["annual_tax"]
+        r["capital_employed"] = capex + r["net_wc_requirement"] + post(c["other_assets"])
+        r["roce_pat"] = _div(r["annual_pat"], r["capital_employed"])*HUNDRED
+        r["roce_ebitda"] = _div(r["annual_ebitda"], r["capital_employed"])*HUNDRED
+
+        moc_inhouse = moc_mt*c["moc_consumed_perc"]/HUNDRED
+        r["daily_solvex_saving"] = (post(moc_inhouse*(c["logistics_saved_per_ton"] + c["brokerage_saved_per_ton"]))
+                                    + post(c["labor_saved_nos"]*c["labor_cost_per_head_daily"]))
+        annual_saving = post(r["daily_solvex_saving"]*annual_days)
+        r["roce_pat_with_synergy"] = _div(r["annual_pat"] + annual_saving, r["capital_employed"])*HUNDRED
+        r["roce_ebitda_with_synergy"] = _div(r["annual_ebitda"] + annual_saving, r["capital_employed"])*HUNDRED
+
+        solvex_oil = moc_inhouse*c["solvex_residual_oil_pct"]/HUNDRED*c["solvex_extraction_efficiency_pct"]/HUNDRED
+        r["solvex_daily_revenue"] = (post(solvex_oil*c["solvex_oil_sell_price"])
+                                     + post((moc_inhouse - solvex_oil)*c["doc_sell_price"]))
+        moc_cost = post(moc_inhouse*c["moc_sell_price"])
+        utility_cost = (post(moc_inhouse*c["solvent_loss_kg_per_mt"]*c["solvent_cost_per_kg"])
+                        + post(moc_inhouse*c["steam_kg_per_mt"]*c["steam_cost_per_kg"]))
+        r["solvex_daily_ebitda"] = (r["solvex_daily_revenue"] - moc_cost - utility_cost
+                                    - post(moc_inhouse*c["solvex_other_variable_costs_per_mt"])
+                                    - post(c["solvex_other_expenses_daily"]))
+        r["solvex_net_wc"] = (post(r["solvex_daily_revenue"]*(c["solvex_fg_safety_days"] + c["solvex_debtor_days"]))
+                              - post(utility_cost*c["solvex_creditor_days"]))
+        solvex_capex = post(c["solvex_capex"])
+        intra_group_debtors = post(moc_cost*c["moc_debtor_days"])
+        combined_wc = r["net_wc_requirement"] + r["solvex_net_wc"] - intra_group_debtors
+        r["combined_annual_ebitda"] = r["annual_ebitda"] + post((r["solvex_daily_ebitda"] + r["daily_solvex_saving"])*annual_days)
+        combined_interest = (post(r["financed_rm_hoard_value"]*c["warehouse_finance_rate_pa"]/HUNDRED)
+                             + post((combined_wc + capex + solvex_capex)*c["main_financing_rate_pa"]/HUNDRED))
+        combined_dep = r["annual_depreciation"] + post(_div(
+            solvex_capex, c["solvex_depreciation_years"] if c["solvex_depreciation_years"] > 0 else ZERO))
+        r["combined_annual_pbt"] = r["combined_annual_ebitda"] - combined_dep - combined_interest
+        r["combined_annual_pat"] = r["combined_annual_pbt"] - post(max(ZERO, r["combined_annual_pbt"]*c["tax_rate_pct"]/HUNDRED))
+        r["combined_capital_employed"] = r["capital_employed"] + solvex_capex + r["solvex_net_wc"] - intra_group_debtors
+        r["combined_roce_pat"] = _div(r["combined_annual_pat"], r["combined_capital_employed"])*HUNDRED
+        r["combined_roce_ebitda"] = _div(r["combined_annual_ebitda"], r["combined_capital_employed"])*HUNDRED
+        for key in PERCENT_KEYS:
+            r[key] = r[key].quantize(BASIS, rounding=ROUND_HALF_UP)
+    return r
+
+
+def non_finite_inputs(inputs):
+    """Inputs that are NaN or infinite (a NaN balance override just means "not given")."""
+    return [k for k, v in inputs.items() if k in engine.DEFAULT_INPUTS and not np.isfinite(v)
+            and not (k in engine.WC_OVERRIDES and v != v)]
+
+
+def _given(inputs, key):
+    value = inputs.get(key)
+    return value is not None and value == value  # NaN means "not given"
+
+
+def float_view(outputs, i=0):
+    """The float engine's figures for row ``i`` as they are displayed, keyed like audit_scenario."""
+    view = {k: float(outputs[k][i]) for k in RUPEE_KEYS + PERCENT_KEYS if k in outputs}
+    days_month = float(outputs["production_days_per_month"][i])
+    for key in PERIOD_LINES:
+        view[f"monthly_{key[6:]}"] = float(outputs[key][i]) * days_month
+        view[f"annual_view_{key[6:]}"] = float(outputs[key][i]) * days_month * 12
+    return view
+
+
+def compare(inputs, float_values=None, posted=False):
+    """Divergences between the float engine and the Decimal audit for one scenario.
+
+    Returns ``{key: (float_shown, decimal_value, difference)}`` for every key whose
+    displayed value (paise for rupees, 0.01 for ROCE %) differs.
+    """
+    if float_values is None:
+        float_values = float_view(engine.calculate_batch(inputs))
+    exact = audit_scenario(inputs, posted)
+    diverged = {}
+    for key in AUDIT_KEYS:
+        unit = PAISA if key in RUPEE_KEYS else BASIS
+        shown = _dec(float_values[key]).quantize(unit, rounding=ROUND_HALF_UP)
+        exact[key] = exact[key].quantize(unit, rounding=ROUND_HALF_UP)
+        if shown != exact[key]:
+            diverged[key] = (shown, exact[key], shown - exact[key])
+    return diverged
+
+
+class AuditSampler:
+    """Audits a random sample of batch rows, capped at ``max_overhead`` of engine time.
+
+    Call ``check(scenarios, outputs, engine_seconds)`` after each engine batch with
+    the batch inputs (a dict of columns or a list of scenario dicts).
+    Rows with non-finite inputs are counted in ``skipped_non_finite``, not audited.
+    Thread-safe, so one sampler can be shared by the HTTP service's workers.
+    """
+
+    def __init__(self, rate=0.001, max_overhead=0.05, max_per_batch=16, seed=None, keep_examples=20):
+        self.rate, self.max_overhead, self.max_per_batch = rate, max_overhead, max_per_batch
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.rows_seen = self.audited = self.divergent = self.skipped_for_budget = self.skipped_non_finite = 0
+        self.engine_seconds = self.audit_seconds = 0.0
+        self._seconds_per_audit = 2e-4
+        self.max_abs_divergence = {}
+        self.examples = deque(maxlen=keep_examples)
+
+    def check(self, scenarios, outputs, engine_seconds=0.0):
+        with self._lock:
+            n = len(next(iter(outputs.values())))
+            self.rows_seen += n
+            self.engine_seconds += engine_seconds
+            k = min(self._rng.binomial(n, self.rate), self.max_per_batch)
+            if k and engine_seconds:
+                # Only as many audits as the remaining time budget allows at the observed cost per audit.
+                budget = self.max_overhead * self.engine_seconds - self.audit_seconds
+                affordable = max(0, int(budget / self._seconds_per_audit))
+                self.skipped_for_budget += max(0, k - affordable)
+                k = min(k, affordable)
+            rows = self._rng.choice(n, size=k, replace=False) if k else ()
+        if not len(rows):
+            return
+        start = time.perf_counter()
+        if isinstance(scenarios, dict):
+            cols, _ = engine.to_columns(scenarios)
+            picked = [{key: float(col[i]) for key, col in cols.items()} for i in rows]
+        else:
+            picked = [scenarios[i] for i in rows]
+        found, non_finite = [], 0
+        for i, inputs in zip(rows, picked):
+            if non_finite_inputs(inputs):
+                non_finite += 1  # nothing exact to compare against
+                continue
+            diverged = compare(inputs, float_view(outputs, i))
+            if diverged:
+                found.append((int(i), inputs, diverged))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.audit_seconds += elapsed
+            self.audited += len(rows) - non_finite
+            self.skipped_non_finite += non_finite
+            self._seconds_per_audit = self.audit_seconds / max(self.audited, 1)
+            self.divergent += len(found)
+            for i, inputs, diverged in found:
+                for key, (_, _, diff) in diverged.items():
+                    self.max_abs_divergence[key] = max(self.max_abs_divergence.get(key, 0.0), abs(float(diff)))
+                self.examples.append({"row": i, "inputs": inputs,
+                                      "diverged": {k: [str(a), str(b)] for k, (a, b, _) in diverged.items()}})
+
+    def summary(self):
+        with self._lock:
+            return {
+                "rows_seen": self.rows_seen, "audited": self.audited, "divergent": self.divergent,
+                "skipped_for_budget": self.skipped_for_budget, "skipped_non_finite": self.skipped_non_finite,
+                "audit_seconds": self.audit_seconds, "engine_seconds": self.engine_seconds,
+                "overhead": self.audit_seconds / self.engine_seconds if self.engine_seconds else 0.0,
+                "max_abs_divergence": dict(sorted(self.max_abs_divergence.items(), key=lambda kv: -kv[1])),
+            }
+
+
+def benchmark(n=200_000, rate=0.001, chunk_size=50_000, seed=0):
+    """Times Decimal audits per scenario and a sampled Monte Carlo run against an unaudited one."""
+    import streaming_stats
+
+    start = time.perf_counter()
+    for i in range(200):
+        audit_scenario({"seed_input_mt": 150 + i})
+    per_audit = (time.perf_counter() - start) / 200
+
+    next(streaming_stats.monte_carlo_chunks(engine.DEFAULT_INPUTS, chunk_size, chunk_size, seed=seed))  # warm-up
+    start = time.perf_counter()
+    for _ in streaming_stats.monte_carlo_chunks(engine.DEFAULT_INPUTS, n, chunk_size, seed=seed):
+        pass
+    plain = time.perf_counter() - start
+    sampler = AuditSampler(rate=rate, seed=seed)
+    start = time.perf_counter()
+    for _ in streaming_stats.monte_carlo_chunks(engine.DEFAULT_INPUTS, n, chunk_size, seed=seed, audit=sampler):
+        pass
+    audited = time.perf_counter() - start
+    return {"decimal_audit_ms": per_audit * 1000, "plain_s": plain, "audited_s": audited,
+            "wall_overhead": audited / plain - 1, **sampler.summary()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit engine figures against exact Decimal arithmetic.")
+    parser.add_argument("--bench", action="store_true", help="measure audit throughput and sampling overhead")
+    parser.add_argument("--scenarios", type=int, default=200_000)
+    parser.add_argument("--rate", type=float, default=0.001)
+    args = parser.parse_args()
+    if args.bench:
+        for key, value in benchmark(args.scenarios, args.rate).items():
+            print(f"{key:>22}: {value}")
+    else:
+        for key, (shown, exact, diff) in compare(dict(engine.DEFAULT_INPUTS)).items():
+            print(f"{key:>32}: float {shown}  decimal {exact}  diff {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Lot-level pungency blending across tanks.
+
+The dashboard solves the 0.27% pungency fix once per day on average yields. On
+the floor every pressing lot has its own lab pungency and volume, and oil goes
+into a handful of blending tanks. ``BlendingScheduler`` consumes lots as they
+arrive and places them so each tank lands as close to spec as possible before
+it is dispatched:
+
+* every tank tracks its *excess* pungency mass, ``sum(v*p) - 0.27*sum(v)``;
+* a lot above spec is poured into the tank with the biggest deficit (and vice
+  versa), split so it only neutralises that deficit before moving on;
+* when a tank is full and low it is dispatched after diverting expeller oil
+  out of it. If even that cannot reach spec (the Kachi Ghani oil itself is
+  weak) the tank is downgraded and sold separately rather than dispatched
+  off-spec;
+* the diverted expeller oil is the first diluent for high tanks. A full high
+  tank waits for it and takes no more lots; market oil (0% pungency) is only
+  bought when every tank is waiting or at the final flush. Diverted oil left
+  over at the final flush is sold separately.
+
+Placement only looks at the current tank state, so each lot costs O(tanks)
+work and nothing is re-solved from scratch.
+
+    python blending_scheduler.py lots.jsonl --tanks 6 --capacity 40
+"""
+import argparse
+import csv
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from engine import MIN_PUNGENCY_REQ
+
+KACHI_GHANI, EXPELLER = "kachi_ghani", "expeller"
+EPS = 1e-9
+PUNGENCY_DECIMALS = 9  # dispatched pungency is reported rounded, so float noise never reads as off spec
+
+
+@dataclass
+class Lot:
+    lot_id: str
+    source: str          # "kachi_ghani" or "expeller"
+    volume_mt: float
+    pungency: float      # lab-measured, in %
+
+
+@dataclass
+class Dispatch:
+    tank: int
+    volume_mt: float     # oil blend dispatched, including any market oil
+    pungency: float
+    kachi_ghani_mt: float
+    expeller_in_blend_mt: float
+    expeller_diverted_mt: float
+    market_oil_mt: float
+    downgraded_mt: float  # below-spec oil sold separately because no correction could reach spec
+    diverted_oil_added_mt: float = 0.0  # expeller oil diverted from other tanks, used instead of market oil
+    lot_ids: list = field(default_factory=list)
+
+
+class _Tank:
+    def __init__(self):
+        # Oil by source: volume and pungency mass (volume * pungency).
+        self.volume = {KACHI_GHANI: 0.0, EXPELLER: 0.0}
+        self.mass = {KACHI_GHANI: 0.0, EXPELLER: 0.0}
+        self.diluent_v = self.diluent_m = 0.0  # diverted expeller oil set aside to dilute this tank
+        self.lot_ids = []
+
+    def add(self, lot, volume):
+        source = EXPELLER if lot.source == EXPELLER else KACHI_GHANI
+        self.volume[source] += volume
+        self.mass[source] += volume * lot.pungency
+        if not self.lot_ids or self.lot_ids[-1] != lot.lot_id:
+            self.lot_ids.append(lot.lot_id)
+
+
+class BlendingScheduler:
+    """Streams lots into ``n_tanks`` blending tanks of ``capacity_mt`` each.
+
+    ``capacity_mt`` is the own oil a tank takes from lots; oil used to bring a
+    high tank down to spec is added on the loading line at dispatch. That oil
+    is expeller oil diverted from low tanks where there is any, and market oil
+    only for the rest. A full tank that is still too high waits (takes no more
+    lots) until diverted oil turns up or the day is flushed.
+    """
+
+    def __init__(self, n_tanks=6, capacity_mt=40.0, target=MIN_PUNGENCY_REQ):
+        self.capacity, self.target = capacity_mt, target
+        self._tanks = [_Tank() for _ in range(n_tanks)]
+        self._volume = np.zeros(n_tanks)
+        self._excess = np.zeros(n_tanks)
+        self._waiting = np.zeros(n_tanks, dtype=bool)  # full and too high, waiting for diverted oil
+        self._diverted_v = self._diverted_m = 0.0  # diverted expeller oil not yet used as a diluent
+        self.diverted_direct_mt = 0.0  # expeller lots diverted on arrival, never poured into a tank
+        self.dispatched = []
+
+    @property
+    def open_volume_mt(self):
+        return float(self._volume.sum())
+
+    def add_lot(self, lot):
+        """Places one lot (a Lot or a dict with the same fields); returns any tanks dispatched."""
+        if isinstance(lot, dict):
+            lot = Lot(str(lot["lot_id"]), lot["source"], float(lot["volume_mt"]), float(lot["pungency"]))
+        done_before = len(self.dispatched)
+        remaining = lot.volume_mt
+        lot_excess = lot.pungency - self.target  # excess per MT
+        while remaining > EPS:
+            if self._waiting.all():
+                if lot.source == EXPELLER and lot_excess < 0:
+                    # Every tank is waiting for a diluent and this lot is one: divert it straight to them.
+                    self.diverted_direct_mt += remaining
+                    self._diverted_v += remaining
+                    self._diverted_m += remaining * lot.pungency
+                    self._release_waiting()
+                    break
+                # No tank can take oil: dispatch the waiting tank closest to spec with market oil.
+                self._dispatch(int(self._excess.argmin()))
+            # Surplus lots chase the most negative tank, deficit lots the most positive.
+            if lot_excess >= 0:
+                t = int(np.where(self._waiting, np.inf, self._excess).argmin())
+            else:
+                t = int(np.where(self._waiting, -np.inf, self._excess).argmax())
+            amount = min(remaining, self.capacity - self._volume[t])
+            if self._excess[t] * lot_excess < 0 and abs(self._excess[t]) > EPS:
+                amount = min(amount, abs(self._excess[t] / lot_excess))
+            if remaining - amount <= EPS:
+                amount = remaining  # a float crumb of the lot would otherwise open another tank
+            self._pour(t, lot, amount)
+            remaining -= amount
+            if self.capacity - self._volume[t] <= EPS:
+                self._full(t)
+        return self.dispatched[done_before:]
+
+    def add_lots(self, lots):
+        dispatched = []
+        for lot in lots:
+            dispatched.extend(self.add_lot(lot))
+        return dispatched
+
+    def _pour(self, t, lot, amount):
+        self._tanks[t].add(lot, amount)
+        self._volume[t] += amount
+        self._excess[t] += amount * (lot.pungency - self.target)
+
+    def _full(self, t):
+        """A tank has reached capacity: dispatch it unless it is too high and no diverted oil can fix it yet."""
+        self._add_diverted_oil(t)
+        if self._excess[t] > EPS:
+            self._waiting[t] = True
+        else:
+            self._dispatch(t)
+
+    def _add_diverted_oil(self, t):
+        """Dilutes a high tank with diverted expeller oil (noted on the tank, added at dispatch)."""
+        if self._excess[t] <= EPS or self._diverted_v <= EPS:
+            return
+        p = self._diverted_m / self._diverted_v
+        amount = min(self._diverted_v, self._excess[t] / (self.target - p))
+        tank = self._tanks[t]
+        tank.diluent_v += amount
+        tank.diluent_m += amount * p
+        self._excess[t] -= amount * (self.target - p)
+        self._diverted_v -= amount
+        self._diverted_m -= amount * p
+
+    def _dispatch(self, t):
+        """Corrects and dispatches tank ``t``."""
+        tank = self._tanks[t]
+        excess = self._excess[t]
+        kg_v, exp_v = tank.volume[KACHI_GHANI], tank.volume[EXPELLER]
+        kg_m, exp_m = tank.mass[KACHI_GHANI], tank.mass[EXPELLER]
+        diluent_v, diluent_m = tank.diluent_v, tank.diluent_m
+        market = diverted = diverted_m = downgraded = 0.0
+        if excess > EPS:
+            market = excess / self.target
+        elif excess < -EPS and exp_v > 0:
+            exp_p = exp_m / exp_v
+            if exp_p < self.target:
+                diverted = min(exp_v, -excess / (self.target - exp_p))
+                if exp_v - diverted <= EPS:
+                    diverted = exp_v  # no float crumbs of expeller oil left behind in the tank
+                diverted_m = diverted * exp_p
+                exp_v, exp_m = exp_v - diverted, exp_m - diverted_m
+                excess += diverted * (self.target - exp_p)
+        if excess < -EPS:
+            # Still short with the expeller oil out: the blend cannot be saved, sell it separately.
+            downgraded = kg_v + exp_v + diluent_v
+            kg_v = exp_v = kg_m = exp_m = diluent_v = diluent_m = 0.0
+        volume = kg_v + exp_v + diluent_v + market
+        pungency = (kg_m + exp_m + diluent_m) / volume if volume else 0.0
+        self.dispatched.append(Dispatch(
+            tank=t, volume_mt=volume, pungency=round(pungency, PUNGENCY_DECIMALS),
+            kachi_ghani_mt=kg_v, expeller_in_blend_mt=exp_v, expeller_diverted_mt=diverted,
+            market_oil_mt=market, downgraded_mt=downgraded, diverted_oil_added_mt=diluent_v,
+            lot_ids=tank.lot_ids))
+        self._tanks[t] = _Tank()
+        self._volume[t] = self._excess[t] = 0.0
+        self._waiting[t] = False
+        if diverted > EPS:
+            self._diverted_v += diverted
+            self._diverted_m += diverted_m
+            self._release_waiting()
+
+    def _release_waiting(self):
+        """Corrects waiting tanks with the diverted oil on hand and dispatches those that reach spec."""
+        for t in np.flatnonzero(self._waiting):
+            self._add_diverted_oil(int(t))
+            if self._excess[t] <= EPS:
+                self._dispatch(int(t))
+
+    def flush(self):
+        """Dispatches every tank, topping up high ones with market oil, and sells unused diverted oil.
+
+        Call it when no more lots are coming. Between days just keep adding lots:
+        partly filled and waiting tanks and the diverted oil carry over, so later
+        lots can still correct them.
+        """
+        # Lowest tanks first, so the oil they divert can correct the high ones before any market oil is bought.
+        for t in np.argsort(self._excess, kind="stable"):
+            if self._volume[t] > EPS:
+                self._add_diverted_oil(int(t))
+                self._dispatch(int(t))
+        self._diverted_v = self._diverted_m = 0.0
+        return self.dispatched
+
+    def summary(self):
+        d = self.dispatched
+        return {
+            "tanks_dispatched": sum(1 for x in d if x.volume_mt > EPS),
+            "blend_dispatched_mt": float(sum(x.volume_mt for x in d)),
+            # Net of the diverted oil that went into other tanks instead of market oil.
+            "expeller_diverted_mt": float(self.diverted_direct_mt + sum(x.expeller_diverted_mt - x.diverted_oil_added_mt
+                                                                        for x in d)),
+            "market_oil_mt": float(sum(x.market_oil_mt for x in d)),
+            "downgraded_mt": float(sum(x.downgraded_mt for x in d)),
+            "open_tank_mt": self.open_volume_mt,
+            "min_dispatched_pungency": float(min((x.pungency for x in d if x.volume_mt > EPS), default=float("nan"))),
+        }
+
+
+def pooled_benchmark(lots, target=MIN_PUNGENCY_REQ):
+    """The dashboard's daily-average fix applied to the same lots, as if one infinite tank existed.
+
+    It is the yardstick for how much extra diversion and market oil the tank
+    constraints cost.
+    """
+    kg_v = sum(l.volume_mt for l in lots if l.source != EXPELLER)
+    exp_v = sum(l.volume_mt for l in lots if l.source == EXPELLER)
+    kg_m = sum(l.volume_mt * l.pungency for l in lots if l.source != EXPELLER)
+    exp_m = sum(l.volume_mt * l.pungency for l in lots if l.source == EXPELLER)
+    excess = kg_m + exp_m - target * (kg_v + exp_v)
+    diverted = market = 0.0
+    if excess > 0:
+        market = excess / target
+    elif excess < 0 and exp_v > 0 and exp_m / exp_v < target:
+        diverted = min(exp_v, -excess / (target - exp_m / exp_v))
+    return {"expeller_diverted_mt": diverted, "market_oil_mt": market}
+
+
+def read_lots(path):
+    """Yields Lots from a JSONL or CSV file with lot_id, source, volume_mt and pungency columns."""
+    with open(path, newline="") as f:
+        rows = csv.DictReader(f) if path.endswith(".csv") else (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            yield Lot(str(row["lot_id"]), row["source"], float(row["volume_mt"]), float(row["pungency"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Allocate pressing lots to blending tanks at 0.27% pungency.")
+    parser.add_argument("lots", help="JSONL or CSV file of lots, in arrival order")
+    parser.add_argument("--tanks", type=int, default=6)
+    parser.add_argument("--capacity", type=float, default=40.0, help="tank capacity (MT)")
+    args = parser.parse_args()
+    lots = list(read_lots(args.lots))
+    scheduler = BlendingScheduler(args.tanks, args.capacity)
+    scheduler.add_lots(lots)
+    scheduler.flush()
+    for key, value in scheduler.summary().items():
+        print(f"{key:>26}: {value:,.3f}")
+    for key, value in pooled_benchmark(lots).items():
+        print(f"{'pooled ' + key:>26}: {value:,.3f}")
+
+
+if __name__ == "__main__":
+    main()
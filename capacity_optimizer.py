@@ -0,0 +1,81 @@
+"""Daily crush rate and production-day optimiser.
+
+``seed_input_mt`` and ``production_days_per_month`` are fixed sidebar numbers in
+the dashboard. This module searches both at once. It builds a grid of
+(crush rate, days per month) plans and evaluates the whole grid in one
+``engine.calculate_batch`` call, so working capital, interest and ROCE respond
+to throughput exactly as they do on the dashboard. On top of the engine it
+adds:
+
+* line capacities - every MT of seed is cold-pressed on the Kachi Ghani line
+  and its cake then goes through the expeller line, so the crush rate is capped
+  by the smaller of the two;
+* a congestion cost - processing cost per MT rises nonlinearly as each line
+  approaches its capacity, ``1 + coef * utilisation**exponent``;
+* MoC storage - a plan is infeasible when the MoC safety stock it implies does
+  not fit in the MoC godown.
+
+``optimize_capacity`` returns the best feasible plan plus the full response
+surface, ready to plot.
+"""
+import numpy as np
+
+import engine
+
+OBJECTIVES = ("annual_pat", "roce_pat", "roce_pat_with_synergy", "annual_ebitda")
+
+
+def congestion_multiplier(utilisation, coef=0.6, exponent=6.0):
+    """Processing-cost multiplier for a line running at ``utilisation`` (0-1) of capacity."""
+    return 1 + coef * np.clip(utilisation, 0, None) ** exponent
+
+
+def optimize_capacity(base, kachi_ghani_capacity_mt=260.0, expeller_capacity_mt=240.0,
+                      moc_storage_mt=1000.0, objective="annual_pat", crush_points=200,
+                      days_range=(20, 30), min_crush_mt=20.0, kachi_ghani_cost_share=0.5,
+                      congestion_coef=0.6, congestion_exponent=6.0):
+    """Finds the crush rate and days per month that maximise ``objective``.
+
+    ``base`` is a scenario dict (missing inputs default to the dashboard). Its
+    ``processing_cost_per_mt`` is taken as the cost at low utilisation, split
+    between the two lines by ``kachi_ghani_cost_share``.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}")
+    plant_capacity = min(kachi_ghani_capacity_mt, expeller_capacity_mt)
+    crush = np.linspace(min_crush_mt, plant_capacity, crush_points)
+    days = np.arange(days_range[0], days_range[1] + 1)
+    crush_grid, days_grid = (g.ravel() for g in np.meshgrid(crush, days, indexing="ij"))
+
+    columns, _ = engine.to_columns(base)
+    base_cost = columns["processing_cost_per_mt"][0]
+    kg_util, exp_util = crush_grid / kachi_ghani_capacity_mt, crush_grid / expeller_capacity_mt
+    processing_cost = base_cost * (
+        kachi_ghani_cost_share * congestion_multiplier(kg_util, congestion_coef, congestion_exponent)
+        + (1 - kachi_ghani_cost_share) * congestion_multiplier(exp_util, congestion_coef, congestion_exponent))
+
+    scenario = {k: v[0] for k, v in columns.items()}
+    scenario.update(seed_input_mt=crush_grid, production_days_per_month=days_grid,
+                    processing_cost_per_mt=processing_cost)
+    out = engine.calculate_batch(scenario)
+    moc_stock_mt = out["enhanced_moc_mt"] * columns["fg_moc_safety_days"][0]
+    feasible = moc_stock_mt <= moc_storage_mt
+    score = np.where(feasible, out[objective], -np.inf)
+    best = int(score.argmax())
+
+    shape = (crush.size, days.size)
+    return {
+        "best": {
+            "seed_input_mt": float(crush_grid[best]), "production_days_per_month": int(days_grid[best]),
+            "processing_cost_per_mt": float(processing_cost[best]),
+            "kachi_ghani_utilisation": float(kg_util[best]), "expeller_utilisation": float(exp_util[best]),
+            "moc_stock_mt": float(moc_stock_mt[best]), objective: float(out[objective][best]),
+            "annual_pat": float(out["annual_pat"][best]), "roce_pat": float(out["roce_pat"][best]),
+            "net_wc_requirement": float(out["net_wc_requirement"][best]),
+        } if np.isfinite(score[best]) else None,
+        "crush_mt": crush, "days_per_month": days,
+        # Response surfaces, indexed [crush, days]; infeasible plans are NaN.
+        "objective": np.where(feasible, out[objective], np.nan).reshape(shape),
+        "annual_pat": out["annual_pat"].reshape(shape), "roce_pat": out["roce_pat"].reshape(shape),
+        "processing_cost_per_mt": processing_cost.reshape(shape), "feasible": feasible.reshape(shape),
+    }
@@ -0,0 +1,103 @@
+"""Chart helpers that stay responsive for 10^5 - 10^7 point results.
+
+Plotly serialises every point into the page, so sweep, backtest and daily
+simulation output has to be reduced on the server first:
+
+* time series are downsampled with LTTB (shape-preserving) or min-max
+  (keeps every spike) and drawn with WebGL ``Scattergl`` traces;
+* dense scatter plots are binned into a 2-D histogram and drawn as a heatmap;
+* histograms are drawn from precomputed counts (e.g. ``streaming_stats.Histogram``).
+
+Each helper returns a ``plotly.graph_objects.Figure`` ready for ``st.plotly_chart``.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+MAX_LINE_POINTS = 4000      # per trace, after downsampling
+MAX_SCATTER_POINTS = 20000  # above this a scatter becomes a density heatmap
+DENSITY_BINS = 200
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Average of each bucket, used as the third triangle vertex for the previous bucket.
+    sums_x, sums_y = np.add.reduceat(x[1:n - 1], edges[:-1] - 1), np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    avg_x = np.append(sums_x / sizes, x[-1])
+    avg_y = np.append(sums_y / sizes, y[-1])
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(y, n_out):
+    """Min-max downsampling: keeps the min and max of each of ``n_out // 2`` buckets, in order."""
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_buckets < 1 or n <= n_out:
+        return np.arange(n)
+    y = np.asarray(y)
+    size = n // n_buckets
+    body = y[:size * n_buckets].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lo, hi = body.argmin(axis=1) + offsets, body.argmax(axis=1) + offsets
+    keep = np.sort(np.concatenate([lo, hi, [n - 1]]))
+    return np.unique(keep)
+
+
+def downsample(x, y, max_points=MAX_LINE_POINTS, method="lttb"):
+    """Returns ``(x, y)`` reduced to at most about ``max_points`` points."""
+    if len(y) <= max_points:
+        return np.asarray(x), np.asarray(y)
+    if method == "lttb":
+        keep = lttb(x, y, max_points)
+    elif method == "minmax":
+        keep = minmax(y, max_points)
+    else:
+        raise ValueError(f"unknown downsampling method '{method}'")
+    return np.asarray(x)[keep], np.asarray(y)[keep]
+
+
+def time_series(x, series, title="", max_points=MAX_LINE_POINTS, method="lttb", y_title=""):
+    """WebGL line chart of one or more series sharing ``x``; ``series`` maps name -> values."""
+    fig = go.Figure()
+    for name, values in series.items():
+        xs, ys = downsample(x, values, max_points, method)
+        fig.add_trace(go.Scattergl(x=xs, y=ys, mode="lines", name=name))
+    fig.update_layout(title=title, yaxis_title=y_title, hovermode="x unified")
+    return fig
+
+
+def scatter(x, y, x_title="", y_title="", title="", max_points=MAX_SCATTER_POINTS, bins=DENSITY_BINS):
+    """WebGL scatter for small inputs; a server-side binned density heatmap beyond ``max_points``."""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if len(x) <= max_points:
+        fig = go.Figure(go.Scattergl(x=x, y=y, mode="markers", marker={"size": 4, "opacity": 0.6}))
+    else:
+        finite = np.isfinite(x) & np.isfinite(y)
+        counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=bins)
+        centres_x, centres_y = (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2
+        fig = go.Figure(go.Heatmap(x=centres_x, y=centres_y, z=np.where(counts.T > 0, counts.T, np.nan),
+                                   colorscale="Viridis", colorbar={"title": "Scenarios"}))
+        title = f"{title} ({len(x):,} points, binned)" if title else f"{len(x):,} points, binned"
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+def histogram(edges, counts, title="", x_title=""):
+    """Bar chart from precomputed bin edges and counts, so the raw values never reach the browser."""
+    edges = np.asarray(edges, dtype=np.float64)
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=np.asarray(counts), width=np.diff(edges)))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title="Scenarios", bargap=0)
+    return fig
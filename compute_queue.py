@@ -0,0 +1,279 @@
+"""Cross-session compute coalescing and per-session rate limiting for the dashboards.
+
+Streamlit reruns the whole script for every intermediate slider value. With
+several analysts on one server, that saturates the CPU. Two pieces, shared
+by all sessions through ``st.cache_resource``, keep it in check:
+
+* ``RateLimiter``  - before computing, a session waits out a short debounce
+  and its minimum interval since its last computation. If the user moves the
+  slider again meanwhile, Streamlit interrupts the waiting run. Only the value
+  they stop on is computed, plus one refresh a second during a long drag.
+* ``ComputeQueue`` - single-flight execution. When several sessions ask for the
+  same function on identical inputs, the first computes it in its own thread and
+  the rest wait for that result. At most ``max_concurrent`` computations run at
+  once; the rest queue. The last ``cache_size`` results are kept (LRU), so a
+  rerun that leaves a section's inputs unchanged - a click elsewhere, another
+  analyst on the same scenario - does not recompute that section.
+
+Computation stays in the calling session's thread, so Streamlit's caching and
+script context work as usual.
+
+    python compute_queue.py --users 12 --seconds 6   # CPU saved under simulated load
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def scenario_key(fn, args, kwargs):
+    """Hashable key for ``fn(*args, **kwargs)``; dicts are order-insensitive."""
+    return (getattr(fn, "__module__", None), getattr(fn, "__qualname__", repr(fn)), _freeze(args), _freeze(kwargs))
+
+
+class ComputeQueue:
+    """Coalesces identical in-flight computations across sessions, caches recent results and bounds concurrency."""
+
+    def __init__(self, max_concurrent=2, cache_size=64):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = OrderedDict()
+        self.cache_size = cache_size
+        self.computed = self.coalesced = self.cache_hits = 0
+        self.compute_seconds = 0.0
+
+    def run(self, fn, *args, **kwargs):
+        """Returns ``fn(*args, **kwargs)``, sharing the result with identical concurrent and recent calls.
+
+        Results are shared between sessions and reruns, so callers must not mutate them.
+        """
+        key = scenario_key(fn, args, kwargs)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                return self._results[key]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            try:
+                return future.result()
+            except Exception:
+                raise
+            except BaseException:
+                # The leader's run was interrupted (e.g. Streamlit stopped its script); compute it here.
+                return self.run(fn, *args, **kwargs)
+        try:
+            with self._slots:
+                start = time.perf_counter()
+                result = fn(*args, **kwargs)
+                elapsed = time.perf_counter() - start
+            future.set_result(result)
+            return result
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if future.done() and future.exception() is None:
+                    self.computed += 1
+                    self.compute_seconds += elapsed
+                    if self.cache_size:
+                        self._results[key] = future.result()
+                        if len(self._results) > self.cache_size:
+                            self._results.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"computed": self.computed, "coalesced": self.coalesced, "cache_hits": self.cache_hits,
+                    "compute_seconds": self.compute_seconds, "in_flight": len(self._inflight)}
+
+
+class RateLimiter:
+    """Per-session debounce and minimum interval between computations.
+
+    An edit waits ``debounce_s`` for the next one. A continuous drag still
+    computes once every ``max_wait_s``, so the user sees progress.
+    """
+
+    def __init__(self, debounce_s=0.3, min_interval_s=0.75, max_wait_s=1.0, idle_expiry_s=3600.0):
+        self.debounce, self.min_interval, self.max_wait = debounce_s, min_interval_s, max_wait_s
+        self.idle_expiry = idle_expiry_s
+        self._lock = threading.Lock()
+        self._last, self._pending_since = {}, {}
+
+    def delay(self, session_id, debounce=True):
+        """Seconds the session should wait before computing now."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._last) > 1000:
+                self._last = {s: t for s, t in self._last.items() if now - t < self.idle_expiry}
+                self._pending_since = {s: t for s, t in self._pending_since.items() if now - t < self.idle_expiry}
+            last = self._last.get(session_id)
+            pending_since = self._pending_since.setdefault(session_id, now)
+        wait = min(self.debounce, pending_since + self.max_wait - now) if debounce else 0.0
+        if last is not None:
+            wait = max(wait, last + self.min_interval - now)
+        return max(0.0, wait)
+
+    def mark(self, session_id):
+        """Records that the session has just computed."""
+        with self._lock:
+            self._last[session_id] = time.monotonic()
+            self._pending_since.pop(session_id, None)
+
+
+def _simulate(users, seconds, rate_hz, shared_share, work, managed, seed):
+    """Drives ``users`` sessions dragging sliders; returns CPU seconds and counters.
+
+    Users drag for 1.5 s, pause for 1.5 s, and repeat. Each session has a runner
+    thread standing in for Streamlit's script thread.
+    It always takes the newest pending edit, and an edit arriving while it waits
+    cancels the wait, as a Streamlit rerun request does.
+    """
+    rng = np.random.default_rng(seed)
+    queue, limiter = ComputeQueue(), RateLimiter()
+    n_shared = int(round(users * shared_share))
+    # Sessions in the shared group follow the same slider path (e.g. a review meeting).
+    shared_path = 150 + np.cumsum(rng.choice([-1, 0, 1], size=int(seconds * rate_hz) + 1))
+    counters = {"edits": 0, "reruns": 0, "cancelled": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def session(i):
+        sid = f"user-{i}"
+        path = shared_path if i < n_shared else 150 + np.cumsum(rng.choice([-1, 0, 1], size=shared_path.size))
+        mailbox = {"gen": 0, "value": None}
+        changed = threading.Condition()
+
+        def runner():
+            done_gen = 0
+            while True:
+                with changed:
+                    while mailbox["gen"] == done_gen and not stop.is_set():
+                        changed.wait(0.05)
+                    if mailbox["gen"] == done_gen:
+                        return
+                    gen, value = mailbox["gen"], mailbox["value"]
+                if managed:
+                    wait = limiter.delay(sid)
+                    with changed:
+                        if changed.wait_for(lambda: mailbox["gen"] != gen, timeout=wait):
+                            with lock:
+                                counters["cancelled"] += 1
+                            continue
+                    work({"seed_input_mt": float(value)}, queue.run)
+                    limiter.mark(sid)
+                else:
+                    work({"seed_input_mt": float(value)})
+                done_gen = gen
+                with lock:
+                    counters["reruns"] += 1
+
+        thread = threading.Thread(target=runner)
+        thread.start()
+        start = time.monotonic()
+        burst = int(rate_hz * 1.5)
+        for step, value in enumerate(path):
+            if (step // burst) % 2:
+                continue  # drag for 1.5 s, pause for 1.5 s
+            time.sleep(max(0.0, start + step / rate_hz - time.monotonic()))
+            with changed:
+                mailbox["gen"] += 1
+                mailbox["value"] = value
+                changed.notify()
+            with lock:
+                counters["edits"] += 1
+        return thread
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    drivers = []
+    runners = []
+
+    def drive(i):
+        runners.append(session(i))
+
+    for i in range(users):
+        t = threading.Thread(target=drive, args=(i,))
+        t.start()
+        drivers.append(t)
+    for t in drivers:
+        t.join()
+    stop.set()
+    for t in runners:
+        t.join()
+    return {"cpu_s": time.process_time() - cpu0, "wall_s": time.perf_counter() - wall0,
+            **counters, **({k: queue.stats()[k] for k in ("coalesced", "cache_hits")} if managed else {})}
+
+
+def _direct(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def _rerun_work(inputs, run=_direct):
+    """What one full dashboard rerun computes, section by section through ``run``.
+
+    The headline metrics and a rendered page, plus every expander: the capacity
+    sweep, the stress tree, and the WC optimiser and hedging simulation (single
+    process) as when their results are on screen. The dashboard runs those two
+    from a button, so this is the worst case.
+    """
+    import capacity_optimizer
+    import engine
+    import hedge_simulator
+    import reports
+    import stress_test
+    import wc_optimizer
+
+    metrics = run(engine.calculate_all_metrics, inputs)
+    run(capacity_optimizer.optimize_capacity, inputs)
+    run(wc_optimizer.optimize_wc, inputs)
+    run(stress_test.run_stress, inputs)
+    run(hedge_simulator.simulate, inputs, n_paths=20_000, processes=1)
+    reports.render_page("rerun", metrics)
+    return metrics
+
+
+def benchmark(users=12, seconds=6.0, rate_hz=20.0, shared_share=0.5, seed=0):
+    naive = _simulate(users, seconds, rate_hz, shared_share, _rerun_work, False, seed)
+    managed = _simulate(users, seconds, rate_hz, shared_share, _rerun_work, True, seed)
+    return {"naive": naive, "managed": managed, "cpu_saved": 1 - managed["cpu_s"] / naive["cpu_s"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CPU saved by debouncing and coalescing reruns.")
+    parser.add_argument("--users", type=int, default=12)
+    parser.add_argument("--seconds", type=float, default=6.0, help="how long each user keeps dragging")
+    parser.add_argument("--rate", type=float, default=20.0, help="slider events per second per user")
+    parser.add_argument("--shared", type=float, default=0.5, help="share of users looking at the same scenario")
+    args = parser.parse_args()
+    result = benchmark(args.users, args.seconds, args.rate, args.shared)
+    for mode in ("naive", "managed"):
+        print(f"{mode:>8}: " + ", ".join(f"{k} {v:,.2f}" if isinstance(v, float) else f"{k} {v:,}"
+                                         for k, v in result[mode].items()))
+    print(f"CPU saved: {result['cpu_saved']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
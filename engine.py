@@ -0,0 +1,232 @@
+"""Streamlit-free calculation engine for the mustard oil dashboard.
+
+This is the model behind ``calculate_all_metrics`` in app.py, written against
+numpy arrays so that any number of scenarios is evaluated in a single pass.
+app.py, the HTTP service and the batch tools all call into this module, so the
+numbers they show can never drift apart.
+"""
+import numpy as np
+
+MIN_PUNGENCY_REQ = 0.27
+
+# Sidebar defaults from app.py. Any input missing from a scenario falls back to these.
+DEFAULT_INPUTS = {
+    "seed_input_mt": 192.0, "kachi_ghani_yield_pct": 18, "expeller_yield_pct": 15,
+    "seed_purchase_price": 54000, "oil_blend_sell_price": 141000, "moc_sell_price": 22000,
+    "processing_cost_per_mt": 2000, "other_variable_costs_per_mt": 500,
+    "other_expenses_daily": 45000, "production_days_per_month": 24,
+    "kachi_ghani_pungency": 0.38, "expeller_oil_pungency": 0.12,
+    "expeller_oil_sell_price": 136000, "market_bought_oil_price": 132000,
+    "water_added_pct": 2, "water_cost_per_kg": 1, "salt_added_pct": 3, "salt_cost_per_kg": 5,
+    "capex": 190000000, "depreciation_years": 15, "tax_rate_pct": 25, "other_assets": 0,
+    "warehouse_finance_rate_pa": 12.0, "main_financing_rate_pa": 12.0, "rm_hoard_financed_pct": 80,
+    "rm_hoard_months": 6, "hoarded_rm_rate": 53500, "rm_safety_stock_days": 48,
+    "fg_oil_safety_days": 15, "fg_moc_safety_days": 4, "oil_debtor_days": 5,
+    "moc_debtor_days": 5, "creditor_days": 3,
+    "moc_consumed_perc": 100, "logistics_saved_per_ton": 400, "labor_saved_nos": 4,
+    "labor_cost_per_head_daily": 550, "brokerage_saved_per_ton": 25,
+    # Solvex (solvent extraction) plant fed with the MoC consumed in-house.
+    "solvex_residual_oil_pct": 9.0, "solvex_extraction_efficiency_pct": 92.0,
+    "solvex_oil_sell_price": 118000, "doc_sell_price": 17500,
+    "solvent_loss_kg_per_mt": 2.5, "solvent_cost_per_kg": 95,
+    "steam_kg_per_mt": 280, "steam_cost_per_kg": 2.2, "solvex_other_variable_costs_per_mt": 350,
+    "solvex_other_expenses_daily": 30000, "solvex_capex": 150000000, "solvex_depreciation_years": 15,
+    "solvex_fg_safety_days": 7, "solvex_debtor_days": 7, "solvex_creditor_days": 15,
+    # Actual balances (₹), e.g. from inventory_ledger; NaN keeps the day-multiplier estimates.
+    "fg_inventory_value": np.nan, "debtors_value": np.nan, "creditors_value": np.nan,
+}
+INPUT_KEYS = tuple(DEFAULT_INPUTS)
+# Balance override input -> the output it replaces.
+WC_OVERRIDES = {"fg_inventory_value": "inventory_fg", "debtors_value": "total_debtors",
+                "creditors_value": "trade_creditors"}
+
+# Pungency status codes returned in the "pungency_status" column.
+PUNGENCY_LOW, PUNGENCY_COMPLIANT, PUNGENCY_HIGH = -1, 0, 1
+
+OUTPUT_KEYS = (
+    "seed_input_mt", "initial_blend_pungency", "pungency_status",
+    "kachi_ghani_oil_produced_mt", "expeller_oil_produced_mt",
+    "exp_oil_used_in_blend_mt", "exp_oil_sold_separately_mt", "market_oil_to_add_mt",
+    "final_oil_blend_mt", "enhanced_moc_mt",
+    "daily_revenue_oil_blend", "daily_revenue_expeller_separate", "daily_revenue_moc",
+    "daily_total_revenue", "daily_cogs", "daily_gm", "daily_processing_cost", "daily_cm",
+    "daily_variable_cost", "daily_other_expenses", "daily_ebitda",
+    "production_days_per_month", "annual_production_days",
+    "rm_hoarded_value", "inventory_fg", "total_inventory", "total_debtors", "trade_creditors",
+    "financed_rm_hoard_value", "gross_wc", "net_wc_requirement", "capex",
+    "annual_ebitda", "annual_interest", "annual_depreciation", "tax_rate_pct",
+    "annual_pbt", "annual_tax", "annual_pat", "capital_employed",
+    "roce_pat", "roce_ebitda", "daily_solvex_saving",
+    "roce_pat_with_synergy", "roce_ebitda_with_synergy",
+    "solvex_feed_mt", "solvex_oil_mt", "doc_output_mt", "solvex_daily_revenue", "solvex_daily_moc_cost",
+    "solvex_daily_utility_cost", "solvex_daily_ebitda", "solvex_net_wc", "solvex_capex",
+    "combined_annual_ebitda", "combined_annual_interest", "combined_annual_depreciation",
+    "combined_annual_pbt", "combined_annual_pat", "combined_capital_employed",
+    "combined_roce_pat", "combined_roce_ebitda",
+)
+
+
+def to_columns(scenarios):
+    """Normalises one scenario dict, a list of them, or a dict of arrays into float64 columns.
+
+    Missing inputs are filled from DEFAULT_INPUTS and unknown keys are ignored.
+    Returns ``(columns, n)`` where every column has length ``n``.
+    """
+    if isinstance(scenarios, dict):
+        n = max((np.size(v) for k, v in scenarios.items() if k in DEFAULT_INPUTS), default=1)
+        columns = {}
+        for key, default in DEFAULT_INPUTS.items():
+            col = np.asarray(scenarios.get(key, default), dtype=np.float64)
+            columns[key] = np.broadcast_to(col, (n,)) if col.ndim == 0 or col.size == 1 else col.reshape(n)
+        return columns, n
+    scenarios = list(scenarios)
+    n = len(scenarios)
+    columns = {
+        key: np.fromiter((s.get(key, default) for s in scenarios), dtype=np.float64, count=n)
+        for key, default in DEFAULT_INPUTS.items()
+    }
+    return columns, n
+
+
+def _safe_div(num, den):
+    """num / den with 0 wherever den == 0, matching the scalar guards in app.py."""
+    out = np.zeros(np.broadcast(num, den).shape)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def calculate_batch(scenarios):
+    """Evaluates every scenario in one vectorised pass and returns a dict of output arrays."""
+    c, n = to_columns(scenarios)
+    seed = c["seed_input_mt"]
+    kg_pungency, exp_pungency = c["kachi_ghani_pungency"], c["expeller_oil_pungency"]
+    oil_price = c["oil_blend_sell_price"]
+
+    # --- Production & pungency correction ---
+    kachi_ghani_yield, expeller_yield = c["kachi_ghani_yield_pct"]/100, c["expeller_yield_pct"]/100
+    moc_base_yield = 1 - (kachi_ghani_yield + expeller_yield)
+    kg_oil, exp_oil = seed*kachi_ghani_yield, seed*expeller_yield
+    total_produced_oil = kg_oil + exp_oil
+    pungency_mass = kg_oil*kg_pungency + exp_oil*exp_pungency
+    has_oil = total_produced_oil > 0
+    initial_blend_pungency = _safe_div(pungency_mass, np.where(has_oil, total_produced_oil, 0))
+    low = has_oil & (initial_blend_pungency < MIN_PUNGENCY_REQ)
+    high = has_oil & (initial_blend_pungency > MIN_PUNGENCY_REQ)
+
+    # Diverting expeller oil only lifts the blend when Kachi Ghani oil is above spec (and so
+    # expeller oil below it); otherwise no amount reaches 0.27 and the blend is left as is.
+    denominator = MIN_PUNGENCY_REQ - exp_pungency
+    correctable = (kg_pungency > MIN_PUNGENCY_REQ) & (denominator > 0)
+    exp_used_if_low = np.where(
+        correctable, np.clip(_safe_div(kg_oil*(kg_pungency - MIN_PUNGENCY_REQ), denominator), 0, exp_oil), exp_oil)
+    exp_oil_used_in_blend_mt = np.where(low, exp_used_if_low, exp_oil)
+    exp_oil_sold_separately_mt = np.where(low, exp_oil - exp_used_if_low, 0.0)
+    market_oil_to_add_mt = np.where(high, np.maximum(0, pungency_mass/MIN_PUNGENCY_REQ - total_produced_oil), 0.0)
+    pungency_status = np.where(low, PUNGENCY_LOW, np.where(high, PUNGENCY_HIGH, PUNGENCY_COMPLIANT)).astype(np.float64)
+
+    final_oil_blend_mt = kg_oil + exp_oil_used_in_blend_mt + market_oil_to_add_mt
+    water_added_mt, salt_added_mt = seed*(c["water_added_pct"]/100), seed*(c["salt_added_pct"]/100)
+    enhanced_moc_mt = seed*moc_base_yield + water_added_mt + salt_added_mt
+
+    # --- Daily P&L ---
+    daily_revenue_oil_blend = final_oil_blend_mt*oil_price
+    daily_revenue_expeller_separate = exp_oil_sold_separately_mt*c["expeller_oil_sell_price"]
+    daily_revenue_moc = enhanced_moc_mt*c["moc_sell_price"]
+    daily_total_revenue = daily_revenue_oil_blend + daily_revenue_expeller_separate + daily_revenue_moc
+    cost_moc_enhancement = water_added_mt*1000*c["water_cost_per_kg"] + salt_added_mt*1000*c["salt_cost_per_kg"]
+    daily_cogs = seed*c["seed_purchase_price"] + market_oil_to_add_mt*c["market_bought_oil_price"] + cost_moc_enhancement
+    daily_gm = daily_total_revenue - daily_cogs
+    daily_processing_cost = seed*c["processing_cost_per_mt"]
+    daily_cm = daily_gm - daily_processing_cost
+    daily_variable_cost = seed*c["other_variable_costs_per_mt"]
+    daily_ebitda = daily_cm - daily_variable_cost - c["other_expenses_daily"]
+
+    # --- Working capital ---
+    monthly_seed_consumption = seed*c["production_days_per_month"]
+    rm_hoarded_value = monthly_seed_consumption*c["rm_hoard_months"]*c["hoarded_rm_rate"]
+    inventory_rm = rm_hoarded_value + seed*c["rm_safety_stock_days"]*c["seed_purchase_price"]
+    total_daily_oil_revenue = daily_revenue_oil_blend + daily_revenue_expeller_separate
+    total_daily_oil_qty = final_oil_blend_mt + exp_oil_sold_separately_mt
+    avg_oil_price = _safe_div(total_daily_oil_revenue, np.where(total_daily_oil_qty > 0, total_daily_oil_qty, 0))
+    inventory_fg = (total_daily_oil_qty*avg_oil_price*c["fg_oil_safety_days"]
+                    + enhanced_moc_mt*c["moc_sell_price"]*c["fg_moc_safety_days"])
+    inventory_fg = np.where(np.isnan(c["fg_inventory_value"]), inventory_fg, c["fg_inventory_value"])
+    total_inventory = inventory_rm + inventory_fg
+    total_debtors = total_daily_oil_revenue*c["oil_debtor_days"] + daily_revenue_moc*c["moc_debtor_days"]
+    total_debtors = np.where(np.isnan(c["debtors_value"]), total_debtors, c["debtors_value"])
+    trade_creditors = seed*c["seed_purchase_price"]*c["creditor_days"]
+    trade_creditors = np.where(np.isnan(c["creditors_value"]), trade_creditors, c["creditors_value"])
+    financed_rm_hoard_value = rm_hoarded_value*(c["rm_hoard_financed_pct"]/100)
+    gross_wc = total_inventory + total_debtors - trade_creditors
+    net_wc_requirement = gross_wc - financed_rm_hoard_value
+
+    # --- Annual P&L & ROCE ---
+    capex = c["capex"]
+    annual_production_days = c["production_days_per_month"]*12
+    annual_ebitda = daily_ebitda*annual_production_days
+    annual_interest = (financed_rm_hoard_value*(c["warehouse_finance_rate_pa"]/100)
+                       + (net_wc_requirement + capex)*(c["main_financing_rate_pa"]/100))
+    annual_depreciation = _safe_div(capex, np.where(c["depreciation_years"] > 0, c["depreciation_years"], 0))
+    annual_pbt = annual_ebitda - annual_depreciation - annual_interest
+    annual_tax = np.maximum(0, annual_pbt*(c["tax_rate_pct"]/100))
+    annual_pat = annual_pbt - annual_tax
+    capital_employed = capex + net_wc_requirement + c["other_assets"]
+    roce_pat = _safe_div(annual_pat, capital_employed)*100
+    roce_ebitda = _safe_div(annual_ebitda, capital_employed)*100
+
+    # --- Solvex synergy ---
+    moc_consumed_inhouse_mt = enhanced_moc_mt*(c["moc_consumed_perc"]/100)
+    daily_solvex_saving = (moc_consumed_inhouse_mt*(c["logistics_saved_per_ton"] + c["brokerage_saved_per_ton"])
+                           + c["labor_saved_nos"]*c["labor_cost_per_head_daily"])
+    annual_solvex_saving = daily_solvex_saving*annual_production_days
+    roce_pat_with_synergy = _safe_div(annual_pat + annual_solvex_saving, capital_employed)*100
+    roce_ebitda_with_synergy = _safe_div(annual_ebitda + annual_solvex_saving, capital_employed)*100
+
+    # --- Solvex plant ---
+    # In-house MoC is bought at moc_sell_price, so the crushing figures above stand
+    # alone; the transfer nets out when the two plants are combined below.
+    solvex_feed_mt = moc_consumed_inhouse_mt
+    solvex_oil_mt = solvex_feed_mt*(c["solvex_residual_oil_pct"]/100)*(c["solvex_extraction_efficiency_pct"]/100)
+    doc_output_mt = solvex_feed_mt - solvex_oil_mt
+    solvex_daily_revenue = solvex_oil_mt*c["solvex_oil_sell_price"] + doc_output_mt*c["doc_sell_price"]
+    solvex_daily_moc_cost = solvex_feed_mt*c["moc_sell_price"]
+    solvex_daily_utility_cost = solvex_feed_mt*(c["solvent_loss_kg_per_mt"]*c["solvent_cost_per_kg"]
+                                                + c["steam_kg_per_mt"]*c["steam_cost_per_kg"])
+    solvex_daily_ebitda = (solvex_daily_revenue - solvex_daily_moc_cost - solvex_daily_utility_cost
+                           - solvex_feed_mt*c["solvex_other_variable_costs_per_mt"] - c["solvex_other_expenses_daily"])
+    # Solvex WC: finished oil and DOC, its debtors, less credit on solvent and steam.
+    # MoC feed stock is already in the crushing plant's FG safety stock.
+    solvex_net_wc = (solvex_daily_revenue*(c["solvex_fg_safety_days"] + c["solvex_debtor_days"])
+                     - solvex_daily_utility_cost*c["solvex_creditor_days"])
+    solvex_capex = c["solvex_capex"]
+
+    # --- Crushing + Solvex combined ---
+    intra_group_moc_debtors = solvex_daily_moc_cost*c["moc_debtor_days"]
+    combined_net_wc = net_wc_requirement + solvex_net_wc - intra_group_moc_debtors
+    combined_annual_ebitda = annual_ebitda + (solvex_daily_ebitda + daily_solvex_saving)*annual_production_days
+    combined_annual_interest = (financed_rm_hoard_value*(c["warehouse_finance_rate_pa"]/100)
+                                + (combined_net_wc + capex + solvex_capex)*(c["main_financing_rate_pa"]/100))
+    combined_annual_depreciation = annual_depreciation + _safe_div(
+        solvex_capex, np.where(c["solvex_depreciation_years"] > 0, c["solvex_depreciation_years"], 0))
+    combined_annual_pbt = combined_annual_ebitda - combined_annual_depreciation - combined_annual_interest
+    combined_annual_pat = combined_annual_pbt - np.maximum(0, combined_annual_pbt*(c["tax_rate_pct"]/100))
+    combined_capital_employed = capital_employed + solvex_capex + solvex_net_wc - intra_group_moc_debtors
+    combined_roce_pat = _safe_div(combined_annual_pat, combined_capital_employed)*100
+    combined_roce_ebitda = _safe_div(combined_annual_ebitda, combined_capital_employed)*100
+
+    daily_other_expenses = c["other_expenses_daily"]
+    tax_rate_pct, production_days_per_month = c["tax_rate_pct"], c["production_days_per_month"]
+    kachi_ghani_oil_produced_mt, expeller_oil_produced_mt, seed_input_mt = kg_oil, exp_oil, seed
+    scope = locals()
+    return {key: np.broadcast_to(scope[key], (n,)) for key in OUTPUT_KEYS}
+
+
+def calculate_all_metrics(inputs):
+    """Scalar entry point: one scenario dict in, one dict of floats out."""
+    return {key: float(col[0]) for key, col in calculate_batch(inputs).items()}
+
+
+def split_rows(outputs, keys=OUTPUT_KEYS):
+    """Turns the column dict from calculate_batch back into a list of per-scenario dicts."""
+    cols = [outputs[k].tolist() for k in keys]
+    return [dict(zip(keys, row)) for row in zip(*cols)]
@@ -0,0 +1,18 @@
+"""Number formatting shared by the dashboards and the HTML reports."""
+from numbers import Real
+
+
+def format_indian(num):
+    """Formats a number in the Indian numbering system (12,34,56,789), rounded to the rupee.
+
+    The minus sign goes only on figures that show a non-zero digit, so -0.4 is
+    "0". Anything that is not a number is returned unchanged, so the function
+    can be used as a table formatter.
+    """
+    if not isinstance(num, Real) or isinstance(num, bool):
+        return num
+    digits = f"{abs(num):.0f}"
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        digits = ",".join([head[max(0, i - 2):i] for i in range(len(head), 0, -2)][::-1]) + "," + tail
+    return "-" + digits if num < 0 and digits.strip("0,") else digits
@@ -0,0 +1,191 @@
+"""Property-based fuzzing of the engine's accounting identities.
+
+Random input sets are generated a chunk at a time and pushed through
+``engine.calculate_batch``. Every invariant is then checked as a vectorised mask
+over the whole chunk. Generation deliberately over-samples edge cases the
+dashboard never produces: zeros, range ends, pungencies of exactly 0.27, and
+yields that sum past 100%.
+
+Each failing row is shrunk to a minimal reproducer. Inputs are reset to the
+dashboard defaults one at a time, then the remaining values are rounded, for as
+long as the invariant still fails. Every shrink step is evaluated as one batch
+of candidates.
+
+    python fuzz_engine.py --scenarios 5000000 --seed 1
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import engine
+
+TARGET = engine.MIN_PUNGENCY_REQ
+RTOL, ATOL = 1e-9, 1e-6
+
+# (low, high) sampling range per input; anything not listed is drawn around its default.
+INPUT_RANGES = {
+    "seed_input_mt": (0, 500), "kachi_ghani_yield_pct": (0, 60), "expeller_yield_pct": (0, 60),
+    "seed_purchase_price": (0, 120000), "oil_blend_sell_price": (0, 250000), "moc_sell_price": (0, 50000),
+    "kachi_ghani_pungency": (0, 1), "expeller_oil_pungency": (0, 1),
+    "expeller_oil_sell_price": (0, 250000), "market_bought_oil_price": (0, 250000),
+    "water_added_pct": (0, 10), "salt_added_pct": (0, 10), "production_days_per_month": (0, 31),
+    "capex": (0, 1e9), "depreciation_years": (0, 40), "tax_rate_pct": (0, 50), "other_assets": (0, 1e8),
+    "warehouse_finance_rate_pa": (0, 25), "main_financing_rate_pa": (0, 25), "rm_hoard_financed_pct": (0, 100),
+    "rm_hoard_months": (0, 12), "moc_consumed_perc": (0, 100),
+    "solvex_residual_oil_pct": (0, 20), "solvex_extraction_efficiency_pct": (0, 100),
+}
+# Values tried on top of the range ends and zero.
+SPECIAL_VALUES = {"kachi_ghani_pungency": (TARGET,), "expeller_oil_pungency": (TARGET,)}
+OVERRIDE_KEYS = ("fg_inventory_value", "debtors_value", "creditors_value")
+
+
+def _close(a, b):
+    return np.abs(a - b) <= ATOL + RTOL * np.maximum(np.abs(a), np.abs(b))
+
+
+def _blend_pungency(c, o):
+    kg_mass = o["kachi_ghani_oil_produced_mt"] * c["kachi_ghani_pungency"]
+    exp_mass = o["exp_oil_used_in_blend_mt"] * c["expeller_oil_pungency"]
+    return engine._safe_div(kg_mass + exp_mass, o["final_oil_blend_mt"])
+
+
+def _physical(c):
+    """Rows whose yields describe a physically possible crush."""
+    return c["kachi_ghani_yield_pct"] + c["expeller_yield_pct"] <= 100
+
+
+# name -> (check(c, o) -> bool mask of rows that hold, applies(c) -> mask of rows it applies to or None)
+INVARIANTS = {
+    "revenue = sum of streams": (lambda c, o: _close(
+        o["daily_total_revenue"],
+        o["daily_revenue_oil_blend"] + o["daily_revenue_expeller_separate"] + o["daily_revenue_moc"]), None),
+    "GM = revenue - COGS": (lambda c, o: _close(o["daily_gm"], o["daily_total_revenue"] - o["daily_cogs"]), None),
+    "CM = GM - processing cost": (lambda c, o: _close(o["daily_cm"], o["daily_gm"] - o["daily_processing_cost"]), None),
+    "EBITDA = CM - variable - fixed": (lambda c, o: _close(
+        o["daily_ebitda"], o["daily_cm"] - o["daily_variable_cost"] - o["daily_other_expenses"]), None),
+    "net WC = gross WC - financed hoard": (lambda c, o: _close(
+        o["net_wc_requirement"], o["gross_wc"] - o["financed_rm_hoard_value"]), None),
+    "PAT <= PBT": (lambda c, o: o["annual_pat"] <= o["annual_pbt"] + ATOL, None),
+    "blend at 0.27 after correction, or no correction": (lambda c, o: (
+        ((o["exp_oil_sold_separately_mt"] <= ATOL) & (o["market_oil_to_add_mt"] <= ATOL))
+        | _close(_blend_pungency(c, o), TARGET)
+        | (o["final_oil_blend_mt"] <= ATOL)), None),  # no Kachi Ghani oil: all expeller oil is sold, no blend
+    "expeller oil split within what was pressed": (lambda c, o: (
+        (o["exp_oil_sold_separately_mt"] >= -ATOL) & (o["exp_oil_used_in_blend_mt"] >= -ATOL)
+        & _close(o["exp_oil_sold_separately_mt"] + o["exp_oil_used_in_blend_mt"], o["expeller_oil_produced_mt"])), None),
+    "market oil is never negative": (lambda c, o: o["market_oil_to_add_mt"] >= -ATOL, None),
+    "correction only when off spec": (lambda c, o: (
+        (o["pungency_status"] != engine.PUNGENCY_COMPLIANT)
+        | ((o["exp_oil_sold_separately_mt"] <= ATOL) & (o["market_oil_to_add_mt"] <= ATOL))), None),
+    "MoC output is never negative": (lambda c, o: o["enhanced_moc_mt"] >= -ATOL, _physical),
+    "combined ROCE base = crushing + Solvex capital": (lambda c, o: _close(
+        o["combined_capital_employed"], o["capital_employed"] + o["solvex_capex"] + o["solvex_net_wc"]
+        - o["solvex_daily_moc_cost"] * c["moc_debtor_days"]), None),
+}
+
+
+def generate(n, rng, edge_rate=0.05):
+    """``n`` random input sets as engine columns, with edge values mixed in at ``edge_rate`` per cell."""
+    columns = {}
+    for key, default in engine.DEFAULT_INPUTS.items():
+        if key in OVERRIDE_KEYS:
+            # Mostly NaN (use the day-multiplier estimates), sometimes an actual balance.
+            col = np.where(rng.random(n) < 0.1, rng.uniform(0, 5e8, n), np.nan)
+        else:
+            low, high = INPUT_RANGES.get(key, (0, 2 * default))
+            col = rng.uniform(low, high, n)
+            edges = np.array((low, high, 0.0) + SPECIAL_VALUES.get(key, ()))
+            hit = rng.random(n) < edge_rate
+            col[hit] = edges[rng.integers(0, edges.size, int(hit.sum()))]
+        columns[key] = col
+    # Yields that exceed 100% between them.
+    over = rng.random(n) < edge_rate
+    columns["expeller_yield_pct"][over] = 100 - columns["kachi_ghani_yield_pct"][over] + rng.uniform(0, 20, int(over.sum()))
+    return columns
+
+
+def check(columns):
+    """Evaluates ``columns`` and returns ``{invariant: bool mask of violating rows}``."""
+    outputs = engine.calculate_batch(columns)
+    c, _ = engine.to_columns(columns)
+    failures = {}
+    for name, (holds, applies) in INVARIANTS.items():
+        with np.errstate(all="ignore"):
+            bad = ~holds(c, outputs)
+            if applies is not None:
+                bad &= applies(c)
+        failures[name] = bad
+    return failures
+
+
+def _fails(name, rows):
+    """Evaluates a list of scenario dicts against one invariant."""
+    columns = {k: np.array([r[k] for r in rows], dtype=np.float64) for k in engine.DEFAULT_INPUTS}
+    return check(columns)[name]
+
+
+def shrink(name, scenario, max_rounds=200):
+    """Shrinks a failing scenario for ``name`` to the fewest, roundest inputs that still fail.
+
+    Returns ``{input: value}`` with only the inputs that differ from the defaults.
+    """
+    current = dict(scenario)
+    defaults = engine.DEFAULT_INPUTS
+    for _ in range(max_rounds):
+        changed = [k for k, v in current.items() if not (v == defaults[k] or (np.isnan(v) and np.isnan(defaults[k])))]
+        candidates = [{**current, key: defaults[key]} for key in changed]
+        for key in changed:
+            value = current[key]
+            if np.isfinite(value):
+                # Coarsest rounding first; the first candidate that still fails wins.
+                for rounded in dict.fromkeys(float(np.round(value, d)) for d in range(-3, 4)):
+                    if rounded != value:
+                        candidates.append({**current, key: rounded})
+        if not candidates:
+            break
+        still = np.flatnonzero(_fails(name, candidates))
+        if still.size == 0:
+            break
+        current = candidates[still[0]]
+    return {k: v for k, v in current.items() if not (v == defaults[k] or (np.isnan(v) and np.isnan(defaults[k])))}
+
+
+def fuzz(n=1_000_000, chunk_size=250_000, seed=0, edge_rate=0.05, shrink_failures=True):
+    """Runs ``n`` random scenarios; returns failure counts and one shrunk reproducer per invariant."""
+    rng = np.random.default_rng(seed)
+    counts = dict.fromkeys(INVARIANTS, 0)
+    first = {}
+    for start in range(0, n, chunk_size):
+        columns = generate(min(chunk_size, n - start), rng, edge_rate)
+        for name, bad in check(columns).items():
+            counts[name] += int(bad.sum())
+            if name not in first and bad.any():
+                i = int(np.flatnonzero(bad)[0])
+                first[name] = {k: float(v[i]) for k, v in columns.items()}
+    reproducers = {name: shrink(name, s) if shrink_failures else s for name, s in first.items()}
+    return {"scenarios": n, "failures": counts, "reproducers": reproducers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the engine's accounting identities with random inputs.")
+    parser.add_argument("--scenarios", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--edge-rate", type=float, default=0.05, help="share of inputs set to an edge value")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    result = fuzz(args.scenarios, args.chunk_size, args.seed, args.edge_rate)
+    print(f"{result['scenarios']:,} scenarios in {time.perf_counter() - start:.1f} s")
+    for name, count in result["failures"].items():
+        print(f"  {'FAIL' if count else 'ok  '} {name}: {count:,}")
+    for name, reproducer in result["reproducers"].items():
+        print(f"\n{name} - minimal reproducer (changes from dashboard defaults):")
+        for key, value in reproducer.items():
+            print(f"    {key} = {value!r}")
+    sys.exit(1 if any(result["failures"].values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
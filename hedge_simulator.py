@@ -0,0 +1,280 @@
+"""Commodity hedging strategies simulated over correlated seed, oil and MoC price paths.
+
+The dashboard prices seed, oil and MoC at fixed numbers. Here each price
+follows a monthly path over the horizon. Paths come from one of two sources:
+
+* ``"gbm"``       - correlated geometric Brownian motion (``VOLS``, ``CORRELATION``);
+* ``"bootstrap"`` - blocks of joint monthly returns resampled from a price
+  history, which keeps the historical correlation and fat tails.
+
+The oil factor moves the blend, expeller and market oil prices together. Each
+month's physical P&L comes from ``engine.calculate_batch`` at that month's
+prices, so pungency correction, WC and interest respond as on the dashboard.
+
+A ``Strategy`` hedges a share of each month's seed purchases (long) and
+oil/MoC sales (short), using futures (margined) or forwards (settled at
+maturity). Two rollover rules are supported:
+
+* ``"layered"`` - each month's exposure is hedged ``tenor_months`` ahead in the
+  contract for that month. Forward prices carry ``carry_pct_pa`` per year.
+* ``"stack"``   - the same exposure is held in the front-month contract from
+  ``tenor_months`` ahead and rolled every month, paying the carry on each roll.
+
+Every hedge cash flow is linear in the price path. For each strategy and
+commodity, the hedge P&L and the margin-account balance (initial margin plus
+variation margin paid on open futures) reduce to fixed weight matrices that
+are applied to the paths with one matmul. The margin cash is financed at
+``main_financing_rate_pa``.
+
+Paths are split across worker processes. Each process generates its own shard
+and folds every strategy's results into ``streaming_stats`` aggregators, which
+are then merged.
+
+    python hedge_simulator.py --paths 100000 --processes 4
+    python hedge_simulator.py --model bootstrap --history prices.csv
+"""
+import argparse
+import csv
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+import engine
+import streaming_stats
+
+FACTORS = ("seed", "oil", "moc")
+# factor -> engine inputs it moves; the first one is the hedged reference price.
+FACTOR_INPUTS = {"seed": ("seed_purchase_price",),
+                 "oil": ("oil_blend_sell_price", "expeller_oil_sell_price", "market_bought_oil_price"),
+                 "moc": ("moc_sell_price",)}
+HEDGE_SIGN = {"seed": 1.0, "oil": -1.0, "moc": -1.0}  # long seed, short oil and MoC
+VOLS = {"seed": 0.22, "oil": 0.18, "moc": 0.28}  # annualised
+CORRELATION = np.array([[1.0, 0.8, 0.5],
+                        [0.8, 1.0, 0.4],
+                        [0.5, 0.4, 1.0]])
+# Spot drifts at the carry by default, so forward prices are unbiased and hedging costs only fees and margin funding.
+MARKET = {"carry_pct_pa": 6.0, "drift_pct_pa": 6.0, "initial_margin_pct": 10.0, "fee_per_mt": 20.0}
+METRICS = ("crush_margin_per_mt", "annual_pat", "hedge_pnl", "peak_margin_cash")
+EXCEEDANCES = {"annual_pat": (("lt", 0.0),), "peak_margin_cash": (("gt", 5e7),)}
+
+
+@dataclass
+class Strategy:
+    name: str
+    seed_ratio: float = 0.0   # share of monthly seed purchases hedged
+    oil_ratio: float = 0.0    # share of monthly net oil sales hedged
+    moc_ratio: float = 0.0    # share of monthly MoC sales hedged
+    tenor_months: int = 3     # how far ahead each month is hedged
+    roll: str = "layered"     # "layered" or "stack"
+    instrument: str = "futures"  # "futures" (margined) or "forward"
+
+    def __post_init__(self):
+        if self.roll not in ("layered", "stack"):
+            raise ValueError("roll must be 'layered' or 'stack'")
+        if self.instrument not in ("futures", "forward"):
+            raise ValueError("instrument must be 'futures' or 'forward'")
+
+
+def default_strategies():
+    """Unhedged, crush hedges across ratios, tenors and instruments, stack-and-roll and one-legged hedges."""
+    strategies = [Strategy("Unhedged")]
+    for instrument in ("futures", "forward"):
+        for tenor in (1, 3, 6, 12):
+            for ratio in (0.25, 0.5, 0.75, 1.0):
+                strategies.append(Strategy(f"{instrument.title()} {ratio:.0%} crush, {tenor}m layered",
+                                           ratio, ratio, 0.0, tenor, "layered", instrument))
+    for ratio in (0.5, 1.0):
+        strategies.append(Strategy(f"Futures {ratio:.0%} crush, stack & roll", ratio, ratio, 0.0, 12, "stack"))
+    strategies += [Strategy("Futures 50% seed only, 3m", seed_ratio=0.5),
+                   Strategy("Futures 50% oil only, 3m", oil_ratio=0.5),
+                   Strategy("Forward 50% crush + MoC, 3m", 0.5, 0.5, 0.5, instrument="forward")]
+    return strategies
+
+
+def hedge_weights(horizon, tenor, roll, sign, carry, margin):
+    """Weights on a price path ``S[0..horizon]`` for one unit hedged per month.
+
+    Returns ``(pnl, need, trades)``: ``S @ pnl`` is the hedge P&L over the
+    horizon, ``S @ need`` the margin-account balance the business funds in each
+    month (initial margin plus variation margin paid on open positions), and
+    ``trades`` the number of contracts opened per unit, for fees.
+    """
+    unit = np.eye(horizon + 1)
+    pnl, need, trades = np.zeros(horizon + 1), np.zeros((horizon + 1, horizon)), 0
+    if tenor <= 0:
+        return pnl, need, trades
+    for m in range(1, horizon + 1):
+        entry = max(0, m - tenor)
+        if roll == "layered":
+            lock = unit[entry] * (1 + carry * (m - entry) / 12)
+            for t in range(entry, m):
+                forward = unit[t] * (1 + carry * (m - t) / 12)
+                need[:, t] += margin * lock - sign * (forward - lock)
+            pnl += sign * (unit[m] - lock)
+            trades += 1
+        else:
+            realised = np.zeros(horizon + 1)
+            for t in range(entry, m):
+                front = unit[t] * (1 + carry / 12)
+                need[:, t] += margin * front - sign * realised
+                realised += unit[t + 1] - front
+                trades += 1
+            pnl += sign * realised
+    return pnl, need, trades
+
+
+def gbm_multipliers(n, horizon, rng, vols=VOLS, correlation=CORRELATION):
+    """``(n, horizon + 1, 3)`` price multipliers from correlated driftless GBM, starting at 1."""
+    sigma = np.array([vols[f] for f in FACTORS]) * math.sqrt(1 / 12)
+    shocks = rng.standard_normal((n, horizon, len(FACTORS))) @ np.linalg.cholesky(correlation).T
+    log_returns = shocks * sigma - 0.5 * sigma ** 2
+    return np.exp(np.concatenate([np.zeros((n, 1, len(FACTORS))), np.cumsum(log_returns, axis=1)], axis=1))
+
+
+def bootstrap_multipliers(n, horizon, rng, log_returns, block=3):
+    """Price multipliers from blocks of consecutive historical monthly log returns (``(T, 3)``)."""
+    starts = rng.integers(0, len(log_returns) - block + 1, (n, -(-horizon // block)))
+    index = (starts[:, :, None] + np.arange(block)).reshape(n, -1)[:, :horizon]
+    sampled = log_returns[index]
+    sampled -= log_returns.mean(axis=0)  # resample shapes, not the historical trend
+    return np.exp(np.concatenate([np.zeros((n, 1, len(FACTORS))), np.cumsum(sampled, axis=1)], axis=1))
+
+
+def load_history(path):
+    """Monthly log returns from a CSV with seed_purchase_price, oil_blend_sell_price and moc_sell_price columns."""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    prices = np.array([[float(r[FACTOR_INPUTS[k][0]]) for k in FACTORS] for r in rows])
+    if len(prices) < 13:
+        raise ValueError("need at least 13 months of history")
+    return np.diff(np.log(prices), axis=0)
+
+
+def _simulate_shard(args):
+    base, strategies, n, horizon, model, history, market, seed, chunk_size, edges = args
+    rng = np.random.default_rng(seed)
+    c, _ = engine.to_columns(base)
+    scenario = {k: v[0] for k, v in c.items()}
+    plan = engine.calculate_all_metrics(scenario)
+    days = scenario["production_days_per_month"]
+    monthly_qty = {"seed": scenario["seed_input_mt"] * days,
+                   "oil": (plan["final_oil_blend_mt"] + plan["exp_oil_sold_separately_mt"]
+                           - plan["market_oil_to_add_mt"]) * days,
+                   "moc": plan["enhanced_moc_mt"] * days}
+    carry, margin = market["carry_pct_pa"] / 100, market["initial_margin_pct"] / 100
+    financing_rate = scenario["main_financing_rate_pa"] / 100
+    weights = {}
+    for s in strategies:
+        for f in FACTORS:
+            weights.setdefault((s.tenor_months, s.roll, f),
+                               hedge_weights(horizon, s.tenor_months, s.roll, HEDGE_SIGN[f], carry, margin))
+    aggregators = {s.name: streaming_stats.StreamingAggregator(METRICS, EXCEEDANCES, edges=edges.get(s.name))
+                   for s in strategies}
+
+    for start in range(0, n, chunk_size):
+        size = min(chunk_size, n - start)
+        if model == "bootstrap":
+            multipliers = bootstrap_multipliers(size, horizon, rng, history)
+        else:
+            multipliers = gbm_multipliers(size, horizon, rng)
+        multipliers *= np.exp(market["drift_pct_pa"] / 100 * np.arange(horizon + 1) / 12)[None, :, None]
+        # Physical P&L month by month at that month's prices.
+        columns = dict(scenario)
+        for i, f in enumerate(FACTORS):
+            for key in FACTOR_INPUTS[f]:
+                columns[key] = (scenario[key] * multipliers[:, 1:, i]).ravel()
+        out = engine.calculate_batch(columns)
+        monthly_gm = (out["daily_gm"] * days).reshape(size, horizon)
+        monthly_ebitda = (out["daily_ebitda"] * days).reshape(size, horizon)
+        interest = out["annual_interest"].reshape(size, horizon).sum(axis=1) / 12
+        spot = {f: scenario[FACTOR_INPUTS[f][0]] * multipliers[:, :, i] for i, f in enumerate(FACTORS)}
+
+        for s in strategies:
+            ratios = {"seed": s.seed_ratio, "oil": s.oil_ratio, "moc": s.moc_ratio}
+            hedge_pnl, need, traded_mt = np.zeros(size), np.zeros((size, horizon)), 0.0
+            for f in FACTORS:
+                if ratios[f] == 0:
+                    continue
+                pnl_w, need_w, trades = weights[(s.tenor_months, s.roll, f)]
+                qty = ratios[f] * monthly_qty[f]
+                hedge_pnl += qty * (spot[f] @ pnl_w)
+                if s.instrument == "futures":
+                    need += qty * (spot[f] @ need_w)
+                traded_mt += qty * trades
+            margin_cash = np.maximum(need, 0)
+            fees = market["fee_per_mt"] * traded_mt
+            ebitda = monthly_ebitda.sum(axis=1) + hedge_pnl - fees
+            pbt = (ebitda - plan["annual_depreciation"] * horizon / 12 - interest
+                   - financing_rate * margin_cash.sum(axis=1) / 12)
+            pat = pbt - np.maximum(0, pbt * scenario["tax_rate_pct"] / 100)
+            aggregators[s.name].update({
+                "crush_margin_per_mt": (monthly_gm.sum(axis=1) + hedge_pnl - fees) / (monthly_qty["seed"] * horizon),
+                "annual_pat": pat * 12 / horizon, "hedge_pnl": hedge_pnl - fees,
+                "peak_margin_cash": margin_cash.max(axis=1, initial=0.0),
+            })
+    return aggregators
+
+
+def simulate(base, strategies=None, n_paths=100_000, horizon=12, model="gbm", history=None, market=None,
+             processes=None, seed=0, chunk_size=20_000):
+    """Distribution of crush margin, PAT, hedge P&L and peak margin cash for each strategy.
+
+    Returns ``{strategy name: {metric: summary row}}`` as in ``StreamingAggregator.summary``.
+    ``processes`` defaults to one per CPU; pass 1 from a server process (the
+    dashboard) to run in-process without forking a pool.
+    """
+    strategies = default_strategies() if strategies is None else strategies
+    market = {**MARKET, **(market or {})}
+    if model == "bootstrap" and history is None:
+        raise ValueError("the bootstrap model needs a price history")
+    processes = min(processes or os.cpu_count() or 1, n_paths)
+    edges = {}
+    if processes > 1:
+        # A small pilot fixes shared histogram edges so the shard aggregates merge exactly.
+        pilot = _simulate_shard((base, strategies, min(n_paths, 2000), horizon, model, history, market,
+                                 seed + 10_007, chunk_size, {}))
+        edges = {name: {m: a.histogram.edges for m, a in agg.metrics.items()} for name, agg in pilot.items()}
+    shard_sizes = [n_paths // processes + (i < n_paths % processes) for i in range(processes)]
+    jobs = [(base, strategies, size, horizon, model, history, market, seed + i, chunk_size, edges)
+            for i, size in enumerate(shard_sizes) if size]
+    if len(jobs) == 1:
+        partials = [_simulate_shard(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            partials = list(pool.map(_simulate_shard, jobs))
+    totals = partials[0]
+    for part in partials[1:]:
+        for name, agg in totals.items():
+            agg.merge(part[name])
+    return {name: agg.summary() for name, agg in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate commodity hedging strategies over price paths.")
+    parser.add_argument("--paths", type=int, default=100_000)
+    parser.add_argument("--horizon", type=int, default=12, help="months")
+    parser.add_argument("--model", choices=("gbm", "bootstrap"), default="gbm")
+    parser.add_argument("--history", help="CSV of monthly prices for the bootstrap model")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    history = load_history(args.history) if args.history else None
+    start = time.perf_counter()
+    results = simulate({}, n_paths=args.paths, horizon=args.horizon, model=args.model, history=history,
+                       processes=args.processes, seed=args.seed)
+    print(f"{len(results)} strategies x {args.paths:,} paths in {time.perf_counter() - start:.1f} s\n")
+    print(f"{'Strategy':<34} {'PAT mean':>10} {'PAT P5':>10} {'P(loss)':>8} {'Margin/MT':>10} "
+          f"{'Margin P5':>10} {'Cash P95':>10}   (₹ Cr, ₹/MT)")
+    rows = sorted(results.items(), key=lambda item: -item[1]["annual_pat"]["p5"])
+    for name, r in rows:
+        pat, crush, cash = r["annual_pat"], r["crush_margin_per_mt"], r["peak_margin_cash"]
+        print(f"{name:<34} {pat['mean'] / 1e7:>10,.2f} {pat['p5'] / 1e7:>10,.2f} {pat['P(annual_pat < 0)']:>8.1%} "
+              f"{crush['mean']:>10,.0f} {crush['p5']:>10,.0f} {cash['p95'] / 1e7:>10,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Event-sourced ledger for finished-goods stock, debtors and creditors.
+
+The dashboard values FG stock as ``daily qty x price x safety days``. This
+module replays what actually happened instead. Events are appended in date
+order:
+
+    production  product, qty_mt, unit_cost        FG made (oil or moc)
+    blending    qty_mt, unit_cost, credit_days    market oil bought into the oil blend
+    dispatch    product, qty_mt                   FG leaves stock at FIFO / weighted-average cost
+    sale        amount, credit_days               invoice raised; debtor until collected
+    purchase    amount, credit_days               supplier bill; creditor until paid
+    receipt     amount                            cash collected from debtors
+    payment     amount                            cash paid to creditors
+
+Sales, purchases and blending with ``credit_days`` settle automatically when
+their credit days run out; without ``credit_days`` they stay open until a
+receipt or payment. Receipts and payments are matched against the open
+invoices of their account, oldest due first, so an invoice settled by a
+receipt is not settled again when its credit days run out. Every ``snapshot_every`` events the full state is snapshotted, so
+``position(as_of)`` bisects to the nearest snapshot and replays at most that
+many events instead of years of history.
+
+Dates are ``datetime.date`` or ISO strings.
+"""
+import bisect
+import copy
+import heapq
+import json
+from collections import deque
+from datetime import date
+
+PRODUCTS = ("oil", "moc")
+FIFO, WEIGHTED_AVERAGE = "fifo", "weighted_average"
+EVENT_KINDS = ("production", "blending", "dispatch", "sale", "purchase", "receipt", "payment")
+
+
+def _day(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+
+class _Stock:
+    """Cost layers for one product. FIFO keeps every layer; weighted average keeps one."""
+
+    def __init__(self, method):
+        self.method = method
+        self.layers = deque()  # [qty, unit_cost]
+
+    @property
+    def qty(self):
+        return sum(q for q, _ in self.layers)
+
+    @property
+    def value(self):
+        return sum(q * c for q, c in self.layers)
+
+    def receive(self, qty, unit_cost):
+        if self.method == WEIGHTED_AVERAGE and self.layers:
+            q, c = self.layers[0]
+            self.layers[0] = [q + qty, (q * c + qty * unit_cost) / (q + qty)]
+        else:
+            self.layers.append([qty, unit_cost])
+
+    def issue(self, qty):
+        """Removes ``qty`` from the oldest layers and returns its cost."""
+        cost = 0.0
+        while qty > 1e-9:
+            if not self.layers:
+                raise ValueError(f"dispatch exceeds stock by {qty:.3f} MT")
+            layer = self.layers[0]
+            take = min(qty, layer[0])
+            cost += take * layer[1]
+            layer[0] -= take
+            qty -= take
+            if layer[0] <= 1e-9:
+                self.layers.popleft()
+        return cost
+
+
+class _State:
+    def __init__(self, method):
+        self.stock = {p: _Stock(method) for p in PRODUCTS}
+        self.debtors = self.creditors = 0.0
+        self.cogs = self.sales = 0.0
+        self.settlements = []  # heap of [due_day, seq, "debtors"/"creditors", amount still open]
+        self.seq = 0
+
+    def settle_until(self, day):
+        while self.settlements and self.settlements[0][0] <= day:
+            _, _, account, amount = heapq.heappop(self.settlements)
+            setattr(self, account, getattr(self, account) - amount)
+
+    def _on_credit(self, day, account, amount, credit_days):
+        setattr(self, account, getattr(self, account) + amount)
+        if credit_days is not None:
+            self.seq += 1
+            heapq.heappush(self.settlements, [day + int(credit_days), self.seq, account, amount])
+
+    def _on_cash(self, account, amount):
+        setattr(self, account, getattr(self, account) - amount)
+        # The cash settles the oldest invoices due to auto-settle first, so they do not settle twice.
+        for entry in sorted(e for e in self.settlements if e[2] == account):
+            if amount <= 0:
+                break
+            matched = min(entry[3], amount)
+            entry[3] -= matched
+            amount -= matched
+
+    def apply(self, day, event):
+        kind = event["kind"]
+        if kind == "production":
+            self.stock[event["product"]].receive(event["qty_mt"], event["unit_cost"])
+        elif kind == "blending":
+            self.stock["oil"].receive(event["qty_mt"], event["unit_cost"])
+            self._on_credit(day, "creditors", event["qty_mt"] * event["unit_cost"], event.get("credit_days"))
+        elif kind == "dispatch":
+            self.cogs += self.stock[event["product"]].issue(event["qty_mt"])
+        elif kind == "sale":
+            self.sales += event["amount"]
+            self._on_credit(day, "debtors", event["amount"], event.get("credit_days"))
+        elif kind == "purchase":
+            self._on_credit(day, "creditors", event["amount"], event.get("credit_days"))
+        elif kind == "receipt":
+            self._on_cash("debtors", event["amount"])
+        elif kind == "payment":
+            self._on_cash("creditors", event["amount"])
+        else:
+            raise ValueError(f"unknown event kind '{kind}'")
+
+
+class InventoryLedger:
+    """Append-only event log with periodic state snapshots for fast as-of queries."""
+
+    def __init__(self, method=FIFO, snapshot_every=500):
+        if method not in (FIFO, WEIGHTED_AVERAGE):
+            raise ValueError(f"method must be '{FIFO}' or '{WEIGHTED_AVERAGE}'")
+        self.method, self.snapshot_every = method, snapshot_every
+        self._days, self._events = [], []
+        self._state = _State(method)
+        # Snapshot i is the state after the first _snapshot_seq[i] events.
+        self._snapshot_days, self._snapshot_seq, self._snapshots = [], [], []
+
+    def __len__(self):
+        return len(self._events)
+
+    def append(self, event):
+        """Appends one event dict (must include ``day`` and ``kind``) and applies it to the live state."""
+        day = _day(event["day"])
+        if self._days and day < self._days[-1]:
+            raise ValueError("events must be appended in date order")
+        if event["kind"] not in EVENT_KINDS:
+            raise ValueError(f"unknown event kind '{event['kind']}'")
+        self._state.settle_until(day - 1)
+        self._state.apply(day, event)
+        self._days.append(day)
+        self._events.append(event)
+        if len(self._events) % self.snapshot_every == 0:
+            self._snapshot_days.append(day)
+            self._snapshot_seq.append(len(self._events))
+            self._snapshots.append(copy.deepcopy(self._state))
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def position(self, as_of):
+        """Stock, valuation and receivable/payable balances at the end of day ``as_of``."""
+        day = _day(as_of)
+        i = bisect.bisect_right(self._snapshot_days, day) - 1
+        if i >= 0:
+            state, start = copy.deepcopy(self._snapshots[i]), self._snapshot_seq[i]
+        else:
+            state, start = _State(self.method), 0
+        stop = bisect.bisect_right(self._days, day, lo=start)
+        for event_day, event in zip(self._days[start:stop], self._events[start:stop]):
+            state.settle_until(event_day - 1)
+            state.apply(event_day, event)
+        state.settle_until(day)
+        return {
+            "as_of": date.fromordinal(day).isoformat(),
+            "oil_qty_mt": state.stock["oil"].qty, "oil_value": state.stock["oil"].value,
+            "moc_qty_mt": state.stock["moc"].qty, "moc_value": state.stock["moc"].value,
+            "fg_inventory_value": state.stock["oil"].value + state.stock["moc"].value,
+            "debtors": state.debtors, "creditors": state.creditors,
+            "cumulative_cogs": state.cogs, "cumulative_sales": state.sales,
+        }
+
+    def working_capital_inputs(self, as_of):
+        """Ledger balances as ``engine`` overrides for the day-multiplier WC estimates."""
+        pos = self.position(as_of)
+        return {"fg_inventory_value": pos["fg_inventory_value"], "debtors_value": pos["debtors"],
+                "creditors_value": pos["creditors"]}
+
+    @classmethod
+    def from_jsonl(cls, lines, **kwargs):
+        """Builds a ledger from JSONL text lines (a file object or a list of strings)."""
+        ledger = cls(**kwargs)
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode()
+            if line.strip():
+                ledger.append(json.loads(line))
+        return ledger
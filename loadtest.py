@@ -0,0 +1,110 @@
+"""Load test for the local calculation API (api_server.py).
+
+Fires requests from many concurrent client threads, each over its own keep-alive
+connection, and reports client-side latency and throughput alongside the
+server's own /metrics.
+
+    python loadtest.py --start-server --concurrency 32 --requests 5000
+    python loadtest.py --url http://127.0.0.1:8600 --scenarios-per-request 50
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+import engine
+
+# Inputs the load test perturbs; everything else stays at the dashboard defaults.
+VARIED_INPUTS = ("seed_input_mt", "seed_purchase_price", "oil_blend_sell_price", "moc_sell_price",
+                 "kachi_ghani_pungency", "expeller_oil_pungency", "creditor_days")
+
+
+def random_scenario(rng):
+    return {k: engine.DEFAULT_INPUTS[k] * rng.uniform(0.8, 1.2) for k in VARIED_INPUTS}
+
+
+def run_client(host, port, n_requests, per_request, latencies, failures, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for _ in range(n_requests):
+        payload = [random_scenario(rng) for _ in range(per_request)] if per_request > 1 else random_scenario(rng)
+        body = json.dumps(payload).encode()
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/calculate?fields=annual_pat,roce_pat", body=body,
+                         headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            failures.append(1)
+    conn.close()
+
+
+def fetch_json(host, port, path):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.request("GET", path)
+    data = json.loads(conn.getresponse().read())
+    conn.close()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the local calculation API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8600")
+    parser.add_argument("--start-server", action="store_true", help="start a local instance on a free port")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="total requests across all clients")
+    parser.add_argument("--scenarios-per-request", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4, help="server workers when --start-server is used")
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        import api_server
+        server = api_server.make_server(port=0, workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+    else:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+
+    latencies, failures = [], []
+    per_client = max(1, args.requests // args.concurrency)
+    threads = [threading.Thread(target=run_client, args=(host, port, per_client, args.scenarios_per_request,
+                                                         latencies, failures, i))
+               for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    total = len(latencies)
+    print(f"Requests: {total} ({len(failures)} failed) from {args.concurrency} clients in {elapsed:.2f}s")
+    print(f"Throughput: {total / elapsed:,.0f} req/s, {total * args.scenarios_per_request / elapsed:,.0f} scenarios/s")
+    print("Latency (ms): p50 {:.2f}  p95 {:.2f}  p99 {:.2f}  max {:.2f}".format(*np.percentile(lat, [50, 95, 99]), lat.max()))
+    server_metrics = fetch_json(host, port, "/metrics")
+    print(f"Server: {server_metrics['batches']} engine batches, avg {server_metrics['avg_batch_scenarios']:.1f} "
+          f"scenarios/batch, engine {server_metrics['engine_scenarios_per_s']:,.0f} scenarios/s")
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,27 +2,10 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-# --- Page Configuration and Helper Function ---
-st.set_page_config(layout="wide", page_title="Mustard Oil Business Dashboard")
+from formatting import format_indian
 
-def format_indian(num):
-    """Formats a number into the Indian numbering system for better readability."""
-    if not isinstance(num, (int, float)):
-        return num
-    num_str = f"{abs(num):,.0f}"
-    parts = num_str.split('.')
-    integer_part = parts[0].replace(',', '')
-    if len(integer_part) > 3:
-        last_three = integer_part[-3:]
-        other_digits = integer_part[:-3]
-        if other_digits:
-            formatted_other_digits = ','.join([other_digits[max(0, i-2):i] for i in range(len(other_digits), 0, -2)][::-1])
-            formatted_num = f"{formatted_other_digits},{last_three}"
-        else:
-            formatted_num = last_three
-    else:
-        formatted_num = integer_part
-    return '-' + formatted_num if num < 0 else formatted_num
+# --- Page Configuration ---
+st.set_page_config(layout="wide", page_title="Mustard Oil Business Dashboard")
 
 st.title("🛢️ Mustard Oil Financial & Operational Dashboard")
 st.markdown("An interactive dashboard for daily, monthly, and annual analysis of a mustard oil processing business.")
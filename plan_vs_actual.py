@@ -0,0 +1,338 @@
+"""Daily plant actuals against the model, with a price/volume/yield/blend variance split.
+
+Each day's actuals come from a CSV or JSONL log, one record per day. Any
+field may be missing; a missing driver keeps the plan value.
+
+    day                         ISO date
+    seed_crushed_mt             volume
+    kachi_ghani_yield_pct, expeller_yield_pct                       yield
+    kachi_ghani_pungency, expeller_oil_pungency                     blend (lab pungency)
+    seed_purchase_price, oil_blend_sell_price, expeller_oil_sell_price,
+    moc_sell_price, market_bought_oil_price                         realised prices
+    oil_blend_dispatched_mt, expeller_oil_dispatched_mt,
+    moc_dispatched_mt, market_oil_bought_mt                         dispatches
+
+The plan is the dashboard scenario, so plan gross margin is ``daily_gm`` from
+``engine``. The gap to the actual gross margin is split by substituting
+actuals into the plan one driver group at a time:
+
+    volume  seed crushed
+    yield   Kachi Ghani and expeller yields
+    blend     pungencies (how much expeller oil is diverted and market oil bought)
+    price     realised prices
+    dispatch  recorded dispatches and market oil bought against the fully
+              flexed model (stock build or drawdown, a different correction)
+
+The effects add up to the variance exactly. All stages of a batch of days are
+evaluated in one ``engine.calculate_batch`` call.
+
+``VarianceLedger`` keeps per-day variances and their running totals, so MTD and
+YTD (Indian financial year by default) are two bisects and a subtraction.
+``follow(path)`` reads only the lines appended to a log since the last call.
+A line that cannot be parsed or added is skipped and counted, so one bad
+record does not stop later days from loading.
+
+    python plan_vs_actual.py actuals.csv --plan plan.json --as-of 2026-10-15
+    python plan_vs_actual.py --bench --years 5
+"""
+import argparse
+import bisect
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+import engine
+
+ALIASES = {"seed_crushed_mt": "seed_input_mt"}
+EFFECTS = ("volume", "yield", "blend", "price", "dispatch")
+DRIVERS = {
+    "volume": ("seed_input_mt",),
+    "yield": ("kachi_ghani_yield_pct", "expeller_yield_pct"),
+    "blend": ("kachi_ghani_pungency", "expeller_oil_pungency"),
+    "price": ("seed_purchase_price", "oil_blend_sell_price", "expeller_oil_sell_price", "moc_sell_price",
+              "market_bought_oil_price"),
+}
+# Dispatch field -> engine output it replaces.
+DISPATCHES = {"oil_blend_dispatched_mt": "final_oil_blend_mt",
+              "expeller_oil_dispatched_mt": "exp_oil_sold_separately_mt",
+              "moc_dispatched_mt": "enhanced_moc_mt", "market_oil_bought_mt": "market_oil_to_add_mt"}
+DAY_FIELDS = ("plan_gm", "actual_gm", "variance") + tuple(f"{e}_effect" for e in EFFECTS) + (
+    "plan_seed_mt", "actual_seed_mt")
+
+
+def _day(value):
+    """Day ordinal of an ISO date string or ``date``; anything else is a ValueError."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    if not isinstance(value, date):
+        raise ValueError(f"day must be an ISO date, got {value!r}")
+    return value.toordinal()
+
+
+def _number(value):
+    if value is None or value == "":
+        return np.nan
+    return float(value)
+
+
+def _actual_columns(records):
+    keys = [k for group in DRIVERS.values() for k in group] + list(DISPATCHES)
+    columns = {k: np.full(len(records), np.nan) for k in keys}
+    for i, record in enumerate(records):
+        for field, value in record.items():
+            key = ALIASES.get(field, field)
+            if key in columns:
+                columns[key][i] = _number(value)
+    return columns
+
+
+def variance_batch(plan, records):
+    """Per-day plan and actual gross margin and the variance split for a list of day records."""
+    n = len(records)
+    actual = _actual_columns(records)
+    plan_columns, _ = engine.to_columns(plan)
+    stage = {k: np.repeat(v[:1], n) for k, v in plan_columns.items()}
+    stages = [stage]
+    for effect in DRIVERS:
+        stage = dict(stage)
+        for key in DRIVERS[effect]:
+            stage[key] = np.where(np.isnan(actual[key]), stage[key], actual[key])
+        stages.append(stage)
+    out = engine.calculate_batch({k: np.concatenate([s[k] for s in stages]) for k in engine.INPUT_KEYS})
+    gm = out["daily_gm"].reshape(len(stages), n)
+
+    # Actual gross margin: recorded dispatches at realised prices; anything not
+    # recorded is taken from the fully flexed model (last stage).
+    flexed = {k: v[-n:] for k, v in out.items()}
+    qty = {field: np.where(np.isnan(actual[field]), flexed[key], actual[field]) for field, key in DISPATCHES.items()}
+    seed, market_price = stage["seed_input_mt"], stage["market_bought_oil_price"]
+    enhancement_cost = (flexed["daily_cogs"] - seed * stage["seed_purchase_price"]
+                        - flexed["market_oil_to_add_mt"] * market_price)
+    actual_gm = (qty["oil_blend_dispatched_mt"] * stage["oil_blend_sell_price"]
+                 + qty["expeller_oil_dispatched_mt"] * stage["expeller_oil_sell_price"]
+                 + qty["moc_dispatched_mt"] * stage["moc_sell_price"]
+                 - seed * stage["seed_purchase_price"] - qty["market_oil_bought_mt"] * market_price
+                 - enhancement_cost)
+    step = np.diff(gm, axis=0)
+    return {
+        "plan_gm": gm[0], "actual_gm": actual_gm, "variance": actual_gm - gm[0],
+        "volume_effect": step[0], "yield_effect": step[1],
+        "blend_effect": step[2], "price_effect": step[3], "dispatch_effect": actual_gm - gm[-1],
+        "plan_seed_mt": stages[0]["seed_input_mt"], "actual_seed_mt": seed,
+    }
+
+
+def read_records(lines, kind):
+    """Parses complete CSV lines (header first) or JSONL lines into record dicts."""
+    if kind == "csv":
+        return list(csv.DictReader(io.StringIO("".join(lines))))
+    records = [json.loads(line) for line in lines if line.strip()]
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError(f"expected a JSON object per line, got {record!r}")
+    return records
+
+
+class VarianceLedger:
+    """Per-day plan-vs-actual variances with running totals for MTD/YTD queries."""
+
+    def __init__(self, plan, fy_start_month=4, capacity=1024):
+        self.plan, self.fy_start_month = dict(plan), fy_start_month
+        self._days = []
+        self._daily = np.zeros((capacity, len(DAY_FIELDS)))
+        self._cumulative = np.zeros((capacity + 1, len(DAY_FIELDS)))  # row i: totals of the first i days
+        self._lock = threading.RLock()
+        self._offsets = {}  # path -> (byte offset, CSV header line)
+        self.skipped, self.last_error = 0, None
+
+    def __len__(self):
+        return len(self._days)
+
+    def _reserve(self, n):
+        if n <= self._daily.shape[0]:
+            return
+        capacity = max(n, 2 * self._daily.shape[0])
+        daily = np.zeros((capacity, len(DAY_FIELDS)))
+        cumulative = np.zeros((capacity + 1, len(DAY_FIELDS)))
+        daily[:len(self)], cumulative[:len(self) + 1] = self._daily[:len(self)], self._cumulative[:len(self) + 1]
+        self._daily, self._cumulative = daily, cumulative
+
+    def extend(self, records):
+        """Adds day records (in date order, one per day, after any day already added)."""
+        if not records:
+            return 0
+        days = [_day(r["day"]) for r in records]
+        with self._lock:
+            last = self._days[-1] if self._days else None
+            for day in days:
+                if last is not None and day <= last:
+                    raise ValueError(f"actuals must be one record per day in date order ({date.fromordinal(day)})")
+                last = day
+            values = variance_batch(self.plan, records)
+            rows = np.column_stack([values[f] for f in DAY_FIELDS])
+            start, stop = len(self), len(self) + len(days)
+            self._reserve(stop)
+            self._daily[start:stop] = rows
+            self._cumulative[start + 1:stop + 1] = self._cumulative[start] + np.cumsum(rows, axis=0)
+            self._days.extend(days)
+        return len(days)
+
+    def append(self, record):
+        return self.extend([record])
+
+    def follow(self, path):
+        """Adds the records appended to a CSV or JSONL log since the last call; returns how many."""
+        kind = "csv" if str(path).lower().endswith(".csv") else "jsonl"
+        with self._lock:
+            offset, header = self._offsets.get(path, (0, None))
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            end = data.rfind(b"\n") + 1  # leave a partly written last line for next time
+            # Undecodable bytes become U+FFFD, so the line fails to parse and is skipped below.
+            lines = data[:end].decode(errors="replace").splitlines(keepends=True)
+            if kind == "csv" and header is None and lines:
+                header, lines = lines[0], lines[1:]
+            try:
+                added = self.extend(read_records(([header] if kind == "csv" else []) + lines, kind))
+            except (ValueError, KeyError, TypeError):
+                # extend adds nothing on error: retry line by line and skip the bad ones.
+                added = 0
+                for line in lines:
+                    try:
+                        added += self.extend(read_records(([header] if kind == "csv" else []) + [line], kind))
+                    except (ValueError, KeyError, TypeError) as exc:
+                        self.skipped += 1
+                        self.last_error = f"{path}: {exc} in {line.strip()[:200]!r}"
+            self._offsets[path] = (offset + end, header)
+        return added
+
+    def _totals(self, first_day, last_day):
+        lo = bisect.bisect_left(self._days, first_day)
+        hi = bisect.bisect_right(self._days, last_day)
+        totals = self._cumulative[hi] - self._cumulative[lo]
+        return {"from": date.fromordinal(first_day).isoformat(), "to": date.fromordinal(last_day).isoformat(),
+                "days": hi - lo, **dict(zip(DAY_FIELDS, totals.tolist()))}
+
+    def _as_of(self, as_of):
+        if as_of is not None:
+            return date.fromordinal(_day(as_of))
+        if not self._days:
+            raise ValueError("no actuals loaded")
+        return date.fromordinal(self._days[-1])
+
+    def mtd(self, as_of=None):
+        """Totals from the first of the month to ``as_of`` (default: the latest day)."""
+        with self._lock:
+            end = self._as_of(as_of)
+            return self._totals(end.replace(day=1).toordinal(), end.toordinal())
+
+    def ytd(self, as_of=None):
+        """Totals from the start of the financial year to ``as_of``."""
+        with self._lock:
+            end = self._as_of(as_of)
+            year = end.year if end.month >= self.fy_start_month else end.year - 1
+            return self._totals(date(year, self.fy_start_month, 1).toordinal(), end.toordinal())
+
+    def day(self, as_of):
+        with self._lock:
+            i = bisect.bisect_left(self._days, _day(as_of))
+            if i == len(self._days) or self._days[i] != _day(as_of):
+                return None
+            return {"day": date.fromordinal(self._days[i]).isoformat(), **dict(zip(DAY_FIELDS, self._daily[i].tolist()))}
+
+    def daily(self, first_day=None, last_day=None):
+        """Per-day columns between two dates (inclusive), for charts."""
+        with self._lock:
+            lo = 0 if first_day is None else bisect.bisect_left(self._days, _day(first_day))
+            hi = len(self._days) if last_day is None else bisect.bisect_right(self._days, _day(last_day))
+            result = {"day": [date.fromordinal(d).isoformat() for d in self._days[lo:hi]]}
+            result.update({f: self._daily[lo:hi, i].copy() for i, f in enumerate(DAY_FIELDS)})
+            return result
+
+
+def synthetic_actuals(days, plan=None, start="2022-04-01", seed=0):
+    """Day records scattered around the plan, for demos and benchmarks."""
+    rng = np.random.default_rng(seed)
+    base = {**engine.DEFAULT_INPUTS, **(plan or {})}
+    first = _day(start)
+    records = []
+    for i in range(days):
+        record = {"day": date.fromordinal(first + i).isoformat(),
+                  "seed_crushed_mt": round(base["seed_input_mt"] * rng.uniform(0.85, 1.05), 1),
+                  "kachi_ghani_yield_pct": round(base["kachi_ghani_yield_pct"] + rng.normal(0, 0.5), 2),
+                  "expeller_yield_pct": round(base["expeller_yield_pct"] + rng.normal(0, 0.5), 2),
+                  "kachi_ghani_pungency": round(base["kachi_ghani_pungency"] + rng.normal(0, 0.02), 3),
+                  "expeller_oil_pungency": round(base["expeller_oil_pungency"] + rng.normal(0, 0.02), 3)}
+        for key in DRIVERS["price"]:
+            record[key] = round(base[key] * (1 + rng.normal(0, 0.02)))
+        records.append(record)
+    return records
+
+
+def benchmark(years=5):
+    """Loads ``years`` of daily actuals from a JSONL log, then times one new day arriving."""
+    records = synthetic_actuals(365 * years + 1)
+    workdir = tempfile.TemporaryDirectory()
+    path = os.path.join(workdir.name, "actuals.jsonl")
+    with open(path, "w") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records[:-1])
+    ledger = VarianceLedger(engine.DEFAULT_INPUTS)
+    start = time.perf_counter()
+    ledger.follow(path)
+    initial_s = time.perf_counter() - start
+    with open(path, "a") as f:
+        f.write(json.dumps(records[-1]) + "\n")
+    start = time.perf_counter()
+    ledger.follow(path)
+    mtd, ytd = ledger.mtd(), ledger.ytd()
+    update_s = time.perf_counter() - start
+    workdir.cleanup()
+    return {"days": len(ledger), "initial_load_ms": initial_s * 1000, "new_day_with_mtd_ytd_ms": update_s * 1000,
+            "mtd": mtd, "ytd": ytd}
+
+
+def _print_totals(title, totals):
+    print(f"\n{title} ({totals['from']} to {totals['to']}, {totals['days']} days)")
+    print(f"  Plan GM     ₹{totals['plan_gm'] / 1e5:>12,.2f} L")
+    print(f"  Actual GM   ₹{totals['actual_gm'] / 1e5:>12,.2f} L")
+    print(f"  Variance    ₹{totals['variance'] / 1e5:>12,.2f} L")
+    for effect in EFFECTS:
+        print(f"    {effect:<9} ₹{totals[f'{effect}_effect'] / 1e5:>12,.2f} L")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan-vs-actual gross margin variance from daily plant actuals.")
+    parser.add_argument("actuals", nargs="?", help="CSV or JSONL log of daily actuals")
+    parser.add_argument("--plan", help="JSON file with the plan scenario (defaults to the dashboard)")
+    parser.add_argument("--as-of", help="ISO date for MTD/YTD (default: latest day)")
+    parser.add_argument("--fy-start-month", type=int, default=4)
+    parser.add_argument("--bench", action="store_true", help="time incremental updates on synthetic history")
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+    if args.bench:
+        result = benchmark(args.years)
+        print(f"{result['days']:,} days: initial load {result['initial_load_ms']:.1f} ms, "
+              f"new day + MTD/YTD {result['new_day_with_mtd_ytd_ms']:.2f} ms")
+        return
+    if not args.actuals:
+        parser.error("give an actuals log or --bench")
+    plan = {}
+    if args.plan:
+        with open(args.plan) as f:
+            plan = json.load(f)
+    ledger = VarianceLedger(plan, args.fy_start_month)
+    ledger.follow(args.actuals)
+    _print_totals("Month to date", ledger.mtd(args.as_of))
+    _print_totals("Year to date", ledger.ytd(args.as_of))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Live prices for the dashboard sidebar from an internal price service.
+
+``PriceFeed`` keeps the latest prices in a TTL cache and refreshes them on a
+background asyncio loop. ``get()`` never touches the network, so a dashboard
+rerun never waits on it:
+
+* fresh (younger than ``ttl_s``)        - returned as is;
+* stale (younger than ``max_stale_s``)  - returned as is while one background
+  refresh runs (stale-while-revalidate);
+* older, or nothing cached yet          - ``None``, so the caller falls back
+  to its manual inputs.
+
+Requests go through ``AsyncHTTPClient``, a small asyncio HTTP/1.1 client. It
+keeps a pool of keep-alive connections and applies a timeout to each request.
+It reads chunked, Content-Length and close-delimited bodies. Any other
+transfer coding is rejected with a ValueError.
+
+The service answers ``GET /prices`` with ``{"as_of": ..., "prices": {name: ₹/MT}}``.
+``PriceServer`` is a local stand-in:
+
+    python price_feed.py --serve --port 8700 --latency-ms 150
+    python price_feed.py --bench               # rerun latency with and without the feed
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+
+import engine
+
+PRICE_KEYS = ("seed_purchase_price", "oil_blend_sell_price", "moc_sell_price", "market_bought_oil_price")
+
+
+async def _read_body(reader, headers):
+    """Reads a response body framed by chunked transfer coding, Content-Length or connection close."""
+    coding = headers.get("transfer-encoding", "").lower()
+    if coding == "chunked":
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                raise ConnectionError("connection closed inside a chunked body")
+            size = int(size_line.split(b";")[0].strip(), 16)  # chunk extensions after ';' are ignored
+            if size == 0:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)  # CRLF after the chunk data
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # trailer fields
+        return b"".join(chunks)
+    if coding:
+        raise ValueError(f"unsupported Transfer-Encoding {coding!r} from price service")
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"]))
+    return await reader.read()  # no framing: the body runs until the server closes the connection
+
+
+class AsyncHTTPClient:
+    """Minimal HTTP/1.1 GET client with a pool of keep-alive connections."""
+
+    def __init__(self, host, port, pool_size=4, timeout_s=2.0):
+        self.host, self.port, self.timeout = host, port, timeout_s
+        self._idle = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self.connections_opened = 0
+
+    async def _connect(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        self.connections_opened += 1
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _request(self, path):
+        reader, writer = await self._connect()
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: keep-alive\r\n\r\n".encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by server")
+            status = int(status_line.split()[1])
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await _read_body(reader, headers)
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get("connection", "").lower() == "close" or reader.at_eof():
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+        return status, body
+
+    async def get_json(self, path):
+        async with self._slots:
+            status, body = await asyncio.wait_for(self._request(path), self.timeout)
+        if status != 200:
+            raise RuntimeError(f"price service returned HTTP {status}")
+        return json.loads(body)
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+class PriceFeed:
+    """TTL-cached prices with stale-while-revalidate, refreshed on a background event loop."""
+
+    def __init__(self, url, ttl_s=30.0, max_stale_s=900.0, timeout_s=2.0, pool_size=4):
+        parsed = urlparse(url)
+        self.path = parsed.path or "/prices"
+        self.ttl, self.max_stale = ttl_s, max_stale_s
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="price-feed", daemon=True)
+        self._thread.start()
+        self._client = AsyncHTTPClient(parsed.hostname, parsed.port or 80, pool_size, timeout_s)
+        self._lock = threading.Lock()
+        self._prices, self._fetched_at, self._as_of = None, None, None
+        self._refreshing = None
+        self.hits = self.stale_hits = self.misses = self.refreshes = self.errors = 0
+        self.last_error = None
+
+    def get(self):
+        """Latest prices ``{name: value}`` without blocking, or None if there are none recent enough."""
+        with self._lock:
+            age = time.monotonic() - self._fetched_at if self._fetched_at is not None else None
+            if age is None or age > self.max_stale:
+                self.misses += 1
+                prices = None
+            elif age > self.ttl:
+                self.stale_hits += 1
+                prices = self._prices
+            else:
+                self.hits += 1
+                prices = self._prices
+            if (age is None or age > self.ttl) and self._refreshing is None:
+                self._refreshing = asyncio.run_coroutine_threadsafe(self._refresh(), self._loop)
+        return prices
+
+    def wait_ready(self, timeout_s=2.0):
+        """Blocks until the first refresh finishes (for scripts, not for reruns)."""
+        if self.get() is None and self._refreshing is not None:
+            try:
+                self._refreshing.result(timeout_s)
+            except Exception:
+                pass
+        return self.get()
+
+    async def _refresh(self):
+        try:
+            payload = await self._client.get_json(self.path)
+            prices = {k: float(v) for k, v in payload["prices"].items() if k in PRICE_KEYS}
+            with self._lock:
+                self._prices, self._fetched_at, self._as_of = prices, time.monotonic(), payload.get("as_of")
+                self.refreshes += 1
+        except Exception as exc:
+            with self._lock:
+                self.errors += 1
+                self.last_error = f"{type(exc).__name__}: {exc}"
+        finally:
+            with self._lock:
+                self._refreshing = None
+
+    def status(self):
+        with self._lock:
+            return {"age_s": time.monotonic() - self._fetched_at if self._fetched_at is not None else None,
+                    "as_of": self._as_of, "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                    "refreshes": self.refreshes, "errors": self.errors, "last_error": self.last_error,
+                    "connections_opened": self._client.connections_opened}
+
+    async def _shutdown(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._client.close()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class _PriceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if urlparse(self.path).path != "/prices":
+            body, status = b'{"error": "not found"}', 404
+        else:
+            time.sleep(server.latency)
+            if random.random() < server.fail_rate:
+                body, status = b'{"error": "upstream unavailable"}', 503
+            else:
+                body, status = json.dumps({"as_of": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                           "prices": server.tick()}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # the client gave up waiting
+
+
+class PriceServer(ThreadingHTTPServer):
+    """Stand-in price service: dashboard default prices on a random walk, with optional latency and failures."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8700, latency_ms=50.0, fail_rate=0.0, volatility=0.002):
+        super().__init__((host, port), _PriceHandler)
+        self.latency, self.fail_rate, self.volatility = latency_ms / 1000, fail_rate, volatility
+        self._prices = {k: float(engine.DEFAULT_INPUTS[k]) for k in PRICE_KEYS}
+        self._price_lock = threading.Lock()
+
+    def tick(self):
+        with self._price_lock:
+            for k in self._prices:
+                self._prices[k] = round(self._prices[k] * (1 + random.gauss(0, self.volatility)))
+            return dict(self._prices)
+
+
+def benchmark(reruns=300, rerun_interval_s=0.02, latency_ms=150.0, ttl_s=1.0):
+    """Rerun latency (price lookup + metrics) with no feed, a blocking fetch, and PriceFeed."""
+    server = PriceServer(port=0, latency_ms=latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/prices"
+
+    def blocking_prices():
+        with urllib.request.urlopen(url, timeout=2) as resp:
+            return json.load(resp)["prices"]
+
+    feed = PriceFeed(url, ttl_s=ttl_s)
+    feed.wait_ready()
+    modes = {"no feed": lambda: None, "blocking fetch": blocking_prices, "price feed": feed.get}
+    results = {}
+    for name, lookup in modes.items():
+        latencies = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            prices = lookup() or {}
+            engine.calculate_all_metrics({**engine.DEFAULT_INPUTS, **prices})
+            latencies.append(time.perf_counter() - start)
+            time.sleep(rerun_interval_s)
+        lat = np.array(latencies) * 1000
+        results[name] = {"p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99)),
+                         "max_ms": float(lat.max())}
+    results["feed status"] = feed.status()
+    feed.close()
+    server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in price service and price-feed benchmark.")
+    parser.add_argument("--serve", action="store_true", help="run the stand-in price server")
+    parser.add_argument("--bench", action="store_true", help="measure rerun latency with the feed enabled")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="simulated service latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = parser.parse_args()
+    if args.bench:
+        for name, stats in benchmark(latency_ms=args.latency_ms).items():
+            print(f"{name:>14}: " + ", ".join(f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}"
+                                              for k, v in stats.items()))
+        return
+    server = PriceServer(port=args.port, latency_ms=args.latency_ms, fail_rate=args.fail_rate)
+    print(f"Serving stand-in prices on http://127.0.0.1:{server.server_address[1]}/prices")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Order-book product-mix optimiser for multiple oil grades.
+
+The dashboard sells one blend at ``oil_blend_sell_price`` and surplus expeller
+oil at ``expeller_oil_sell_price``. Here the day's oil is allocated across an
+order book instead: each line has a grade, a quantity, a minimum pungency and a
+price. Supply comes from three streams - Kachi Ghani oil, expeller oil and
+market oil (0% pungency, bought at ``market_bought_oil_price``). Own oil not
+placed on an order is sold at the expeller spot price.
+
+Streams blend freely, so what matters is the pungency each order receives on
+average. With the streams ranked by pungency (hi >= mid >= lo), a set of fills
+is blendable exactly when two "lift" budgets hold: lift above the middle
+stream can only come from the strongest stream, and lift above the weakest
+can come from the other two:
+
+    (1) sum_o max(floor_o - p_mid, 0)*y_o <= (p_hi - p_mid)*v_hi
+    (2) sum_o max(floor_o - p_lo, 0)*y_o  <= (p_hi - p_lo)*v_hi + (p_mid - p_lo)*v_mid
+
+The allocation is then an LP over order fills ``y`` and stream volumes ``v``:
+
+    max  sum_o price_o*y_o - sum_s cost_s*v_s
+    s.t. sum_o y_o = sum_s v_s,  (1), (2),  0 <= y_o <= qty_o,  0 <= v_s <= supply_s
+
+Both budgets are priced with Lagrange multipliers. For fixed prices the rest is
+a greedy match: orders ranked by their reduced value against streams ranked by
+their reduced cost. Budget (2) is priced by bisection on its slack. The two
+greedy solutions either side of the breakpoint are mixed so the budget balances
+exactly. Budget (1) usually has room. Only the scenarios where it binds get an
+outer bisection. Every step is a numpy operation over a ``(scenarios, orders)``
+array, so one call prices a whole sweep against thousands of order lines.
+
+Orders whose floor is above every stream's pungency are left unfilled.
+"""
+import csv
+
+import numpy as np
+
+import engine
+
+STREAMS = ("kachi_ghani", "expeller", "market")
+BISECTION_STEPS = 45
+TOL = 1e-9
+
+
+def load_order_book(path):
+    """Reads a CSV with grade, qty_mt, min_pungency and price columns into arrays."""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return {
+        "grade": np.array([r["grade"] for r in rows]),
+        "qty_mt": np.array([float(r["qty_mt"]) for r in rows]),
+        "min_pungency": np.array([float(r["min_pungency"]) for r in rows]),
+        "price": np.array([float(r["price"]) for r in rows]),
+    }
+
+
+def plant_streams(scenarios, market_oil_available_mt=np.inf):
+    """Daily oil streams and prices for each scenario, derived from the engine inputs."""
+    c, n = engine.to_columns(scenarios)
+    out = engine.calculate_batch(c)
+    ones = np.ones(n)
+    return {
+        "supply": np.stack([out["kachi_ghani_oil_produced_mt"], out["expeller_oil_produced_mt"],
+                            np.broadcast_to(market_oil_available_mt, (n,)).astype(np.float64)], axis=1),
+        "pungency": np.stack([c["kachi_ghani_pungency"], c["expeller_oil_pungency"], 0 * ones], axis=1),
+        # Own oil's cost is what it would fetch unallocated; market oil's is its purchase price.
+        "cost": np.stack([c["expeller_oil_sell_price"], c["expeller_oil_sell_price"],
+                          c["market_bought_oil_price"]], axis=1),
+        "baseline_oil_contribution": (out["daily_revenue_oil_blend"] + out["daily_revenue_expeller_separate"]
+                                      - out["market_oil_to_add_mt"] * c["market_bought_oil_price"]),
+    }
+
+
+def _greedy(lam, price, need, qty, supply, give, cost):
+    """Best allocation for fixed budget prices ``lam`` (B, 2); returns (y, v, budget slacks (B, 2))."""
+    value = price - (need * lam[:, None, :]).sum(axis=2)
+    rank = np.argsort(-value, axis=1)
+    value_sorted = np.take_along_axis(value, rank, axis=1)
+    qty_sorted = np.take_along_axis(qty, rank, axis=1)
+    eff_cost = cost - (give * lam[:, None, :]).sum(axis=2)                 # (B, 3)
+    # Supply that is worth selling to each order, given its (reduced) value.
+    available = (supply[:, None, :] * (eff_cost[:, None, :] <= value_sorted[:, :, None])).sum(axis=2)
+    before = np.cumsum(qty_sorted, axis=1) - qty_sorted
+    taken_sorted = np.clip(available - before, 0, qty_sorted)
+    y = np.empty_like(taken_sorted)
+    np.put_along_axis(y, rank, taken_sorted, axis=1)
+    total = y.sum(axis=1, keepdims=True)
+    s_rank = np.argsort(eff_cost, axis=1)
+    s_sorted = np.take_along_axis(supply, s_rank, axis=1)
+    s_before = np.cumsum(s_sorted, axis=1) - s_sorted
+    v = np.empty_like(supply)
+    np.put_along_axis(v, s_rank, np.clip(total - s_before, 0, s_sorted), axis=1)
+    slack = (give * v[:, :, None]).sum(axis=1) - (need * y[:, :, None]).sum(axis=1)
+    return y, v, slack
+
+
+def _bisect(solve, k, lam, scale):
+    """Prices budget ``k`` by bisection; ``solve(lam)`` returns (y, v, slack, lam)."""
+    lo, hi = lam.copy(), lam.copy()
+    lo[:, k], hi[:, k] = 0.0, scale
+    y0, v0, slack0, lam0 = solve(lo)
+    for _ in range(BISECTION_STEPS):
+        mid = (lo + hi) / 2
+        feasible = (solve(mid)[2][:, k] >= -TOL)[:, None]
+        hi, lo = np.where(feasible, mid, hi), np.where(feasible, lo, mid)
+    y_lo, v_lo, s_lo, _ = solve(lo)
+    y_hi, v_hi, s_hi, lam_hi = solve(hi)
+    # Mix the two sides of the breakpoint so the budget holds with equality.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        theta = np.where(s_lo[:, k] < -TOL, s_hi[:, k] / (s_hi[:, k] - s_lo[:, k]), 0.0)[:, None]
+    y, v = theta * y_lo + (1 - theta) * y_hi, theta * v_lo + (1 - theta) * v_hi
+    slack = theta * s_lo + (1 - theta) * s_hi
+    # Budget already slack at price 0: nothing to price.
+    free = slack0[:, k] >= -TOL
+    pick = lambda a, b: np.where(free.reshape((-1,) + (1,) * (a.ndim - 1)), a, b)
+    return pick(y0, y), pick(v0, v), pick(slack0, slack), pick(lam0, lam_hi)
+
+
+def _rows(arrays, mask):
+    return [a[mask] for a in arrays]
+
+
+def optimize_mix(order_book, streams):
+    """Allocates each scenario's oil to the order book.
+
+    ``order_book`` holds arrays ``qty_mt``, ``min_pungency`` and ``price`` (shape
+    ``(n_orders,)``, shared by all scenarios, or ``(B, n_orders)``); ``streams``
+    is the dict from ``plant_streams``. Returns per-order fills ``(B, n_orders)``,
+    per-stream volumes ``(B, 3)``, the shadow prices of the two lift budgets and the daily oil
+    contribution (order revenue + spot sales of unplaced own oil - market oil bought).
+    """
+    supply, pungency, cost = streams["supply"], streams["pungency"], streams["cost"]
+    b = supply.shape[0]
+    shape = (b, np.shape(order_book["qty_mt"])[-1])
+    price = np.broadcast_to(order_book["price"], shape).astype(np.float64)
+    floor = np.broadcast_to(order_book["min_pungency"], shape).astype(np.float64)
+    qty = np.broadcast_to(order_book["qty_mt"], shape).astype(np.float64)
+    strongest = np.where(supply > TOL, pungency, -np.inf).max(axis=1, keepdims=True)
+    qty = np.where(floor > strongest + 1e-12, 0.0, qty)
+    # An infinite market supply would break the cumulative sums; nothing can use more than the book.
+    supply = supply.copy()
+    supply[:, 2] = np.minimum(supply[:, 2], qty.sum(axis=1))
+
+    # Lift budgets (1) and (2) from the module docstring, per scenario.
+    by_pungency = np.sort(pungency, axis=1)
+    p_lo, p_mid = by_pungency[:, :1], by_pungency[:, 1:2]
+    need = np.stack([np.maximum(floor - p_mid, 0), np.maximum(floor - p_lo, 0)], axis=2)
+    give = np.stack([np.maximum(pungency - p_mid, 0), np.maximum(pungency - p_lo, 0)], axis=2)
+    scale = (price.max() + cost.max() + 1.0) / 1e-4
+
+    def solve(args, lam):
+        """Prices budget (2) for fixed budget-(1) prices in ``lam``."""
+        return _bisect(lambda l: (*_greedy(l, *args), l), 1, lam, scale)
+
+    args = (price, need, qty, supply, give, cost)
+    y, v, slack, lam = solve(args, np.zeros((b, 2)))
+    # Budget (1) only needs pricing where the solution with it unpriced overdraws it.
+    binding = slack[:, 0] < -TOL
+    if binding.any():
+        sub = _rows(args, binding)
+        y_b, v_b, _, lam_b = _bisect(lambda l: solve(sub, l), 0, np.zeros((int(binding.sum()), 2)), scale)
+        y[binding], v[binding], lam[binding] = y_b, v_b, lam_b
+
+    own = slice(0, 2)
+    contribution = ((price * y).sum(axis=1) - (cost * v).sum(axis=1)
+                    + (cost[:, own] * supply[:, own]).sum(axis=1))
+    filled = y.sum(axis=1)
+    return {
+        "fill_mt": y, "stream_mt": v, "lift_shadow_prices": lam,
+        "filled_mt": filled, "fill_rate": filled / np.maximum(qty.sum(axis=1), 1e-12),
+        "blend_pungency": np.where(filled > 0, (pungency * v).sum(axis=1) / np.maximum(filled, 1e-12), 0.0),
+        "contribution": contribution,
+        "uplift_vs_single_blend": contribution - streams.get("baseline_oil_contribution", contribution),
+    }
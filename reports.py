@@ -0,0 +1,275 @@
+"""Batch HTML reports for scenario packs, without Streamlit.
+
+Each scenario gets a self-contained HTML page: the dashboard's Daily / Monthly /
+Annual P&L tables, ROCE, the working-capital breakdown and two inline SVG
+charts. There are no scripts or external assets, so a page can be mailed or
+archived as a single file. ``index.html`` rolls every scenario up into one
+table linking to its page.
+
+All scenarios are evaluated in one ``engine.calculate_batch`` call. Rendering
+is spread over a process pool. Templates are ``string.Template`` objects
+compiled once per worker in the pool initializer, and each worker renders its
+share of pages in chunks.
+
+    python reports.py scenarios.csv reports/ --workers 8
+
+The scenario file is CSV or JSONL with any engine inputs as columns, plus an
+optional ``name`` column. Missing inputs use the dashboard defaults.
+"""
+import argparse
+import csv
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+
+import audit
+import engine
+from formatting import format_indian
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>$title</title>
+<style>
+body{font-family:-apple-system,Segoe UI,Roboto,sans-serif;margin:2rem auto;max-width:1100px;color:#262730}
+h1{font-size:1.6rem}h2{font-size:1.2rem;margin-top:2rem;border-bottom:1px solid #ddd;padding-bottom:.3rem}
+table{border-collapse:collapse;width:100%;font-size:.9rem}th,td{padding:.35rem .6rem;border-bottom:1px solid #eee;text-align:right}
+th:first-child,td:first-child{text-align:left}.neg{color:#ff4b4b}.cards{display:flex;gap:1rem;flex-wrap:wrap}
+.card{border:1px solid #eee;border-radius:.5rem;padding:.8rem 1rem;min-width:10rem}.card b{display:block;font-size:1.3rem}
+.note{padding:.6rem 1rem;border-radius:.4rem;background:#f0f2f6}
+</style></head><body>
+<h1>🛢️ $title</h1>
+<p class="note">$pungency</p>
+<h2>Financial &amp; Operational Analysis</h2>
+$pnl
+<h2>Return on Capital Employed (ROCE)</h2>
+<div class="cards">$roce</div>
+<h2>Working Capital &amp; Capex Breakdown</h2>
+$wc
+$wc_chart
+<h2>Where Annual Revenue Goes</h2>
+$cost_chart
+<p><a href="index.html">← All scenarios</a></p>
+</body></html>
+"""
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Scenario Reports</title>
+<style>
+body{font-family:-apple-system,Segoe UI,Roboto,sans-serif;margin:2rem;color:#262730}
+table{border-collapse:collapse;font-size:.9rem}th,td{padding:.35rem .7rem;border-bottom:1px solid #eee;text-align:right}
+th:first-child,td:first-child{text-align:left}.neg{color:#ff4b4b}
+</style></head><body>
+<h1>Scenario Reports</h1>
+<p>$count scenarios · generated $generated</p>
+<table><tr>$header</tr>
+$rows
+</table></body></html>
+"""
+
+# (label, output key, unit) rows of the P&L table; None keys are computed per period.
+PNL_ROWS = (
+    ("Total Seed Input", "seed_input_mt", "MT"),
+    ("Oil Blend", "final_oil_blend_mt", "MT"),
+    ("Enhanced MoC", "enhanced_moc_mt", "MT"),
+    ("Total Revenue", "daily_total_revenue", "₹"),
+    ("Gross Margin (GM)", "daily_gm", "₹"),
+    ("Processing Cost", "daily_processing_cost", "₹"),
+    ("Contribution Margin (CM)", "daily_cm", "₹"),
+    ("Other Variable Costs", "daily_variable_cost", "₹"),
+    ("Other Fixed Expenses", "daily_other_expenses", "₹"),
+    ("EBITDA", "daily_ebitda", "₹"),
+    ("Depreciation", None, "₹"),
+    ("Interest", None, "₹"),
+    ("Profit Before Tax (PBT)", None, "₹"),
+    ("Profit After Tax (PAT)", None, "₹"),
+)
+INDEX_COLUMNS = (
+    ("Daily Revenue (₹)", "daily_total_revenue"), ("Daily EBITDA (₹)", "daily_ebitda"),
+    ("Annual PAT (₹)", "annual_pat"), ("Net WC (₹)", "net_wc_requirement"),
+    ("ROCE PAT (%)", "roce_pat"), ("ROCE incl. Synergy (%)", "roce_pat_with_synergy"),
+    ("Combined ROCE PAT (%)", "combined_roce_pat"),
+)
+
+_templates = {}
+
+
+def _init_worker(page_template=PAGE_TEMPLATE):
+    """Compiles the page template once per process."""
+    _templates["page"] = Template(page_template)
+
+
+def _money(value, unit="₹"):
+    text = f"₹ {format_indian(value)}" if unit == "₹" else f"{format_indian(value)} {unit}".rstrip()
+    return f'<span class="neg">{text}</span>' if value < 0 else text
+
+
+def _svg_bars(items, width=640, bar=22, gap=8):
+    """Horizontal bar chart (label, value) as inline SVG; negative bars are red."""
+    if not items:
+        return ""
+    label_w, value_w = 190, 150
+    scale = (width - label_w - value_w) / max(max(abs(v) for _, v in items), 1e-9)
+    height = len(items) * (bar + gap) + gap
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-size="12">']
+    for i, (label, value) in enumerate(items):
+        y = gap + i * (bar + gap)
+        colour = "#ff4b4b" if value < 0 else "#0068c9"
+        parts.append(f'<text x="0" y="{y + bar * 0.7}">{html.escape(label)}</text>'
+                     f'<rect x="{label_w}" y="{y}" width="{abs(value) * scale:.1f}" height="{bar}" fill="{colour}"/>'
+                     f'<text x="{label_w + abs(value) * scale + 6:.1f}" y="{y + bar * 0.7}">₹ {format_indian(value)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _pnl_table(m):
+    periods = (("Daily", 1), ("Monthly", m["production_days_per_month"]), ("Annual", m["annual_production_days"]))
+    days = m["annual_production_days"]
+    daily_dep = m["annual_depreciation"] / days if days > 0 else 0
+    daily_int = m["annual_interest"] / days if days > 0 else 0
+    revenue = m["daily_total_revenue"]
+    rows = ["<table><tr><th></th>" + "".join(f"<th>{p}</th>" for p, _ in periods) + "<th>% of Revenue</th></tr>"]
+    for label, key, unit in PNL_ROWS:
+        cells = []
+        for _, mult in periods:
+            if key is not None:
+                value = m[key] * mult
+            else:
+                # Same per-period PBT/PAT as display_pnl: tax applied to the period's PBT.
+                dep, intr = daily_dep * mult, daily_int * mult
+                pbt = m["daily_ebitda"] * mult - dep - intr
+                value = {"Depreciation": dep, "Interest": intr, "Profit Before Tax (PBT)": pbt,
+                         "Profit After Tax (PAT)": pbt - max(0, pbt * m["tax_rate_pct"] / 100)}[label]
+            cells.append(value)
+        share = f"{cells[0] / revenue * 100:.1f}%" if unit == "₹" and revenue else ""
+        rows.append(f"<tr><td>{label}</td>" + "".join(f"<td>{_money(v, unit)}</td>" for v in cells)
+                    + f"<td>{share}</td></tr>")
+    return "".join(rows) + "</table>"
+
+
+def _pungency_note(m):
+    p = m["initial_blend_pungency"]
+    if m["pungency_status"] == engine.PUNGENCY_LOW and m["exp_oil_sold_separately_mt"] == 0:
+        return f"🔴 Pungency Low ({p:.2f}%): Kachi Ghani oil is itself below spec; no expeller diversion can correct it."
+    if m["pungency_status"] == engine.PUNGENCY_LOW:
+        return f"🔴 Pungency Low ({p:.2f}%): sell {m['exp_oil_sold_separately_mt']:.2f} MT of Expeller Oil separately."
+    if m["pungency_status"] == engine.PUNGENCY_HIGH:
+        return f"🟢 Pungency High ({p:.2f}%): add {m['market_oil_to_add_mt']:.2f} MT of Market Oil."
+    return f"✅ Pungency Compliant ({p:.2f}%): no action needed."
+
+
+def render_page(name, m):
+    """Renders one scenario's metrics (a dict from engine.split_rows) to HTML."""
+    if "page" not in _templates:
+        _init_worker()
+    cards = (("ROCE (PAT Basis)", "roce_pat"), ("ROCE (EBITDA Basis)", "roce_ebitda"),
+             ("ROCE incl. Synergy (PAT)", "roce_pat_with_synergy"), ("Crushing + Solvex ROCE (PAT)", "combined_roce_pat"))
+    wc_items = (("Total Inventory", m["total_inventory"]), ("Total Debtors", m["total_debtors"]),
+                ("Trade Creditors", -m["trade_creditors"]), ("Financed RM Hoard", -m["financed_rm_hoard_value"]),
+                ("Net WC Requirement", m["net_wc_requirement"]), ("Capex", m["capex"]))
+    days = m["annual_production_days"]
+    costs = (("Seed, Market Oil & MoC Inputs", m["daily_cogs"] * days),
+             ("Processing", m["daily_processing_cost"] * days),
+             ("Other Variable Costs", m["daily_variable_cost"] * days),
+             ("Other Fixed Expenses", m["daily_other_expenses"] * days),
+             ("Depreciation", m["annual_depreciation"]), ("Interest", m["annual_interest"]),
+             ("Tax", m["annual_tax"]), ("PAT", m["annual_pat"]))
+    return _templates["page"].substitute(
+        title=html.escape(name), pungency=_pungency_note(m), pnl=_pnl_table(m),
+        roce="".join(f'<div class="card">{label}<b>{m[key]:.2f}%</b></div>' for label, key in cards),
+        wc="<table>" + "".join(f"<tr><td>{label}</td><td>{_money(v)}</td></tr>" for label, v in wc_items) + "</table>",
+        wc_chart=_svg_bars(wc_items[:5]), cost_chart=_svg_bars(costs))
+
+
+def _render_chunk(job):
+    out_dir, pages = job
+    for filename, name, metrics in pages:
+        with open(os.path.join(out_dir, filename), "w", encoding="utf-8") as f:
+            f.write(render_page(name, metrics))
+    return len(pages)
+
+
+def _filename(i, name):
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in name)[:60]
+    return f"{i:05d}_{safe}.html"
+
+
+def render_index(names, filenames, rows):
+    cells = []
+    for name, filename, m in zip(names, filenames, rows):
+        values = "".join(
+            f"<td>{m[key]:.2f}</td>" if "roce" in key else f"<td>{_money(m[key], '')}</td>"
+            for _, key in INDEX_COLUMNS)
+        cells.append(f'<tr><td><a href="{filename}">{html.escape(name)}</a></td>{values}</tr>')
+    return Template(INDEX_TEMPLATE).substitute(
+        count=len(rows), generated=time.strftime("%Y-%m-%d %H:%M"), rows="\n".join(cells),
+        header="<th>Scenario</th>" + "".join(f"<th>{label}</th>" for label, _ in INDEX_COLUMNS))
+
+
+def generate_reports(scenarios, out_dir, names=None, workers=None, chunk_size=25, page_template=PAGE_TEMPLATE,
+                     audit_rate=0.02):
+    """Writes one HTML page per scenario plus ``index.html`` into ``out_dir``.
+
+    ``scenarios`` is a list of input dicts or a dict of arrays. ``workers=0``
+    renders in-process. A random ``audit_rate`` share of scenarios is rechecked
+    in Decimal and the result written to ``audit.json``. Returns the index path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    outputs = engine.calculate_batch(scenarios)
+    engine_seconds = time.perf_counter() - start
+    if audit_rate > 0:
+        auditor = audit.AuditSampler(rate=audit_rate, max_per_batch=1000)
+        auditor.check(scenarios, outputs, engine_seconds)
+        with open(os.path.join(out_dir, "audit.json"), "w", encoding="utf-8") as f:
+            json.dump({**auditor.summary(), "examples": list(auditor.examples)}, f, indent=2)
+    rows = engine.split_rows(outputs)
+    names = list(names) if names is not None else [f"Scenario {i + 1}" for i in range(len(rows))]
+    filenames = [_filename(i, name) for i, name in enumerate(names)]
+    pages = list(zip(filenames, names, rows))
+    jobs = [(out_dir, pages[i:i + chunk_size]) for i in range(0, len(pages), chunk_size)]
+    if workers == 0:
+        _init_worker(page_template)
+        for job in jobs:
+            _render_chunk(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(page_template,)) as pool:
+            list(pool.map(_render_chunk, jobs))
+    index_path = os.path.join(out_dir, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(render_index(names, filenames, rows))
+    return index_path
+
+
+def read_scenarios(path):
+    """Reads scenario rows from CSV or JSONL; returns (names, list of input dicts)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f)) if path.endswith(".csv") else [json.loads(line) for line in f if line.strip()]
+    names = [str(row.get("name") or f"Scenario {i + 1}") for i, row in enumerate(rows)]
+    scenarios = [{k: float(v) for k, v in row.items() if k in engine.DEFAULT_INPUTS and v not in ("", None)}
+                 for row in rows]
+    return names, scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render HTML P&L / WC / ROCE reports for a file of scenarios.")
+    parser.add_argument("scenarios", help="CSV or JSONL file of scenario inputs (optional 'name' column)")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 renders in-process)")
+    parser.add_argument("--template", help="custom page template using the same $placeholders")
+    parser.add_argument("--audit-rate", type=float, default=0.02, help="share of scenarios rechecked in Decimal (0 disables)")
+    args = parser.parse_args()
+    page_template = PAGE_TEMPLATE
+    if args.template:
+        with open(args.template, encoding="utf-8") as f:
+            page_template = f.read()
+    names, scenarios = read_scenarios(args.scenarios)
+    start = time.perf_counter()
+    index = generate_reports(scenarios, args.out_dir, names, args.workers, page_template=page_template,
+                             audit_rate=args.audit_rate)
+    print(f"{len(scenarios):,} reports in {time.perf_counter() - start:.2f} s -> {index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Columnar storage for scenario inputs and engine outputs.
+
+A ``ScenarioTable`` keeps every column as one contiguous row of a single 2-D
+``(n_columns, n_rows)`` array, so a million scenarios cost ``8 bytes`` (or 4 in
+float32 mode) per value instead of a Python dict per scenario. Slicing rows
+returns views, ``to_pandas`` wraps the same buffer, and ``save``/``open`` use
+``.npy`` memory maps so a 10M-scenario run reopens instantly without recomputing.
+
+On disk a table is a directory holding ``data.npy`` and ``meta.json``.
+"""
+import json
+import os
+
+import numpy as np
+
+import engine
+
+META_FILE, DATA_FILE = "meta.json", "data.npy"
+DTYPES = {"float64": np.float64, "float32": np.float32}
+
+
+class ScenarioTable:
+    """Typed, column-contiguous table of scenarios. Rows slice as zero-copy views."""
+
+    def __init__(self, data, columns):
+        if data.ndim != 2 or data.shape[0] != len(columns):
+            raise ValueError(f"data shape {data.shape} does not match {len(columns)} columns")
+        self._data = data
+        self.columns = tuple(columns)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+    @classmethod
+    def from_columns(cls, columns, dtype="float64"):
+        """Builds a table from a dict of equal-length arrays (scalars are broadcast)."""
+        n = max(np.size(v) for v in columns.values())
+        data = np.empty((len(columns), n), dtype=DTYPES[dtype])
+        for i, values in enumerate(columns.values()):
+            data[i] = values
+        return cls(data, columns.keys())
+
+    @classmethod
+    def from_batch(cls, inputs, outputs, input_keys=None, output_keys=None, dtype="float64"):
+        """Combines the inputs given to ``engine.calculate_batch`` with the outputs it returned."""
+        in_cols, _ = engine.to_columns(inputs)
+        input_keys = input_keys or engine.INPUT_KEYS
+        output_keys = output_keys or engine.OUTPUT_KEYS
+        columns = {k: in_cols[k] for k in input_keys}
+        columns.update({k: outputs[k] for k in output_keys if k not in columns})
+        return cls.from_columns(columns, dtype)
+
+    def __len__(self):
+        return self._data.shape[1]
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def __getitem__(self, key):
+        """``table["annual_pat"]`` returns a column view; ``table[a:b]`` a row-sliced table view."""
+        if isinstance(key, str):
+            return self._data[self._index[key]]
+        if isinstance(key, slice):
+            return ScenarioTable(self._data[:, key], self.columns)
+        raise TypeError("index with a column name or a row slice")
+
+    def select(self, names):
+        """Table restricted to ``names`` (a copy, since the rows are no longer adjacent)."""
+        return ScenarioTable(self._data[[self._index[n] for n in names]], names)
+
+    def to_dict(self):
+        return {name: self._data[i] for i, name in enumerate(self.columns)}
+
+    def to_pandas(self):
+        """DataFrame over the same buffer; pandas keeps a single 2-D block so nothing is copied."""
+        import pandas as pd
+        return pd.DataFrame(self._data.T, columns=list(self.columns), copy=False)
+
+    def to_arrow(self):
+        """pyarrow Table whose numeric columns wrap the table's buffers (pyarrow is optional)."""
+        try:
+            import pyarrow as pa
+        except ImportError as exc:
+            raise ImportError("to_arrow needs pyarrow: pip install pyarrow") from exc
+        # Arrow wants each column contiguous, which our rows already are.
+        return pa.table({name: pa.array(self._data[i]) for i, name in enumerate(self.columns)})
+
+    def save(self, path, overwrite=False):
+        writer = ScenarioTableWriter(path, self.columns, len(self), self.dtype.name, overwrite)
+        writer.write(self.to_dict())
+        writer.close()
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        """Opens a saved table; with ``mmap`` only the pages actually touched are read."""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(path, DATA_FILE), mmap_mode="r" if mmap else None)
+        return cls(data[:, :meta["rows"]], meta["columns"])
+
+
+class ScenarioTableWriter:
+    """Streams chunks into a pre-sized on-disk table so huge runs never sit in RAM.
+
+    ``capacity`` is the maximum number of rows; only the rows actually written are
+    recorded in ``meta.json`` and exposed by ``ScenarioTable.open``. The metadata
+    is written up front and refreshed after every chunk, so the rows written
+    before a crash can still be opened. A folder that already holds a table is
+    refused (FileExistsError) unless ``overwrite`` is set.
+    """
+
+    def __init__(self, path, columns, capacity, dtype="float64", overwrite=False):
+        existing = [name for name in (META_FILE, DATA_FILE) if os.path.exists(os.path.join(path, name))]
+        if existing and not overwrite:
+            raise FileExistsError(f"{path} already holds a saved run ({', '.join(existing)})")
+        os.makedirs(path, exist_ok=True)
+        self.path, self.columns, self.rows = path, tuple(columns), 0
+        self._data = np.lib.format.open_memmap(
+            os.path.join(path, DATA_FILE), mode="w+", dtype=DTYPES[dtype], shape=(len(self.columns), capacity))
+        self._write_meta()
+
+    def write(self, chunk):
+        """Appends a dict of arrays holding at least every table column."""
+        n = max(np.size(chunk[c]) for c in self.columns)
+        if self.rows + n > self._data.shape[1]:
+            raise ValueError(f"writing {n} rows would exceed capacity {self._data.shape[1]}")
+        for i, name in enumerate(self.columns):
+            self._data[i, self.rows:self.rows + n] = chunk[name]
+        self.rows += n
+        self.flush()
+
+    def _write_meta(self):
+        tmp = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"columns": list(self.columns), "rows": self.rows, "dtype": self._data.dtype.name}, f)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+    def flush(self):
+        """Writes the data to disk, then records the row count (so it never covers unwritten rows)."""
+        self._data.flush()
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+        del self._data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
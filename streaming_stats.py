@@ -0,0 +1,295 @@
+"""Bounded-memory streaming aggregation of engine output.
+
+Monte Carlo and sweep runs can produce far more rows than pandas can hold, so
+instead of keeping outputs we fold each chunk into per-metric summaries:
+
+* ``QuantileSketch``  - log-bucketed sketch (DDSketch style) with a relative
+  accuracy guarantee on every quantile; merging two sketches gives exactly the
+  sketch of the combined stream.
+* ``Histogram``       - fixed-edge counts with under/overflow.
+* ``Moments``         - count, mean, variance, min and max (Chan et al. merge).
+* exceedance counters such as P(PBT < 0) and P(ROCE < 12%).
+
+Every piece has ``update(values)`` and ``merge(other)`` and is plain picklable
+state, so worker processes can aggregate their shard and ship it back.
+"""
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+
+DEFAULT_METRICS = ("daily_ebitda", "annual_pbt", "annual_pat", "net_wc_requirement", "roce_pat")
+DEFAULT_EXCEEDANCES = {"annual_pbt": (("lt", 0.0),), "roce_pat": (("lt", 12.0),)}
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error ``alpha`` on every quantile.
+
+    Values are mapped to bucket ``ceil(log_gamma(|x|))`` with ``gamma = (1+a)/(1-a)``,
+    kept in separate dense stores for positive and negative values. Anything with
+    ``|x| < min_value`` lands in a zero bucket. Memory depends only on the dynamic
+    range of the data, never on the number of values seen.
+    """
+
+    def __init__(self, alpha=0.005, min_value=1e-9):
+        self.alpha, self.min_value = alpha, min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        self._stores = {1: [0, np.zeros(0, dtype=np.int64)], -1: [0, np.zeros(0, dtype=np.int64)]}
+
+    @property
+    def count(self):
+        return self.zero_count + sum(int(counts.sum()) for _, counts in self._stores.values())
+
+    def _add_to_store(self, sign, keys, counts):
+        offset, store = self._stores[sign]
+        if keys.size == 0:
+            return
+        lo, hi = int(keys.min()), int(keys.max())
+        if store.size == 0:
+            offset, store = lo, np.zeros(hi - lo + 1, dtype=np.int64)
+        elif lo < offset or hi >= offset + store.size:
+            new_lo, new_hi = min(lo, offset), max(hi, offset + store.size - 1)
+            grown = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+            grown[offset - new_lo:offset - new_lo + store.size] = store
+            offset, store = new_lo, grown
+        np.add.at(store, keys - offset, counts)
+        self._stores[sign] = [offset, store]
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        small = np.abs(values) < self.min_value
+        self.zero_count += int(small.sum())
+        for sign, mask in ((1, (values > 0) & ~small), (-1, (values < 0) & ~small)):
+            if mask.any():
+                keys = np.ceil(np.log(np.abs(values[mask])) / self._log_gamma).astype(np.int64)
+                uniq, counts = np.unique(keys, return_counts=True)
+                self._add_to_store(sign, uniq, counts)
+
+    def merge(self, other):
+        if other.alpha != self.alpha or other.min_value != self.min_value:
+            raise ValueError("can only merge sketches built with the same alpha and min_value")
+        self.zero_count += other.zero_count
+        for sign in (1, -1):
+            offset, store = other._stores[sign]
+            nonzero = np.flatnonzero(store)
+            self._add_to_store(sign, nonzero + offset, store[nonzero])
+        return self
+
+    def _bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs):
+        """Returns the estimated value at each quantile in ``qs`` (NaN when empty)."""
+        total = self.count
+        if total == 0:
+            return np.full(len(qs), np.nan)
+        neg_offset, neg = self._stores[-1]
+        pos_offset, pos = self._stores[1]
+        # Walk buckets in ascending value order: negatives (largest |x| first), zero, positives.
+        values = np.concatenate([
+            -self._bucket_value(np.arange(neg.size)[::-1] + neg_offset), [0.0],
+            self._bucket_value(np.arange(pos.size) + pos_offset)])
+        cumulative = np.cumsum(np.concatenate([neg[::-1], [self.zero_count], pos]))
+        ranks = np.asarray(qs, dtype=np.float64) * (total - 1)
+        return values[np.searchsorted(cumulative, ranks, side="right")]
+
+
+class Histogram:
+    """Fixed-edge histogram; two histograms merge exactly when their edges match."""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(self.edges.size - 1, dtype=np.int64)
+        self.underflow = self.overflow = 0
+
+    @classmethod
+    def around(cls, centre, spread, bins=60):
+        half = max(abs(spread), abs(centre) * 0.05, 1.0)
+        return cls(np.linspace(centre - half, centre + half, bins + 1))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.underflow += int((values < self.edges[0]).sum())
+        self.overflow += int((values > self.edges[-1]).sum())
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("histogram edges differ")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+
+class Moments:
+    """Running count, mean, M2, min and max with a parallel-safe merge."""
+
+    def __init__(self):
+        self.count, self.mean, self.m2 = 0, 0.0, 0.0
+        self.min, self.max = math.inf, -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        other = Moments()
+        other.count, other.mean = values.size, float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min, other.max = float(values.min()), float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class MetricAggregator:
+    """Sketch, histogram, moments and exceedance counts for one output metric."""
+
+    def __init__(self, name, thresholds=(), alpha=0.005, edges=None):
+        self.name = name
+        self.sketch = QuantileSketch(alpha)
+        self.moments = Moments()
+        self.histogram = Histogram(edges) if edges is not None else None
+        self.thresholds = tuple(thresholds)
+        self.exceed_counts = [0] * len(self.thresholds)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.histogram is None and values.size:
+            # Fix the edges from the first chunk so every later chunk (and shard) shares them.
+            self.histogram = Histogram.around(float(np.median(values)), 4 * float(values.std()))
+        self.sketch.update(values)
+        self.moments.update(values)
+        if self.histogram is not None:
+            self.histogram.update(values)
+        for i, (op, limit) in enumerate(self.thresholds):
+            self.exceed_counts[i] += int((values < limit).sum() if op == "lt" else (values > limit).sum())
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self.moments.merge(other.moments)
+        if self.histogram is None:
+            self.histogram = other.histogram
+        elif other.histogram is not None:
+            self.histogram.merge(other.histogram)
+        self.exceed_counts = [a + b for a, b in zip(self.exceed_counts, other.exceed_counts)]
+        return self
+
+    def exceedance_probabilities(self):
+        n = self.moments.count
+        return {f"P({self.name} {'<' if op == 'lt' else '>'} {limit:g})": (count / n if n else float("nan"))
+                for (op, limit), count in zip(self.thresholds, self.exceed_counts)}
+
+
+class StreamingAggregator:
+    """Folds chunks of engine output into one MetricAggregator per metric."""
+
+    def __init__(self, metrics=DEFAULT_METRICS, exceedances=DEFAULT_EXCEEDANCES, alpha=0.005, edges=None):
+        edges = edges or {}
+        self.metrics = {name: MetricAggregator(name, exceedances.get(name, ()), alpha, edges.get(name))
+                        for name in metrics}
+
+    @property
+    def count(self):
+        return next(iter(self.metrics.values())).moments.count if self.metrics else 0
+
+    def update(self, outputs):
+        """Adds a chunk; ``outputs`` is the dict returned by ``engine.calculate_batch``."""
+        for name, agg in self.metrics.items():
+            agg.update(outputs[name])
+
+    def merge(self, other):
+        for name, agg in self.metrics.items():
+            agg.merge(other.metrics[name])
+        return self
+
+    def summary(self, qs=DEFAULT_QUANTILES):
+        """One row per metric with mean, std, min/max, the requested percentiles and exceedances."""
+        rows = {}
+        for name, agg in self.metrics.items():
+            m = agg.moments
+            row = {"count": m.count, "mean": m.mean, "std": math.sqrt(m.variance), "min": m.min, "max": m.max}
+            row.update({f"p{q * 100:g}": v for q, v in zip(qs, agg.sketch.quantiles(qs))})
+            row.update(agg.exceedance_probabilities())
+            rows[name] = row
+        return rows
+
+
+# --- Monte Carlo driver ---
+# Relative (±) uniform spread applied to each perturbed input around the base scenario.
+DEFAULT_SPREADS = {
+    "seed_purchase_price": 0.10, "oil_blend_sell_price": 0.08, "moc_sell_price": 0.10,
+    "expeller_oil_sell_price": 0.08, "market_bought_oil_price": 0.08,
+    "kachi_ghani_yield_pct": 0.05, "expeller_yield_pct": 0.05,
+    "kachi_ghani_pungency": 0.10, "expeller_oil_pungency": 0.10,
+}
+
+
+def monte_carlo_chunks(base, n, chunk_size=250_000, spreads=None, seed=0, audit=None):
+    """Yields engine output dicts for ``n`` randomly perturbed copies of ``base``, one chunk at a time.
+
+    Each dict also carries the perturbed input columns so a chunk can be stored as-is.
+    ``audit`` is an optional ``audit.AuditSampler`` that checks a sample of each chunk.
+    """
+    spreads = DEFAULT_SPREADS if spreads is None else spreads
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, chunk_size):
+        size = min(chunk_size, n - start)
+        columns = {k: v for k, v in base.items() if k in engine.DEFAULT_INPUTS}
+        for key, spread in spreads.items():
+            centre = base.get(key, engine.DEFAULT_INPUTS[key])
+            columns[key] = centre * rng.uniform(1 - spread, 1 + spread, size)
+        engine_start = time.perf_counter()
+        outputs = engine.calculate_batch(columns)
+        if audit is not None:
+            audit.check(columns, outputs, time.perf_counter() - engine_start)
+        yield {**{k: columns[k] for k in spreads}, **outputs}
+
+
+def _aggregate_shard(args):
+    base, n, chunk_size, spreads, seed, agg_kwargs = args
+    agg = StreamingAggregator(**agg_kwargs)
+    for outputs in monte_carlo_chunks(base, n, chunk_size, spreads, seed):
+        agg.update(outputs)
+    return agg
+
+
+def run_parallel(base, n, processes=4, chunk_size=250_000, spreads=None, seed=0, edges=None, **agg_kwargs):
+    """Splits a Monte Carlo run across worker processes and merges their partial aggregates.
+
+    Histogram edges must be shared for the merge to be exact, so when ``edges`` is
+    not given they are fixed from a small pilot sample first.
+    """
+    if edges is None:
+        pilot = next(monte_carlo_chunks(base, min(n, 10_000), spreads=spreads, seed=seed + 10_007))
+        metrics = agg_kwargs.get("metrics", DEFAULT_METRICS)
+        edges = {m: Histogram.around(float(np.median(pilot[m])), 4 * float(pilot[m].std())).edges for m in metrics}
+    agg_kwargs["edges"] = edges
+    shard_sizes = [n // processes + (i < n % processes) for i in range(processes)]
+    jobs = [(base, size, chunk_size, spreads, seed + i, agg_kwargs) for i, size in enumerate(shard_sizes) if size]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        partials = list(pool.map(_aggregate_shard, jobs))
+    total = partials[0]
+    for part in partials[1:]:
+        total.merge(part)
+    return total
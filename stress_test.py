@@ -0,0 +1,237 @@
+"""Lender stress packs: composable input shocks evaluated as one scenario tree.
+
+A ``Shock`` is a named list of transforms on the dashboard inputs, e.g.
+"seed +10%" multiplies ``seed_purchase_price`` by 1.1. Shocks compose with
+``+``, so "seed +10%, oil -5%" is
+``pct("seed +10%", ("seed_purchase_price",), 10) + pct("oil -5%", OIL_PRICES, -5)``.
+
+``STRESS_FACTORS`` groups shocks into factors with a few severities each; the
+first level of every factor is "no shock". ``expand`` takes the cartesian
+product of all levels - every combination of one severity per factor, a few
+thousand nodes for the default pack - and applies each node's shocks to the
+base scenario column-wise. ``run_stress`` evaluates the whole tree in one
+``engine.calculate_batch`` call and ranks the worst nodes for:
+
+* annual PAT (lowest first);
+* DSCR-style coverage, ``(EBITDA - tax) / (interest + term-loan principal)``,
+  with capex repaid evenly over ``loan_tenor_years`` (lowest first). Cover is
+  floored at 0, and nodes without cash to service debt are ranked by the size
+  of the shortfall;
+* net WC requirement (highest first).
+
+Actual balances given for FG stock, debtors or creditors (``engine.WC_OVERRIDES``,
+e.g. from the FG ledger) would otherwise hide the day and price shocks. Each
+node scales them by how much its shocks move the day-cycle estimate of that
+balance, so "debtor days x2" doubles the ledger debtors.
+
+    python stress_test.py                      # dashboard defaults
+    python stress_test.py scenario.json --top 15 --tenor 7
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import engine
+
+OPERATIONS = {"mul": np.multiply, "add": np.add, "set": lambda col, value: np.broadcast_to(value, col.shape)}
+
+
+class Shock:
+    """A named set of input transforms; shocks compose with ``+``."""
+
+    def __init__(self, label, *steps):
+        for key, op, _ in steps:
+            if key not in engine.DEFAULT_INPUTS:
+                raise KeyError(f"unknown input {key!r}")
+            if op not in OPERATIONS:
+                raise ValueError(f"op must be one of {tuple(OPERATIONS)}")
+        self.label, self.steps = label, steps
+
+    def __add__(self, other):
+        if not self.steps:
+            return other
+        if not other.steps:
+            return self
+        return Shock(f"{self.label}, {other.label}", *self.steps, *other.steps)
+
+    def __repr__(self):
+        return f"Shock({self.label!r})"
+
+    def apply(self, columns, rows=slice(None)):
+        """Applies the transforms in place to ``rows`` of ``columns`` (float arrays); inputs stay >= 0."""
+        for key, op, value in self.steps:
+            columns[key][rows] = np.maximum(0, OPERATIONS[op](columns[key][rows], value))
+        return columns
+
+
+NO_SHOCK = Shock("none")
+
+
+def pct(label, keys, change_pct):
+    return Shock(label, *((k, "mul", 1 + change_pct / 100) for k in keys))
+
+
+def points(label, keys, change):
+    return Shock(label, *((k, "add", change) for k in keys))
+
+
+def times(label, keys, factor):
+    return Shock(label, *((k, "mul", factor) for k in keys))
+
+
+OIL_PRICES = ("oil_blend_sell_price", "expeller_oil_sell_price")
+YIELDS = ("kachi_ghani_yield_pct", "expeller_yield_pct")
+DEBTOR_DAYS = ("oil_debtor_days", "moc_debtor_days")
+RATES = ("warehouse_finance_rate_pa", "main_financing_rate_pa")
+
+# factor -> severities; the first level of each factor is NO_SHOCK.
+STRESS_FACTORS = {
+    "seed price": [NO_SHOCK] + [pct(f"seed +{p}%", ("seed_purchase_price",), p) for p in (5, 10, 15)],
+    "oil price": [NO_SHOCK] + [pct(f"oil -{p}%", OIL_PRICES, -p) for p in (5, 10)],
+    "MoC price": [NO_SHOCK] + [pct(f"MoC -{p}%", ("moc_sell_price",), -p) for p in (10, 20)],
+    "yields": [NO_SHOCK] + [points(f"yields -{p}pt", YIELDS, -p) for p in (1, 2)],
+    "debtor days": [NO_SHOCK] + [times(f"debtor days x{f:g}", DEBTOR_DAYS, f) for f in (1.5, 2)],
+    "interest": [NO_SHOCK] + [points(f"interest +{bp}bp", RATES, bp / 100) for bp in (150, 300)],
+    "production days": [NO_SHOCK] + [points(f"{d} production days/month", ("production_days_per_month",), d)
+                                     for d in (-2, -4)],
+    "creditor days": [NO_SHOCK, times("no supplier credit", ("creditor_days",), 0)],
+}
+
+# Named combinations lenders ask for by name; each is also a node of the default tree.
+STANDARD_PACK = {
+    "Seed +10%, oil -5%": STRESS_FACTORS["seed price"][2] + STRESS_FACTORS["oil price"][1],
+    "Yields -1pt": STRESS_FACTORS["yields"][1],
+    "Debtor days x2": STRESS_FACTORS["debtor days"][2],
+    "Interest +300bp": STRESS_FACTORS["interest"][2],
+    "All of the above": (STRESS_FACTORS["seed price"][2] + STRESS_FACTORS["oil price"][1]
+                         + STRESS_FACTORS["yields"][1] + STRESS_FACTORS["debtor days"][2]
+                         + STRESS_FACTORS["interest"][2]),
+}
+
+
+def anchor_balances(columns, base_columns):
+    """Scales given WC balances in ``columns`` by shocked / base day-cycle estimate of each balance."""
+    given = [k for k in engine.WC_OVERRIDES if not np.isnan(base_columns[k][0])]
+    if not given:
+        return columns
+    n = len(columns[given[0]])
+    unset = {k: np.full(n, np.nan) for k in given}
+    shocked = engine.calculate_batch({**columns, **unset})
+    base = engine.calculate_batch({**{k: v[:1] for k, v in base_columns.items()}, **{k: v[:1] for k, v in unset.items()}})
+    for key in given:
+        output = engine.WC_OVERRIDES[key]
+        ratio = np.divide(shocked[output], base[output][0], out=np.ones(n), where=base[output][0] != 0)
+        columns[key] = columns[key] * ratio
+    return columns
+
+
+def expand(base, factors=STRESS_FACTORS):
+    """Builds the full scenario tree as engine columns.
+
+    Returns ``(columns, levels)``; ``levels[i, f]`` is the severity index of
+    factor ``f`` at node ``i``. Node 0 is the unshocked base.
+    """
+    sizes = [len(levels) for levels in factors.values()]
+    levels = np.indices(sizes).reshape(len(sizes), -1).T
+    base_columns, _ = engine.to_columns(base)
+    columns = {k: np.repeat(v[:1], len(levels)) for k, v in base_columns.items()}
+    for f, shocks in enumerate(factors.values()):
+        for level, shock in enumerate(shocks):
+            if level:
+                shock.apply(columns, levels[:, f] == level)
+    return anchor_balances(columns, base_columns), levels
+
+
+def node_label(levels_row, factors=STRESS_FACTORS):
+    shocks = [shocks[level] for shocks, level in zip(factors.values(), levels_row) if level]
+    return ", ".join(s.label for s in shocks) or "base"
+
+
+def debt_service_coverage(outputs, columns, loan_tenor_years=7.0):
+    """Per node ``(cover, surplus)``: cover is (EBITDA - tax) / (interest + capex / tenor), floored at 0
+    and inf when there is no debt service; surplus is the cash left after debt service (₹/year)."""
+    debt_service = outputs["annual_interest"] + columns["capex"] / loan_tenor_years
+    cash_available = outputs["annual_ebitda"] - outputs["annual_tax"]
+    cover = np.divide(np.maximum(cash_available, 0), debt_service, out=np.full(debt_service.shape, np.inf),
+                      where=debt_service > 0)
+    return cover, cash_available - debt_service
+
+
+# metric -> (label, True when lower is worse)
+RANKED_METRICS = {"annual_pat": ("Annual PAT", True), "dscr": ("DSCR", True),
+                  "net_wc_requirement": ("Net WC Requirement", False)}
+
+
+def _metrics(columns, loan_tenor_years):
+    out = engine.calculate_batch(columns)
+    dscr, surplus = debt_service_coverage(out, columns, loan_tenor_years)
+    return {"annual_pat": out["annual_pat"], "dscr": dscr, "debt_service_surplus": surplus,
+            "net_wc_requirement": out["net_wc_requirement"]}
+
+
+def run_stress(base, factors=STRESS_FACTORS, pack=STANDARD_PACK, top=10, loan_tenor_years=7.0,
+               min_dscr=1.2):
+    """Evaluates the scenario tree and the named pack; returns ranked worst cases per metric."""
+    columns, levels = expand(base, factors)
+    values = _metrics(columns, loan_tenor_years)
+    worst = {}
+    for metric, (_, lower_is_worse) in RANKED_METRICS.items():
+        v = values[metric]
+        if metric == "dscr":
+            order = np.lexsort((values["debt_service_surplus"], v))[:top]  # ties at 0 cover: biggest shortfall
+        else:
+            order = np.argsort(v if lower_is_worse else -v, kind="stable")[:top]
+        worst[metric] = [{"node": int(i), "shocks": node_label(levels[i], factors), "value": float(v[i]),
+                          "change": float(v[i] - v[0])} for i in order]
+
+    base_columns, _ = engine.to_columns(base)
+    pack_columns = {k: np.repeat(v[:1], len(pack)) for k, v in base_columns.items()}
+    for i, shock in enumerate(pack.values()):
+        shock.apply(pack_columns, slice(i, i + 1))
+    anchor_balances(pack_columns, base_columns)
+    pack_values = _metrics(pack_columns, loan_tenor_years)
+    return {
+        "nodes": len(levels),
+        "base": {m: float(v[0]) for m, v in values.items()},
+        "worst": worst,
+        "pack": [{"name": name, **{m: float(v[i]) for m, v in pack_values.items()}} for i, name in enumerate(pack)],
+        "loss_making_nodes": int((values["annual_pat"] < 0).sum()),
+        "dscr_breaches": int((values["dscr"] < min_dscr).sum()),
+        "min_dscr": min_dscr,
+        "values": values, "levels": levels,
+    }
+
+
+def _format(metric, value):
+    return f"{value:,.2f}x" if metric == "dscr" else f"₹{value / 1e7:,.2f} Cr"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the lender stress pack over every combination of shocks.")
+    parser.add_argument("scenario", nargs="?", help="JSON file with a base scenario (defaults to the dashboard)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--tenor", type=float, default=7.0, help="term-loan tenor in years for DSCR")
+    parser.add_argument("--min-dscr", type=float, default=1.2)
+    args = parser.parse_args()
+    base = {}
+    if args.scenario:
+        with open(args.scenario) as f:
+            base = json.load(f)
+    start = time.perf_counter()
+    result = run_stress(base, top=args.top, loan_tenor_years=args.tenor, min_dscr=args.min_dscr)
+    print(f"{result['nodes']:,} nodes in {(time.perf_counter() - start) * 1000:.0f} ms; "
+          f"{result['loss_making_nodes']:,} loss-making, {result['dscr_breaches']:,} with DSCR < {args.min_dscr:g}")
+    print("\nStandard pack:")
+    for row in result["pack"]:
+        print(f"  {row['name']:<20} PAT {_format('annual_pat', row['annual_pat']):>14}  "
+              f"DSCR {_format('dscr', row['dscr']):>8}  Net WC {_format('net_wc_requirement', row['net_wc_requirement']):>14}")
+    for metric, (label, _) in RANKED_METRICS.items():
+        print(f"\nWorst {label} (base {_format(metric, result['base'][metric])}):")
+        for row in result["worst"][metric]:
+            print(f"  {_format(metric, row['value']):>14}  {row['shocks']}")
+
+
+if __name__ == "__main__":
+    main()
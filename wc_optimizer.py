@@ -0,0 +1,155 @@
+"""Working-capital cycle optimiser.
+
+The stock, debtor and creditor days and the financed share of the seed hoard
+drive net WC, interest and ROCE. This module searches them together. Each
+input gets a grid within ``BOUNDS`` (commercial limits: what customers accept,
+what suppliers and the warehouse lender allow). The full cartesian product is
+evaluated in ``engine.calculate_batch`` chunks.
+
+Fewer safety days free capital but risk running out. Each stock's cover is
+compared with the uncertainty of supply and demand over its replenishment
+lead time, expressed in days of consumption (``RISK_SD_DAYS``). The stock-out
+risk per cycle is the normal tail beyond the cover:
+
+    risk_i = P(shortfall > safety_days_i) = 1 - Phi(safety_days_i / sd_i)
+
+Stock-out risk overall is the chance that any of the three stocks runs out.
+Every stock must meet ``min_service_level``. ``optimize_wc`` returns the best
+plan and the efficient frontier: the best objective reachable at each level
+of stock-out risk.
+
+The optimiser works on the day cycles, so actual balances given in the base
+scenario (``engine.WC_OVERRIDES``, e.g. from the FG ledger) are ignored;
+otherwise they would pin FG stock, debtors and creditors whatever days are tried.
+
+    python wc_optimizer.py --objective roce_pat --service-level 0.95
+"""
+import argparse
+import math
+import time
+from itertools import product
+
+import numpy as np
+
+import engine
+
+# input -> (low, high, grid points)
+BOUNDS = {
+    "rm_safety_stock_days": (15, 60, 10), "fg_oil_safety_days": (5, 30, 9), "fg_moc_safety_days": (1, 10, 7),
+    "oil_debtor_days": (3, 15, 4), "moc_debtor_days": (3, 15, 4), "creditor_days": (0, 7, 4),
+    "rm_hoard_financed_pct": (50, 85, 5),
+}
+WC_KEYS = tuple(BOUNDS)
+# Safety-stock input -> std dev of shortfall over its lead time, in days of consumption.
+RISK_SD_DAYS = {"rm_safety_stock_days": 20.0, "fg_oil_safety_days": 6.0, "fg_moc_safety_days": 2.0}
+# objective -> True when larger is better
+OBJECTIVES = {"roce_pat": True, "roce_pat_with_synergy": True, "annual_pat": True, "net_wc_requirement": False}
+
+
+def _normal_sf(z):
+    """1 - Phi(z) (Abramowitz & Stegun 7.1.26, error < 1.5e-7)."""
+    x = np.abs(z) / math.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    tail = 0.5 * poly * np.exp(-x * x)
+    return np.where(z >= 0, tail, 1 - tail)
+
+
+def stockout_risk(columns, risk_sd_days=RISK_SD_DAYS):
+    """Per-stock stock-out risk per replenishment cycle, and the chance that any stock runs out."""
+    risks = {key: _normal_sf(np.asarray(columns[key], dtype=np.float64) / sd) for key, sd in risk_sd_days.items()}
+    survive = np.ones(np.shape(next(iter(risks.values()))))
+    for risk in risks.values():
+        survive = survive * (1 - risk)
+    return risks, 1 - survive
+
+
+def candidate_grid(bounds=BOUNDS):
+    """Every combination of the grid values of each input, as columns."""
+    axes = [np.unique(np.round(np.linspace(low, high, points))) for low, high, points in bounds.values()]
+    grid = np.array(list(product(*axes)), dtype=np.float64)
+    return {key: grid[:, i] for i, key in enumerate(bounds)}
+
+
+def efficient_frontier(risk, score):
+    """Indices of candidates not beaten by any candidate with lower or equal risk, by increasing risk."""
+    order = np.lexsort((-score, risk))
+    best_so_far = np.maximum.accumulate(score[order])
+    improves = np.empty(order.size, dtype=bool)
+    improves[0] = True
+    improves[1:] = score[order][1:] > best_so_far[:-1]
+    return order[improves]
+
+
+def optimize_wc(base, objective="roce_pat", min_service_level=0.95, bounds=BOUNDS,
+                risk_sd_days=RISK_SD_DAYS, chunk_size=65536):
+    """Chooses the WC days and financed hoard share that optimise ``objective``.
+
+    ``base`` is a scenario dict (missing inputs default to the dashboard); only
+    the inputs in ``bounds`` are varied and WC balance overrides are dropped. Returns the best plan meeting the
+    service level, the current plan for comparison and the efficient frontier.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {tuple(OBJECTIVES)}")
+    candidates = candidate_grid(bounds)
+    n = candidates[WC_KEYS[0]].size
+    base_columns, _ = engine.to_columns({k: v for k, v in base.items() if k not in engine.WC_OVERRIDES})
+    scenario = {k: v[0] for k, v in base_columns.items()}
+    values = np.empty(n)
+    for start in range(0, n, chunk_size):
+        chunk = {k: v[start:start + chunk_size] for k, v in candidates.items()}
+        values[start:start + chunk_size] = engine.calculate_batch({**scenario, **chunk})[objective]
+    risks, risk = stockout_risk(candidates, risk_sd_days)
+    feasible = np.ones(n, dtype=bool)
+    for r in risks.values():
+        feasible &= r <= 1 - min_service_level
+    score = values if OBJECTIVES[objective] else -values
+    frontier = efficient_frontier(risk, score)
+
+    def plan(i):
+        return {**{k: float(candidates[k][i]) for k in bounds}, objective: float(values[i]),
+                "stockout_risk": float(risk[i])}
+
+    current = engine.calculate_all_metrics(scenario)
+    _, current_risk = stockout_risk({k: scenario[k] for k in risk_sd_days}, risk_sd_days)
+    best = int(np.argmax(np.where(feasible, score, -np.inf))) if feasible.any() else None
+    best_plan = None
+    if best is not None:
+        best_plan = plan(best)
+        best_plan.update({k: v for k, v in engine.calculate_all_metrics({**scenario, **best_plan}).items()
+                          if k in ("roce_pat", "annual_pat", "net_wc_requirement", "annual_interest")})
+    return {
+        "best": best_plan,
+        "current": {**{k: float(scenario[k]) for k in bounds}, objective: current[objective],
+                    "stockout_risk": float(current_risk), "roce_pat": current["roce_pat"],
+                    "annual_pat": current["annual_pat"], "net_wc_requirement": current["net_wc_requirement"],
+                    "annual_interest": current["annual_interest"]},
+        "candidates": n,
+        "frontier_risk": risk[frontier], "frontier_value": values[frontier],
+        "frontier_feasible": feasible[frontier],
+        "frontier": [plan(i) for i in frontier],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimise working-capital days against stock-out risk.")
+    parser.add_argument("--objective", choices=tuple(OBJECTIVES), default="roce_pat")
+    parser.add_argument("--service-level", type=float, default=0.95, help="minimum per-stock service level")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    result = optimize_wc({}, args.objective, args.service_level)
+    print(f"{result['candidates']:,} candidates in {time.perf_counter() - start:.2f} s")
+    for name in ("current", "best"):
+        plan = result[name]
+        if plan is None:
+            print(f"{name:>8}: no plan meets the service level")
+            continue
+        print(f"{name:>8}: {args.objective} {plan[args.objective]:,.2f}, stock-out risk {plan['stockout_risk']:.1%}, "
+              + ", ".join(f"{k} {plan[k]:g}" for k in WC_KEYS))
+    print("\nEfficient frontier (stock-out risk -> best objective):")
+    for risk, value in zip(result["frontier_risk"], result["frontier_value"]):
+        print(f"  {risk:7.2%}  {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()